@@ -0,0 +1,735 @@
+#!/usr/bin/env python3
+"""
+Water Monitoring Ingest Gateway
+Accepts InfluxDB v2 line-protocol writes from the plants on VM1, drops
+retried duplicates, rate limits each plant and merges everything into
+large periodic writes to InfluxDB, with queue and latency metrics
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import signal
+import hashlib
+import logging
+import argparse
+import threading
+import http.client
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+from prometheus import CONTENT_TYPE, Histogram, MetricsText
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PRECISIONS = {'ns': 1, 'us': 1000, 'ms': 1000**2, 's': 1000**3}
+
+# Upper bounds of the batch size histogram buckets, in lines
+LINE_BUCKETS = (10, 100, 1000, 5000, 10000, 20000, 50000, 100000)
+
+# Statuses after which a merged batch is written again unchanged
+RETRY_STATUSES = {408, 429}
+
+# Statuses refusing the gateway's token rather than the data; retrying or
+# splitting the batch cannot help, so it is dropped
+AUTH_STATUSES = {401, 403}
+
+
+def split_sections(line):
+    """Split a line into measurement+tags, fields and timestamp on unescaped, unquoted spaces"""
+    if '"' not in line and '\\' not in line:
+        return [section for section in line.split(' ') if section]
+    sections = []
+    start = 0
+    in_string = False
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '"':
+            in_string = not in_string
+        elif char == ' ' and not in_string:
+            sections.append(line[start:i])
+            start = i + 1
+        i += 1
+    if in_string:
+        raise ValueError('unterminated string')
+    sections.append(line[start:])
+    return [section for section in sections if section]
+
+
+def tag_value(series_key, tag):
+    """Value of one tag in a measurement,tag=value,... key, or None"""
+    prefix = f'{tag}='
+    for pair in series_key.replace('\\,', '\0').split(',')[1:]:
+        if pair.startswith(prefix):
+            return pair[len(prefix):].replace('\0', '\\,')
+    return None
+
+
+def prepare_lines(body, stamp):
+    """Non-empty lines of a write body, each ending in a timestamp
+
+    Lines without one get stamp (the receive time in the request's
+    precision), so holding them in the queue does not move them in time.
+    Returns (lines, {plant_id or None: line count}, whether any line was
+    stamped); raises ValueError for a line that is not line protocol.
+    """
+    lines = []
+    plants = {}
+    stamped = False
+    for number, line in enumerate(body.split('\n'), 1):
+        line = line.rstrip('\r')
+        if not line.strip() or line.startswith('#'):
+            continue
+        try:
+            sections = split_sections(line)
+        except ValueError as e:
+            raise ValueError(f'unable to parse line {number}: {e}')
+        if len(sections) < 2 or '=' not in sections[1]:
+            raise ValueError(f'unable to parse line {number}: missing fields')
+        if len(sections) > 3:
+            raise ValueError(f'unable to parse line {number}: unexpected text after timestamp')
+        if len(sections) == 2:
+            line = f'{line.rstrip()} {stamp}'
+            stamped = True
+        elif not sections[2].lstrip('-').isdigit():
+            raise ValueError(f'unable to parse line {number}: invalid timestamp {sections[2]!r}')
+        plant = tag_value(sections[0], 'plant_id')
+        plants[plant] = plants.get(plant, 0) + 1
+        lines.append(line)
+    return lines, plants, stamped
+
+
+class DuplicateFilter:
+    """Remembers recent request digests so a client's retry of an accepted write is not queued twice"""
+
+    def __init__(self, window=600.0, max_entries=100000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, digest):
+        """True if digest is new (and now remembered), False for a duplicate"""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest, expires = next(iter(self._seen.items()))
+                if expires > now and len(self._seen) < self.max_entries:
+                    break
+                del self._seen[oldest]
+            if digest in self._seen:
+                return False
+            self._seen[digest] = now + self.window
+            return True
+
+    def release(self, digest):
+        """Forget a claimed digest whose write was refused, so its retry is accepted"""
+        with self._lock:
+            self._seen.pop(digest, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class RateLimiter:
+    """Token bucket per plant, in points per second
+
+    A request costs each plant one token per line of its own, capped at the
+    burst size so a single large batch (e.g. a spool replay) can still get
+    through once the bucket is full.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, points):
+        """Charge {key: points} to each key's bucket
+
+        Returns (0, None) if all the points may be written now, otherwise
+        (seconds until they may, the key over its rate) without charging
+        any bucket.
+        """
+        if not self.rate:
+            return 0.0, None
+        now = time.monotonic()
+        with self._lock:
+            refilled = {}
+            for key, count in points.items():
+                tokens, updated = self._buckets.get(key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                cost = min(count, self.burst)
+                if tokens < cost:
+                    self._buckets[key] = (tokens, now)
+                    return (cost - tokens) / self.rate, key
+                refilled[key] = tokens - cost
+            for key, tokens in refilled.items():
+                self._buckets[key] = (tokens, now)
+            return 0.0, None
+
+
+class Chunk:
+    """Lines from one accepted request, waiting to be written"""
+
+    __slots__ = ('lines', 'size', 'received')
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.size = sum(len(line) + 1 for line in lines)
+        self.received = time.monotonic()
+
+
+class UpstreamError(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f'{status} {message}')
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Upstream:
+    """Keep-alive connection to the InfluxDB write API"""
+
+    def __init__(self, url, token, timeout=30.0, compress=True):
+        parts = urlsplit(url)
+        self.secure = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.secure else 80)
+        self.base = parts.path.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.compress = compress
+        self._connection = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, headers, body) over the kept-alive connection, reconnecting once if it was dropped
+
+        Only the flusher thread uses this connection; see get for the handlers.
+        """
+        for attempt in (0, 1):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, self.base + path, body=body, headers=headers or {})
+                response = self._connection.getresponse()
+                return response.status, response.headers, response.read()
+            except (http.client.HTTPException, OSError):
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+    def get(self, path):
+        """(status, headers, body) of a GET on a connection of its own"""
+        connection = self._connect()
+        try:
+            connection.request('GET', self.base + path)
+            response = connection.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            connection.close()
+
+    def write(self, org, bucket, precision, lines):
+        """Write lines in one request; raises UpstreamError on a non-2xx response"""
+        body = ('\n'.join(lines) + '\n').encode('utf-8')
+        headers = {'Authorization': f'Token {self.token}', 'Content-Type': 'text/plain; charset=utf-8'}
+        if self.compress:
+            body = gzip.compress(body, 5)
+            headers['Content-Encoding'] = 'gzip'
+        query = urlencode({'org': org, 'bucket': bucket, 'precision': precision})
+        status, response_headers, response = self.request('POST', f'/api/v2/write?{query}', body, headers)
+        if status >= 300:
+            retry_after = response_headers.get('Retry-After')
+            raise UpstreamError(status, response.decode('utf-8', 'replace')[:500],
+                                float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return len(body)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class IngestGateway:
+    """Write queue shared by the HTTP handlers and the flusher thread
+
+    Accepted lines are queued per (org, bucket, precision). Every
+    flush_interval seconds, or as soon as a queue holds batch_size lines,
+    the flusher writes each queue in batches of up to batch_size lines.
+    The queue lives in memory, so once a write to InfluxDB fails new writes
+    get 503 until one succeeds again: during an outage the points stay in
+    the plants' disk spools rather than here, and the batch in hand is
+    retried with backoff. Beyond max_pending queued lines clients also get
+    503. If InfluxDB rejects a merged batch (400/422), its requests are
+    written one at a time so only the offending request's lines are
+    dropped; a batch refused for the gateway's token (401/403) is dropped
+    whole.
+    """
+
+    def __init__(self, upstream, token=None, batch_size=20000, flush_interval=5.0, max_pending=500000,
+                 rate_limit=0.0, rate_burst=20000, dedup_window=600.0, max_retry_delay=30.0):
+        self.upstream = upstream
+        self.token = token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retry_delay = max_retry_delay
+        self.duplicates = DuplicateFilter(dedup_window)
+        self.limiter = RateLimiter(rate_limit, rate_burst)
+
+        # Counters
+        self.requests = {}
+        self.lines_received = {}
+        self.lines_written = 0
+        self.lines_rejected = 0
+        self.lines_lost = 0
+        self.duplicate_requests = 0
+        self.rate_limited = {}
+        self.upstream_writes = 0
+        self.upstream_retries = 0
+        self.upstream_bytes = 0
+        self.upstream_failing = False
+
+        # Histograms
+        self.flush_seconds = Histogram()
+        self.queue_wait_seconds = Histogram()
+        self.batch_lines = Histogram(LINE_BUCKETS)
+
+        # (org, bucket, precision) -> deque of Chunks, and the lines in each
+        self._queues = {}
+        self._queue_lines = {}
+        self.pending_lines = 0
+        self.pending_bytes = 0
+        self._condition = threading.Condition()
+        self._closing = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name='gateway-flush', daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def from_env(cls):
+        """Gateway writing to INFLUXDB_URL, configured from GATEWAY_*"""
+        upstream = Upstream(
+            os.getenv('INFLUXDB_URL', 'http://influxdb:8086'),
+            os.getenv('INFLUXDB_TOKEN', ''),
+            timeout=float(os.getenv('GATEWAY_UPSTREAM_TIMEOUT', 30)),
+            compress=os.getenv('GATEWAY_GZIP', 'true').lower() == 'true'
+        )
+        return cls(
+            upstream,
+            token=os.getenv('GATEWAY_TOKEN') or os.getenv('INFLUXDB_TOKEN') or None,
+            batch_size=int(os.getenv('GATEWAY_BATCH_SIZE', 20000)),
+            flush_interval=float(os.getenv('GATEWAY_FLUSH_INTERVAL', 5)),
+            max_pending=int(os.getenv('GATEWAY_MAX_PENDING', 500000)),
+            rate_limit=float(os.getenv('GATEWAY_RATE_LIMIT', 2000)),
+            rate_burst=int(os.getenv('GATEWAY_RATE_BURST', 20000)),
+            dedup_window=float(os.getenv('GATEWAY_DEDUP_WINDOW', 600)),
+            max_retry_delay=float(os.getenv('GATEWAY_MAX_RETRY_DELAY', 30))
+        )
+
+    def _count(self, counter, key, amount=1):
+        with self._condition:
+            counter[key] = counter.get(key, 0) + amount
+
+    # Ingest
+
+    def accept(self, org, bucket, precision, body, client):
+        """Queue a write request; returns (status, JSON document or None, headers)"""
+        retry_after = {'Retry-After': str(max(1, round(self.flush_interval)))}
+        if self.upstream_failing:
+            return 503, {'code': 'unavailable', 'message': 'InfluxDB writes are failing'}, retry_after
+
+        stamp = time.time_ns() // PRECISIONS[precision]
+        try:
+            lines, plants, stamped = prepare_lines(body, stamp)
+        except ValueError as e:
+            return 400, {'code': 'invalid', 'message': str(e)}, {}
+        if not lines:
+            return 204, None, {}
+        counts = {}
+        for plant, count in plants.items():
+            counts[plant or client] = counts.get(plant or client, 0) + count
+
+        # A body whose lines were stamped here is a new set of points even
+        # if it repeats an earlier one byte for byte, so it is never deduped
+        digest = None
+        if not stamped:
+            digest = hashlib.sha1(f'{org}\n{bucket}\n{precision}\n'.encode('utf-8') + body.encode('utf-8')).digest()
+            if not self.duplicates.claim(digest):
+                with self._condition:
+                    self.duplicate_requests += 1
+                return 204, None, {}
+
+        wait, plant = self.limiter.acquire(counts)
+        if wait:
+            self._release(digest)
+            self._count(self.rate_limited, plant)
+            return 429, {'code': 'too many requests', 'message': f'plant {plant} is over its write rate'}, \
+                {'Retry-After': str(max(1, round(wait)))}
+
+        chunk = Chunk(lines)
+        with self._condition:
+            if self.pending_lines + len(lines) > self.max_pending:
+                self._release(digest)
+                return 503, {'code': 'unavailable', 'message': 'write queue is full'}, retry_after
+            key = (org, bucket, precision)
+            self._queues.setdefault(key, deque()).append(chunk)
+            self._queue_lines[key] = self._queue_lines.get(key, 0) + len(lines)
+            self.pending_lines += len(lines)
+            self.pending_bytes += chunk.size
+            for plant, count in counts.items():
+                self.lines_received[plant] = self.lines_received.get(plant, 0) + count
+            if self._queue_lines[key] >= self.batch_size:
+                self._condition.notify()
+        return 204, None, {}
+
+    def _release(self, digest):
+        if digest is not None:
+            self.duplicates.release(digest)
+
+    # Flushing
+
+    def _take(self, key):
+        """Remove up to batch_size lines' worth of chunks from one queue (at least one chunk)"""
+        with self._condition:
+            queue = self._queues.get(key)
+            chunks = []
+            lines = 0
+            while queue and (not chunks or lines + len(queue[0].lines) <= self.batch_size):
+                chunk = queue.popleft()
+                chunks.append(chunk)
+                lines += len(chunk.lines)
+            if queue is not None:
+                self._queue_lines[key] -= lines
+                if not queue:
+                    del self._queues[key], self._queue_lines[key]
+            return chunks
+
+    def _settle(self, chunks, written):
+        """Remove delivered or dropped chunks from the pending totals"""
+        now = time.monotonic()
+        with self._condition:
+            for chunk in chunks:
+                self.pending_lines -= len(chunk.lines)
+                self.pending_bytes -= chunk.size
+                if written:
+                    self.lines_written += len(chunk.lines)
+        if written:
+            for chunk in chunks:
+                self.queue_wait_seconds.observe(now - chunk.received, len(chunk.lines))
+
+    def _write(self, key, chunks, deadline=None):
+        """Write chunks as one request, retrying until it succeeds, is rejected or deadline passes
+
+        Returns True when written, the status when InfluxDB rejected the
+        batch and None when it gave up (closing or past deadline). New
+        writes are refused with 503 from the first failed attempt until a
+        write succeeds.
+        """
+        lines = [line for chunk in chunks for line in chunk.lines]
+        delay = 1.0
+        while True:
+            start = time.perf_counter()
+            try:
+                self.upstream_bytes += self.upstream.write(*key, lines)
+                self.flush_seconds.observe(time.perf_counter() - start)
+                self.upstream_writes += 1
+                self.batch_lines.observe(len(lines))
+                if self.upstream_failing:
+                    logger.info("InfluxDB writes succeeding again, accepting writes")
+                    self.upstream_failing = False
+                return True
+            except UpstreamError as e:
+                self.flush_seconds.observe(time.perf_counter() - start)
+                if e.status in AUTH_STATUSES:
+                    logger.error(f"InfluxDB refused the gateway's token, dropping {len(lines)} lines "
+                                 f"for {key[1]} (check INFLUXDB_TOKEN): {e}")
+                    return e.status
+                if e.status < 500 and e.status not in RETRY_STATUSES:
+                    logger.warning(f"InfluxDB rejected {len(lines)} lines for {key[1]}: {e}")
+                    return e.status
+                wait = e.retry_after or delay
+                logger.warning(f"InfluxDB write failed ({e}), retrying {len(lines)} lines in {wait:.1f}s")
+            except (http.client.HTTPException, OSError) as e:
+                wait = delay
+                logger.warning(f"InfluxDB unreachable ({e}), retrying {len(lines)} lines in {wait:.1f}s")
+            if not self.upstream_failing:
+                logger.warning("Refusing new writes with 503 until InfluxDB accepts writes again")
+                self.upstream_failing = True
+            self.upstream_retries += 1
+            delay = min(delay * 2, self.max_retry_delay)
+            if deadline is not None:
+                if time.monotonic() + wait > deadline:
+                    return None
+                time.sleep(wait)
+            elif self._closing.wait(wait):
+                return None
+
+    def _flush_queue(self, key, deadline=None):
+        """Write everything queued for key; False if the flush had to stop early"""
+        while True:
+            chunks = self._take(key)
+            if not chunks:
+                return True
+            written = self._write(key, chunks, deadline)
+            if written is None:
+                self._requeue(key, chunks)
+                return False
+            if written is not True and written not in AUTH_STATUSES and len(chunks) > 1:
+                # Isolate the request InfluxDB objects to
+                for i, chunk in enumerate(chunks):
+                    result = self._write(key, [chunk], deadline)
+                    if result is None:
+                        self._requeue(key, chunks[i:])
+                        return False
+                    self._settle([chunk], result is True)
+                    if result is not True:
+                        self.lines_rejected += len(chunk.lines)
+                continue
+            self._settle(chunks, written is True)
+            if written is not True:
+                self.lines_rejected += sum(len(chunk.lines) for chunk in chunks)
+
+    def _requeue(self, key, chunks):
+        with self._condition:
+            self._queues.setdefault(key, deque()).extendleft(reversed(chunks))
+            self._queue_lines[key] = self._queue_lines.get(key, 0) + sum(len(chunk.lines) for chunk in chunks)
+
+    def _due(self):
+        return any(lines >= self.batch_size for lines in self._queue_lines.values())
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._closing.is_set():
+            with self._condition:
+                while not self._closing.is_set() and not self._due():
+                    remaining = next_flush - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                keys = list(self._queues)
+            if self._closing.is_set():
+                break
+            next_flush = time.monotonic() + self.flush_interval
+            for key in keys:
+                if not self._flush_queue(key):
+                    break
+
+    def close(self, timeout=10.0):
+        """Stop the flusher and write what is still queued, trying for at most timeout seconds"""
+        self._closing.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._flusher.join()
+        deadline = time.monotonic() + timeout
+        for key in list(self._queues):
+            self._flush_queue(key, deadline)
+        with self._condition:
+            self.lines_lost += self.pending_lines
+        if self.lines_lost:
+            logger.error(f"Shut down with {self.lines_lost} lines not written to InfluxDB")
+        self.upstream.close()
+
+    # Reporting
+
+    def stats(self):
+        with self._condition:
+            return {
+                'requests': {str(status): count for status, count in sorted(self.requests.items())},
+                'lines_received': sum(self.lines_received.values()),
+                'lines_written': self.lines_written,
+                'lines_rejected': self.lines_rejected,
+                'duplicate_requests': self.duplicate_requests,
+                'rate_limited': sum(self.rate_limited.values()),
+                'upstream_writes': self.upstream_writes,
+                'upstream_retries': self.upstream_retries,
+                'upstream_failing': self.upstream_failing,
+                'pending_lines': self.pending_lines
+            }
+
+    def render_metrics(self):
+        """Gateway metrics in the Prometheus text exposition format"""
+        with self._condition:
+            requests = sorted(self.requests.items())
+            received = sorted(self.lines_received.items())
+            limited = sorted(self.rate_limited.items())
+            pending_lines, pending_bytes = self.pending_lines, self.pending_bytes
+            oldest = min((queue[0].received for queue in self._queues.values() if queue), default=None)
+
+        text = MetricsText('ingest_gateway')
+        text.metric('requests_total', 'counter', 'Write requests by response status',
+                    [({'status': status}, count) for status, count in requests])
+        text.metric('lines_received_total', 'counter', 'Lines accepted into the queue',
+                    [({'plant': plant}, count) for plant, count in received])
+        text.metric('rate_limited_total', 'counter', 'Requests refused with 429 because the plant was over its rate',
+                    [({'plant': plant}, count) for plant, count in limited])
+        text.metric('duplicate_requests_total', 'counter', 'Retried requests acknowledged without queueing them again',
+                    [({}, self.duplicate_requests)])
+        text.metric('lines_written_total', 'counter', 'Lines written to InfluxDB', [({}, self.lines_written)])
+        text.metric('lines_rejected_total', 'counter', 'Lines InfluxDB refused (400/401/403/422), dropped',
+                    [({}, self.lines_rejected)])
+        text.metric('upstream_writes_total', 'counter', 'Merged write requests sent to InfluxDB',
+                    [({}, self.upstream_writes)])
+        text.metric('upstream_retries_total', 'counter', 'Merged writes retried after an error',
+                    [({}, self.upstream_retries)])
+        text.metric('upstream_bytes_total', 'counter', 'Bytes sent to InfluxDB (after compression)',
+                    [({}, self.upstream_bytes)])
+        text.metric('upstream_failing', 'gauge', '1 while writes to InfluxDB fail and new writes get 503',
+                    [({}, int(self.upstream_failing))])
+        text.metric('queue_lines', 'gauge', 'Lines waiting to be written', [({}, pending_lines)])
+        text.metric('queue_bytes', 'gauge', 'Bytes of line protocol waiting to be written', [({}, pending_bytes)])
+        text.metric('queue_oldest_seconds', 'gauge', 'Age of the oldest queued request',
+                    [({}, time.monotonic() - oldest if oldest is not None else 0)])
+        text.metric('dedup_entries', 'gauge', 'Request digests remembered for duplicate detection',
+                    [({}, len(self.duplicates))])
+        text.histogram('flush_duration_seconds', 'Time per merged write attempt', self.flush_seconds)
+        text.histogram('queue_wait_seconds', 'Time from receiving a line to writing it, per line',
+                       self.queue_wait_seconds)
+        text.histogram('batch_lines', 'Lines per merged write', self.batch_lines)
+        return text.render()
+
+
+def make_handler(gateway):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status, payload=None, headers=None, content_type='application/json; charset=utf-8'):
+            if isinstance(payload, (bytes, str)):
+                body = payload.encode('utf-8') if isinstance(payload, str) else payload
+            else:
+                body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body:
+                self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path in ('/health', '/ready'):
+                try:
+                    status, headers, body = gateway.upstream.get(path)
+                except (http.client.HTTPException, OSError) as e:
+                    self._reply(503, {'name': 'ingest-gateway', 'status': 'fail',
+                                      'message': f'InfluxDB unreachable: {e}'})
+                    return
+                self._reply(status, body, content_type=headers.get('Content-Type', 'application/json'))
+            elif path == '/ping':
+                self._reply(204)
+            elif path == '/metrics':
+                self._reply(200, gateway.render_metrics(), content_type=CONTENT_TYPE)
+            elif path == '/stats':
+                self._reply(200, gateway.stats())
+            else:
+                self._reply(404, {'code': 'not found', 'message': 'path not found'})
+
+        def do_POST(self):
+            status, payload, headers = self._write()
+            gateway._count(gateway.requests, status)
+            self._reply(status, payload, headers)
+
+        def _write(self):
+            url = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+
+            if url.path != '/api/v2/write':
+                return 404, {'code': 'not found', 'message': 'path not found'}, {}
+            if gateway.token and self.headers.get('Authorization') != f'Token {gateway.token}':
+                return 401, {'code': 'unauthorized', 'message': 'unauthorized access'}, {}
+
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            org = params.get('org') or params.get('orgID')
+            bucket = params.get('bucket')
+            precision = params.get('precision', 'ns')
+            if not org or not bucket:
+                return 400, {'code': 'invalid', 'message': 'org and bucket must be specified'}, {}
+            if precision not in PRECISIONS:
+                return 400, {'code': 'invalid', 'message': f'invalid precision {precision!r}'}, {}
+
+            try:
+                if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+                    raw = gzip.decompress(raw)
+                body = raw.decode('utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                return 400, {'code': 'invalid', 'message': f'unable to decode request body: {e}'}, {}
+
+            client = self.headers.get('X-Real-IP') or self.client_address[0]
+            return gateway.accept(org, bucket, precision, body, client)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def report(gateway, interval, stop):
+    """Log request and write counts since the previous report"""
+    last = gateway.stats()
+    while not stop.wait(interval):
+        current = gateway.stats()
+        logger.info(f"{current['lines_received'] - last['lines_received']} lines received, "
+                    f"{current['lines_written'] - last['lines_written']} written in "
+                    f"{current['upstream_writes'] - last['upstream_writes']} writes, "
+                    f"{current['pending_lines']} queued; "
+                    f"{current['duplicate_requests'] - last['duplicate_requests']} duplicates, "
+                    f"{current['rate_limited'] - last['rate_limited']} rate limited")
+        last = current
+
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coalescing InfluxDB write gateway for the plants')
+    parser.add_argument('--host', default=os.getenv('GATEWAY_HOST', '0.0.0.0'), help='Address to listen on')
+    parser.add_argument('--port', type=int, default=int(os.getenv('GATEWAY_PORT', 8087)), help='Port to listen on')
+    parser.add_argument('--report-interval', type=float, default=float(os.getenv('GATEWAY_REPORT_INTERVAL', 60)),
+                        help='Seconds between throughput logs')
+
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    gateway = IngestGateway.from_env()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(gateway))
+    server.daemon_threads = True
+
+    stop = threading.Event()
+    threading.Thread(target=report, args=(gateway, args.report_interval, stop), daemon=True).start()
+    logger.info(f"Ingest gateway listening on http://{args.host}:{args.port}, writing to "
+                f"{gateway.upstream.host}:{gateway.upstream.port} every {gateway.flush_interval:g}s "
+                f"or {gateway.batch_size} lines")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        gateway.close()
+        logger.info(f"Final stats: {json.dumps(gateway.stats())}")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
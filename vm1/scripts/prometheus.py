@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Water Monitoring Service Metrics
+Histograms and Prometheus text exposition shared by the VM1 services
+"""
+
+import threading
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(**labels):
+    if not labels:
+        return ''
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for name, value in labels.items()}
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped.items()) + '}'
+
+
+def format_value(value):
+    """Sample value with full precision, so large counters keep advancing"""
+    if isinstance(value, int):
+        return str(int(value))
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds"""
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value, times=1):
+        """Record value, times times (e.g. once per line of a batch)"""
+        with self._lock:
+            self.count += times
+            self.total += value * times
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    self.counts[i] += times
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+
+class MetricsText:
+    """Builds one scrape in the Prometheus text exposition format"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """A counter or gauge; samples are (labels dict, value) pairs"""
+        name = f'{self.prefix}_{name}'
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            self.lines.append(f'{name}{format_labels(**labels)} {format_value(value)}')
+
+    def histogram(self, name, help_text, histogram):
+        name = f'{self.prefix}_{name}'
+        counts, count, total = histogram.snapshot()
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} histogram')
+        for bound, bucket_count in zip(histogram.bounds, counts):
+            self.lines.append(f'{name}_bucket{format_labels(le=f"{bound:g}")} {bucket_count}')
+        self.lines.append(f'{name}_bucket{format_labels(le="+Inf")} {count}')
+        self.lines.append(f'{name}_sum {format_value(total)}')
+        self.lines.append(f'{name}_count {count}')
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Water Monitoring Query Proxy
+Caches Flux query results for the dashboards on VM1. Time ranges are
+aligned so viewers of the same panels share one result, and a sliding
+window is refreshed by querying only its new tail and merging it into the
+cached result
+"""
+
+import io
+import os
+import re
+import csv
+import sys
+import json
+import time
+import signal
+import hashlib
+import logging
+import argparse
+import calendar
+import threading
+import http.client
+from datetime import datetime, timezone
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from prometheus import CONTENT_TYPE, Histogram, MetricsText
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NS_PER_SECOND = 10**9
+DURATION_UNITS = {'ns': 1, 'us': 1000, 'µs': 1000, 'ms': 1000**2, 's': NS_PER_SECOND,
+                  'm': 60 * NS_PER_SECOND, 'h': 3600 * NS_PER_SECOND, 'd': 86400 * NS_PER_SECOND,
+                  'w': 7 * 86400 * NS_PER_SECOND}
+
+STRING_LITERAL = re.compile(r'"(?:\\.|[^"\\])*"')
+COMMENT = re.compile(r'//[^\n]*')
+RANGE_CALL = re.compile(r'\|> ?range\( ?start: ?(?P<start>now\(\)|[^,()\s]+) ?'
+                        r'(?:, ?stop: ?(?P<stop>now\(\)|[^,()\s]+) ?)?\)')
+PIPE_CALL = re.compile(r'\|> ?([A-Za-z_][\w.]*) ?\(')
+AGGREGATE_WINDOW = re.compile(r'aggregateWindow\((?P<args>[^|]*)')
+EVERY_ARG = re.compile(r'every: ?([^,)\s]+)')
+DURATION = re.compile(r'(-?)((?:\d+(?:ns|us|µs|ms|s|m|h|d|w))+)')
+DURATION_PART = re.compile(r'(\d+)(ns|us|µs|ms|s|m|h|d|w)')
+RFC3339 = re.compile(r'(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2})(?:\.(\d{1,9}))?(Z|[+-]\d{2}:\d{2})')
+ERROR_TABLE = re.compile(rb'^,?error,reference\r?$', re.M)
+
+# Functions that transform each row on its own, so the result over [a, c)
+# is the result over [a, b) followed by the result over [b, c). Not pivot
+# (its columns depend on the fields present in the range) nor group (its
+# row order depends on the input tables)
+ROW_FUNCTIONS = {'filter', 'keep', 'drop', 'rename', 'map', 'set', 'duplicate',
+                 'toFloat', 'toInt', 'toUInt', 'toString', 'toBool', 'yield'}
+
+# Request body fields that change what a query means beyond its text
+OPAQUE_FIELDS = ('now', 'params', 'extern')
+
+
+def parse_duration(text):
+    """Nanoseconds of a Flux duration literal such as -1h or 1h30m, or None"""
+    match = DURATION.fullmatch(text)
+    if not match:
+        return None
+    total = sum(int(count) * DURATION_UNITS[unit] for count, unit in DURATION_PART.findall(match.group(2)))
+    return -total if match.group(1) else total
+
+
+def parse_rfc3339(text):
+    """Nanoseconds since the epoch of an RFC 3339 timestamp, or None"""
+    match = RFC3339.fullmatch(text)
+    if not match:
+        return None
+    date, clock, fraction, zone = match.groups()
+    seconds = calendar.timegm(datetime.strptime(f'{date}T{clock}', '%Y-%m-%dT%H:%M:%S').timetuple())
+    if zone != 'Z':
+        offset = int(zone[1:3]) * 3600 + int(zone[4:6]) * 60
+        seconds -= offset if zone[0] == '+' else -offset
+    return seconds * NS_PER_SECOND + int((fraction or '0').ljust(9, '0'))
+
+
+def format_rfc3339(timestamp):
+    """RFC 3339 UTC text for nanoseconds, with a fraction only when needed"""
+    seconds, fraction = divmod(timestamp, NS_PER_SECOND)
+    text = datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+    if fraction:
+        text += '.' + f'{fraction:09d}'.rstrip('0')
+    return text + 'Z'
+
+
+def parse_time(text, now):
+    """Nanoseconds for a range() bound: now(), a duration relative to now or an RFC 3339 time"""
+    if text == 'now()':
+        return now
+    offset = parse_duration(text)
+    if offset is not None:
+        return now + offset
+    return parse_rfc3339(text)
+
+
+def normalize(query):
+    """Query text without comments and with whitespace collapsed outside string literals"""
+    parts = []
+    last = 0
+    for match in STRING_LITERAL.finditer(query):
+        parts.append(re.sub(r'\s+', ' ', COMMENT.sub('', query[last:match.start()])))
+        parts.append(match.group())
+        last = match.end()
+    parts.append(re.sub(r'\s+', ' ', COMMENT.sub('', query[last:])))
+    return ''.join(parts).strip()
+
+
+class QueryPlan:
+    """A query with one literal range(), split into a template and an aligned [start, stop)
+
+    step is the alignment in nanoseconds (a multiple of the aggregateWindow
+    period, if any). incremental is set when the pipeline only has row-wise
+    functions and at most one aggregateWindow, so a result can be extended
+    by querying a later range and appending it.
+    """
+
+    RANGE_PLACEHOLDER = '|> range(start: ${start}, stop: ${stop})'
+
+    def __init__(self, template, start, stop, step, every, incremental):
+        self.template = template
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.every = every
+        self.incremental = incremental
+
+    @classmethod
+    def build(cls, query, now, align):
+        """Plan for a normalized query at now (nanoseconds), or None if it has no single literal range"""
+        matches = list(RANGE_CALL.finditer(query))
+        if len(matches) != 1 or query.count('range(') != 1:
+            return None
+        match = matches[0]
+        start = parse_time(match.group('start'), now)
+        stop = parse_time(match.group('stop'), now) if match.group('stop') else now
+        if start is None or stop is None or start >= stop:
+            return None
+
+        functions = PIPE_CALL.findall(query)
+        incremental = query.count('from(') == 1 and functions[:1] == ['range']
+        every = None
+        for name in functions[1:]:
+            if name == 'aggregateWindow' and every is None:
+                args = AGGREGATE_WINDOW.search(query).group('args')
+                every_arg = EVERY_ARG.search(args)
+                every = parse_duration(every_arg.group(1)) if every_arg else None
+                if not every or every < 0 or any(f'{arg}:' in args for arg in ('timeSrc', 'offset', 'period')):
+                    incremental = False
+                    every = None
+            elif name not in ROW_FUNCTIONS:
+                incremental = False
+
+        step = align
+        if every:
+            step = -(-align // every) * every
+        template = query[:match.start()] + cls.RANGE_PLACEHOLDER + query[match.end():]
+        return cls(template, start // step * step, -(-stop // step) * step, step, every, incremental)
+
+    def query(self, start, stop):
+        """The query text over [start, stop)"""
+        return self.template.replace(self.RANGE_PLACEHOLDER,
+                                     f'|> range(start: {format_rfc3339(start)}, stop: {format_rfc3339(stop)})')
+
+
+class MergeError(ValueError):
+    pass
+
+
+class Table:
+    """One table of an annotated CSV result: its annotation rows, header and data rows"""
+
+    def __init__(self, annotations, header):
+        self.annotations = annotations
+        self.header = header
+        self.rows = []
+
+
+def read_tables(text):
+    """OrderedDict of (result, schema, group key without _start/_stop) -> Table
+
+    Requires the #group annotation and a _time column, which are needed to
+    line up and trim tables; raises MergeError otherwise.
+    """
+    tables = OrderedDict()
+    annotations = OrderedDict()
+    header = None
+    for row in csv.reader(io.StringIO(text)):
+        if not any(row):
+            annotations, header = OrderedDict(), None
+            continue
+        if row[0].startswith('#'):
+            if header is not None:
+                annotations, header = OrderedDict(), None
+            annotations[row[0]] = row
+            continue
+        if header is None:
+            header = row
+            if 'error' in header or '#group' not in annotations or not {'_time', 'table', 'result'} <= set(header):
+                raise MergeError('result cannot be merged (no #group annotation or _time column)')
+            group = annotations['#group']
+            defaults = annotations.get('#default', [''] * len(header))
+            key_columns = [i for i, name in enumerate(header)
+                           if i < len(group) and group[i] == 'true' and name not in ('_start', '_stop')]
+            result_column = header.index('result')
+            schema = (tuple(header), tuple(annotations.get('#datatype', ())))
+            continue
+        key = (row[result_column] or defaults[result_column], schema, tuple(row[i] for i in key_columns))
+        table = tables.get(key)
+        if table is None:
+            table = tables[key] = Table(list(annotations.values()), header)
+        table.rows.append(row)
+    return tables
+
+
+def write_tables(tables, start, stop):
+    """Annotated CSV for tables, renumbered per result, with _start/_stop set to [start, stop)"""
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\r\n')
+    numbers = {}
+    bounds = {'_start': format_rfc3339(start), '_stop': format_rfc3339(stop)}
+    previous = None
+    for (result, _, _), table in tables.items():
+        if not table.rows:
+            continue
+        number = str(numbers.setdefault(result, 0))
+        numbers[result] += 1
+        overrides = {i: value for i, value in enumerate(table.header) if value in bounds}
+        table_column = table.header.index('table')
+        # Consecutive tables with the same schema share one header, as InfluxDB writes them
+        if (table.annotations, table.header) != previous:
+            if previous is not None:
+                output.write('\r\n')
+            writer.writerows(table.annotations)
+            writer.writerow(table.header)
+            previous = (table.annotations, table.header)
+        for row in table.rows:
+            row = list(row)
+            row[table_column] = number
+            for i, name in overrides.items():
+                row[i] = bounds[name]
+            writer.writerow(row)
+    output.write('\r\n')
+    return output.getvalue()
+
+
+def merge_results(cached, tail, start, complete, stop, every=None):
+    """Result over [start, stop) from a cached result covering [start, complete) and one over [complete, stop)
+
+    Cached rows are trimmed to [start, complete): raw rows by _time, and
+    aggregateWindow rows (stamped with their window's end) to the windows
+    that lie wholly inside it. Tail tables are appended to the cached table
+    with the same group key.
+    """
+    tables = read_tables(cached)
+    for table in tables.values():
+        time_column = table.header.index('_time')
+        kept = []
+        for row in table.rows:
+            timestamp = parse_rfc3339(row[time_column])
+            if timestamp is None:
+                raise MergeError(f'unexpected _time {row[time_column]!r}')
+            if (start + every <= timestamp <= complete) if every else (start <= timestamp < complete):
+                kept.append(row)
+        table.rows = kept
+    if tail is not None:
+        for key, table in read_tables(tail).items():
+            existing = tables.get(key)
+            if existing is None:
+                tables[key] = table
+            else:
+                existing.rows.extend(table.rows)
+    return write_tables(tables, start, stop)
+
+
+class Entry:
+    """A cached result"""
+
+    __slots__ = ('key', 'template', 'body', 'content_type', 'start', 'stop', 'complete', 'every',
+                 'incremental', 'expires', 'fetched')
+
+    def __init__(self, key, template, body, content_type, plan=None, complete=None, expires=0.0):
+        self.key = key
+        self.template = template
+        self.body = body
+        self.content_type = content_type
+        self.start = plan.start if plan else None
+        self.stop = plan.stop if plan else None
+        self.every = plan.every if plan else None
+        self.incremental = bool(plan and plan.incremental)
+        self.complete = complete
+        self.expires = expires
+        self.fetched = time.monotonic()
+
+    @property
+    def size(self):
+        return len(self.body) + 512
+
+
+class QueryCache:
+    """LRU cache of results, capped in bytes, indexed by template for window extension"""
+
+    def __init__(self, max_bytes, retain):
+        self.max_bytes = max_bytes
+        self.retain = retain
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._templates = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def extendable(self, template, start, stop):
+        """The cached result of template that covers the most of [start, stop) from start, or None"""
+        best = None
+        for key in self._templates.get(template, ()):
+            entry = self._entries[key]
+            if entry.incremental and entry.start <= start < entry.complete <= stop:
+                if best is None or entry.complete > best.complete:
+                    best = entry
+        return best
+
+    def put(self, entry):
+        self._remove(entry.key)
+        self._entries[entry.key] = entry
+        self._templates.setdefault(entry.template, set()).add(entry.key)
+        self.bytes += entry.size
+        now = time.monotonic()
+        for key in [key for key, cached in self._entries.items() if now - cached.fetched > self.retain]:
+            self._remove(key)
+            self.evictions += 1
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        keys = self._templates[entry.template]
+        keys.discard(key)
+        if not keys:
+            del self._templates[entry.template]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryProxy:
+    """Answers /api/v2/query from the cache, querying InfluxDB only for what it does not have
+
+    A query with one literal range() has its bounds rounded out to align
+    seconds (or a multiple of its aggregateWindow period), so requests
+    made within the same step share a cache entry. A result whose window
+    still reaches into the last lateness seconds is kept for ttl seconds;
+    older windows are kept for history_ttl. When the window slides, a
+    cached result of the same query that covers its start is extended by
+    querying only from where that result was complete, and its rows before
+    the new start are dropped. Concurrent requests for the same entry wait
+    for a single InfluxDB query. Other queries are cached as-is for ttl.
+    """
+
+    def __init__(self, upstream_url, align=10.0, ttl=10.0, history_ttl=3600.0, lateness=60.0, retain=900.0,
+                 max_bytes=256 * 1024**2, timeout=60.0):
+        parts = urlsplit(upstream_url)
+        self.secure = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.secure else 80)
+        self.base = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.align = int(align * NS_PER_SECOND)
+        self.ttl = ttl
+        self.history_ttl = history_ttl
+        self.lateness = int(lateness * NS_PER_SECOND)
+        self.cache = QueryCache(max_bytes, retain)
+
+        # Counters
+        self.requests = {}
+        self.upstream_queries = 0
+        self.upstream_errors = 0
+        self.upstream_bytes = 0
+        self.bytes_served = 0
+
+        self.upstream_seconds = Histogram()
+        self.request_seconds = Histogram()
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @classmethod
+    def from_env(cls):
+        """Proxy for INFLUXDB_URL configured from QUERY_CACHE_*"""
+        return cls(
+            os.getenv('INFLUXDB_URL', 'http://influxdb:8086'),
+            align=float(os.getenv('QUERY_CACHE_ALIGN', 10)),
+            ttl=float(os.getenv('QUERY_CACHE_TTL', 10)),
+            history_ttl=float(os.getenv('QUERY_CACHE_HISTORY_TTL', 3600)),
+            lateness=float(os.getenv('QUERY_CACHE_LATENESS', 60)),
+            retain=float(os.getenv('QUERY_CACHE_RETAIN', 900)),
+            max_bytes=int(os.getenv('QUERY_CACHE_MAX_MB', 256)) * 1024**2,
+            timeout=float(os.getenv('QUERY_PROXY_TIMEOUT', 60))
+        )
+
+    def _count(self, state):
+        with self._lock:
+            self.requests[state] = self.requests.get(state, 0) + 1
+
+    # Upstream
+
+    def forward(self, method, path, headers, body=None):
+        """(status, headers, body) of the same request made to InfluxDB"""
+        cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        connection = cls(self.host, self.port, timeout=self.timeout)
+        start = time.perf_counter()
+        try:
+            connection.request(method, self.base + path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+            self.upstream_seconds.observe(time.perf_counter() - start)
+        with self._lock:
+            self.upstream_queries += 1
+            self.upstream_bytes += len(data)
+            if response.status >= 300:
+                self.upstream_errors += 1
+        return response.status, response.headers, data
+
+    # Queries
+
+    def query(self, path, headers, body):
+        """(status, content type, body, cache state) for a POST to /api/v2/query"""
+        content_type = headers.get('Content-Type', 'application/json')
+        try:
+            if content_type.startswith('application/vnd.flux'):
+                document, text = None, body.decode('utf-8')
+            else:
+                document = json.loads(body)
+                text = document['query']
+                if any(field in document for field in OPAQUE_FIELDS):
+                    raise ValueError('query depends on request fields')
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+            status, response_headers, data = self.forward('POST', path, headers, body)
+            return status, response_headers.get('Content-Type', 'text/csv'), data, 'bypass'
+
+        normalized = normalize(text)
+        plan = QueryPlan.build(normalized, time.time_ns(), self.align)
+        options = {key: value for key, value in (document or {}).items() if key != 'query'}
+        scope = json.dumps([path, headers.get('Authorization', ''), content_type.split(';')[0], options],
+                           sort_keys=True)
+        template = hashlib.sha1(f'{scope}\n{plan.template if plan else normalized}'.encode('utf-8')).hexdigest()
+        key = f'{template}:{plan.start}:{plan.stop}' if plan else template
+
+        def request_body(start=None, stop=None):
+            query = plan.query(start, stop) if plan else text
+            if document is None:
+                return query.encode('utf-8')
+            return json.dumps({**document, 'query': query}).encode('utf-8')
+
+        # One request per key queries InfluxDB; the others wait for its result
+        state = 'hit'
+        while True:
+            with self._lock:
+                entry = self.cache.get(key)
+                if entry is not None and entry.expires > time.monotonic():
+                    return 200, entry.content_type, entry.body, state
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    self._inflight[key] = threading.Event()
+                    base = None
+                    if plan and plan.incremental:
+                        base = self.cache.extendable(template, plan.start, plan.stop)
+                    break
+            state = 'coalesced'
+            waiting.wait(self.timeout)
+
+        try:
+            upstream_headers = {name: value for name, value in headers.items()
+                                if name.lower() in ('authorization', 'content-type', 'accept')}
+            status, data, response_type, state = None, None, 'text/csv; charset=utf-8', 'miss'
+            if base is not None:
+                tail = None
+                if base.complete < plan.stop:
+                    status, response_headers, tail = self.forward('POST', path, upstream_headers,
+                                                                  request_body(base.complete, plan.stop))
+                    response_type = response_headers.get('Content-Type', response_type)
+                if status in (None, 200) and not (tail and ERROR_TABLE.search(tail[:4096])):
+                    try:
+                        data = merge_results(base.body.decode('utf-8'), tail.decode('utf-8') if tail else None,
+                                             plan.start, base.complete, plan.stop, plan.every).encode('utf-8')
+                        response_type, status, state = base.content_type, 200, 'extend'
+                    except (MergeError, UnicodeDecodeError) as e:
+                        logger.debug(f"Could not extend cached result, querying the full window: {e}")
+            if data is None:
+                status, response_headers, data = self.forward(
+                    'POST', path, upstream_headers, request_body(plan.start, plan.stop) if plan else body)
+                response_type = response_headers.get('Content-Type', response_type)
+
+            if status == 200 and not ERROR_TABLE.search(data[:4096]):
+                now_ns = time.time_ns()
+                complete = None
+                ttl = self.ttl
+                if plan:
+                    complete = min(max((now_ns - self.lateness) // plan.step * plan.step, plan.start), plan.stop)
+                    if complete == plan.stop:
+                        ttl = self.history_ttl
+                with self._lock:
+                    self.cache.put(Entry(key, template, data, response_type, plan, complete,
+                                         time.monotonic() + ttl))
+            return status, response_type, data, state
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    # Reporting
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': dict(sorted(self.requests.items())),
+                'upstream_queries': self.upstream_queries,
+                'upstream_errors': self.upstream_errors,
+                'cache_entries': len(self.cache),
+                'cache_bytes': self.cache.bytes,
+                'evictions': self.cache.evictions
+            }
+
+    def render_metrics(self):
+        """Proxy metrics in the Prometheus text exposition format"""
+        with self._lock:
+            requests = sorted(self.requests.items())
+            entries, cached_bytes = len(self.cache), self.cache.bytes
+
+        text = MetricsText('query_proxy')
+        text.metric('requests_total', 'counter',
+                    'Query requests by how they were answered (hit, coalesced, extend, miss, bypass)',
+                    [({'cache': state}, count) for state, count in requests])
+        text.metric('upstream_queries_total', 'counter', 'Requests sent to InfluxDB', [({}, self.upstream_queries)])
+        text.metric('upstream_errors_total', 'counter', 'InfluxDB responses other than 2xx',
+                    [({}, self.upstream_errors)])
+        text.metric('upstream_bytes_total', 'counter', 'Bytes received from InfluxDB', [({}, self.upstream_bytes)])
+        text.metric('served_bytes_total', 'counter', 'Bytes of query results sent to clients',
+                    [({}, self.bytes_served)])
+        text.metric('cache_entries', 'gauge', 'Cached results', [({}, entries)])
+        text.metric('cache_bytes', 'gauge', 'Approximate memory held by cached results', [({}, cached_bytes)])
+        text.metric('cache_evictions_total', 'counter', 'Results evicted for age or the memory cap',
+                    [({}, self.cache.evictions)])
+        text.histogram('upstream_duration_seconds', 'Time per InfluxDB request', self.upstream_seconds)
+        text.histogram('request_duration_seconds', 'Time to answer a query request', self.request_seconds)
+        return text.render()
+
+
+def make_handler(proxy):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status, body, content_type=None, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body:
+                self.send_header('Content-Type', content_type or 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _forward(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else None
+            headers = {name: value for name, value in self.headers.items()
+                       if name.lower() not in ('host', 'connection', 'content-length', 'accept-encoding')}
+            start = time.perf_counter()
+            try:
+                if method == 'POST' and urlsplit(self.path).path == '/api/v2/query':
+                    status, content_type, data, state = proxy.query(self.path, headers, body or b'')
+                    proxy._count(state)
+                    with proxy._lock:
+                        proxy.bytes_served += len(data)
+                    self._reply(status, data, content_type, {'X-Cache': state.upper()})
+                else:
+                    status, response_headers, data = proxy.forward(method, self.path, headers, body)
+                    self._reply(status, data, response_headers.get('Content-Type'))
+            except (http.client.HTTPException, OSError) as e:
+                logger.warning(f"InfluxDB request failed: {e}")
+                self._reply(502, json.dumps({'code': 'unavailable', 'message': f'InfluxDB unreachable: {e}'})
+                            .encode('utf-8'))
+            finally:
+                proxy.request_seconds.observe(time.perf_counter() - start)
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == '/metrics':
+                self._reply(200, proxy.render_metrics().encode('utf-8'), CONTENT_TYPE)
+            elif path == '/stats':
+                self._reply(200, json.dumps(proxy.stats()).encode('utf-8'))
+            else:
+                self._forward('GET')
+
+        def do_POST(self):
+            self._forward('POST')
+
+        def do_DELETE(self):
+            self._forward('DELETE')
+
+        def do_PATCH(self):
+            self._forward('PATCH')
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def report(proxy, interval, stop):
+    """Log how queries were answered since the previous report"""
+    last = proxy.stats()
+    while not stop.wait(interval):
+        current = proxy.stats()
+        answered = {state: count - last['requests'].get(state, 0) for state, count in current['requests'].items()}
+        logger.info(f"Queries {answered}, {current['upstream_queries'] - last['upstream_queries']} sent to "
+                    f"InfluxDB; {current['cache_entries']} cached results, "
+                    f"{current['cache_bytes'] / 1024**2:.1f} MiB")
+        last = current
+
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caching Flux query proxy for the dashboards')
+    parser.add_argument('--host', default=os.getenv('QUERY_PROXY_HOST', '0.0.0.0'), help='Address to listen on')
+    parser.add_argument('--port', type=int, default=int(os.getenv('QUERY_PROXY_PORT', 8088)),
+                        help='Port to listen on')
+    parser.add_argument('--report-interval', type=float, default=float(os.getenv('QUERY_PROXY_REPORT_INTERVAL', 60)),
+                        help='Seconds between cache logs')
+
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    proxy = QueryProxy.from_env()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(proxy))
+    server.daemon_threads = True
+
+    stop = threading.Event()
+    threading.Thread(target=report, args=(proxy, args.report_interval, stop), daemon=True).start()
+    logger.info(f"Query proxy listening on http://{args.host}:{args.port}, querying {proxy.host}:{proxy.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        logger.info(f"Final stats: {json.dumps(proxy.stats())}")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
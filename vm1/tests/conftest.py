@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The services import their modules by name from the scripts directory (mounted at /app)
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
@@ -0,0 +1,165 @@
+import threading
+
+import pytest
+
+from ingest_gateway import IngestGateway, RateLimiter, UpstreamError, prepare_lines
+
+
+class RecordingUpstream:
+    """Stands in for InfluxDB: records writes and fails with the queued statuses"""
+
+    host, port = 'influxdb', 8086
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.writes = []
+        self.lock = threading.Lock()
+
+    def write(self, org, bucket, precision, lines):
+        with self.lock:
+            if self.failures:
+                raise UpstreamError(self.failures.pop(0), 'failed')
+            self.writes.append(list(lines))
+        return sum(len(line) + 1 for line in lines)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_gateway():
+    gateways = []
+
+    def make(upstream, **kwargs):
+        kwargs.setdefault('flush_interval', 3600)
+        gateway = IngestGateway(upstream, max_retry_delay=0.01, **kwargs)
+        gateways.append(gateway)
+        return gateway
+
+    yield make
+    for gateway in gateways:
+        gateway.close(timeout=1)
+
+
+def line(plant, value, timestamp=''):
+    return f'water,plant_id={plant} flow={value} {timestamp}'.rstrip()
+
+
+def test_prepare_lines_stamps_and_counts_plants():
+    body = '\n'.join([line('a', 1, 10), line('b', 2), '# comment', '', line('a', 3, 30)])
+    lines, plants, stamped = prepare_lines(body, 99)
+    assert lines[1].endswith(' 99')
+    assert plants == {'a': 2, 'b': 1}
+    assert stamped
+
+    _, _, stamped = prepare_lines(line('a', 1, 10), 99)
+    assert not stamped
+
+
+def test_prepare_lines_rejects_unterminated_strings():
+    with pytest.raises(ValueError, match='line 2'):
+        prepare_lines('water,plant_id=a flow=1 1\nwater,plant_id=a note="open 2', 0)
+
+
+def test_retried_body_is_queued_once(make_gateway):
+    upstream = RecordingUpstream()
+    gateway = make_gateway(upstream)
+    body = line('a', 1, 1000)
+    assert gateway.accept('org', 'bucket', 'ns', body, 'client')[0] == 204
+    assert gateway.accept('org', 'bucket', 'ns', body, 'client')[0] == 204
+    assert gateway.pending_lines == 1
+    assert gateway.duplicate_requests == 1
+
+
+def test_repeated_body_without_timestamps_is_not_deduped(make_gateway):
+    gateway = make_gateway(RecordingUpstream())
+    body = line('a', 1)
+    gateway.accept('org', 'bucket', 'ns', body, 'client')
+    gateway.accept('org', 'bucket', 'ns', body, 'client')
+    assert gateway.pending_lines == 2
+    assert gateway.duplicate_requests == 0
+
+
+def test_rate_limit_is_charged_to_each_lines_plant():
+    limiter = RateLimiter(rate=1, burst=10)
+    assert limiter.acquire({'a': 10}) == (0.0, None)
+    # 'b' is within its own budget, but 'a' has none left: nothing is charged
+    wait, plant = limiter.acquire({'b': 5, 'a': 1})
+    assert wait > 0 and plant == 'a'
+    assert limiter.acquire({'b': 10}) == (0.0, None)
+
+
+def test_mixed_body_is_limited_by_the_plant_over_its_rate(make_gateway):
+    gateway = make_gateway(RecordingUpstream(), rate_limit=1, rate_burst=3)
+    assert gateway.accept('org', 'bucket', 'ns', '\n'.join(line('b', i, i) for i in range(3)), 'c')[0] == 204
+    body = '\n'.join([line('a', 1, 1), line('b', 9, 9)])
+    status, payload, headers = gateway.accept('org', 'bucket', 'ns', body, 'c')
+    assert status == 429 and 'plant b' in payload['message'] and 'Retry-After' in headers
+    assert gateway.rate_limited == {'b': 1}
+
+
+def test_writes_get_503_while_upstream_fails(make_gateway):
+    upstream = RecordingUpstream(failures=[503, 503])
+    gateway = make_gateway(upstream)
+    gateway.accept('org', 'bucket', 'ns', line('a', 1, 1), 'c')
+
+    failing = threading.Event()
+    original = upstream.write
+
+    def write(*args):
+        try:
+            return original(*args)
+        finally:
+            if gateway.upstream_failing:
+                failing.set()
+                # Hold the retry until the handler side has been checked
+                assert resume.wait(5)
+
+    resume = threading.Event()
+    upstream.write = write
+    flusher = threading.Thread(target=gateway._flush_queue, args=(('org', 'bucket', 'ns'),))
+    flusher.start()
+    assert failing.wait(5)
+    status, _, headers = gateway.accept('org', 'bucket', 'ns', line('a', 2, 2), 'c')
+    assert status == 503 and 'Retry-After' in headers
+    resume.set()
+    flusher.join(5)
+
+    assert not gateway.upstream_failing
+    assert upstream.writes == [[line('a', 1, 1)]]
+    assert gateway.accept('org', 'bucket', 'ns', line('a', 2, 2), 'c')[0] == 204
+
+
+@pytest.mark.parametrize('status', [401, 403])
+def test_auth_failure_drops_the_batch(make_gateway, status):
+    upstream = RecordingUpstream(failures=[status])
+    gateway = make_gateway(upstream)
+    gateway.accept('org', 'bucket', 'ns', line('a', 1, 1), 'c')
+    gateway.accept('org', 'bucket', 'ns', line('b', 1, 1), 'c')
+    assert gateway._flush_queue(('org', 'bucket', 'ns'))
+    assert upstream.writes == []
+    assert gateway.lines_rejected == 2
+    assert gateway.pending_lines == 0
+    assert not gateway.upstream_failing
+
+
+def test_rejected_batch_drops_only_the_bad_request(make_gateway):
+    upstream = RecordingUpstream(failures=[400, 400])
+    gateway = make_gateway(upstream)
+    gateway.accept('org', 'bucket', 'ns', line('bad', 1, 1), 'c')
+    gateway.accept('org', 'bucket', 'ns', line('good', 1, 1), 'c')
+    gateway._flush_queue(('org', 'bucket', 'ns'))
+    assert upstream.writes == [[line('good', 1, 1)]]
+    assert gateway.lines_rejected == 1
+    assert gateway.lines_written == 1
+
+
+def test_large_counters_render_exactly(make_gateway):
+    gateway = make_gateway(RecordingUpstream())
+    gateway.lines_written = 12345679
+    gateway.upstream_bytes = 98765432109
+    gateway.flush_seconds.observe(1234567.5)
+    text = gateway.render_metrics()
+    assert 'ingest_gateway_lines_written_total 12345679\n' in text
+    assert 'ingest_gateway_upstream_bytes_total 98765432109\n' in text
+    assert 'ingest_gateway_flush_duration_seconds_sum 1234567.5\n' in text
@@ -0,0 +1,149 @@
+import re
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import query_proxy
+from query_proxy import QueryPlan, QueryProxy, format_rfc3339, normalize, parse_duration, parse_rfc3339
+
+NOW = 1792190400 * 10**9 + 3 * 10**9
+SECOND = 10**9
+
+
+def fake_result(query):
+    """What InfluxDB would answer: a flow series every 5s for plants A and B (B with gaps)"""
+    match = re.search(r'range\(start: (\S+), stop: (\S+)\)', query)
+    start, stop = parse_rfc3339(match.group(1)), parse_rfc3339(match.group(2))
+    window = re.search(r'aggregateWindow\(every: (\w+)', query)
+    every = parse_duration(window.group(1)) if window else None
+    lines = ['#group,false,false,true,true,false,false,true,true',
+             '#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,double,string,string',
+             '#default,_result,,,,,,,',
+             ',result,table,_start,_stop,_time,_value,_field,plant']
+    table = 0
+    for plant in ('A', 'B'):
+        first = -(-start // (5 * SECOND)) * 5 * SECOND
+        points = [(t, (t // SECOND * 7 + len(plant) * 13) % 101 / 3.0) for t in range(first, stop, 5 * SECOND)]
+        if plant == 'B':
+            points = [point for point in points if point[0] // SECOND % 600 >= 30]
+        if every:
+            windows = {}
+            for t, value in points:
+                windows.setdefault(min(t // every * every + every, stop), []).append(value)
+            points = sorted((t, sum(values) / len(values)) for t, values in windows.items())
+        if not points:
+            continue
+        lines.extend(f',,{table},{format_rfc3339(start)},{format_rfc3339(stop)},{format_rfc3339(t)},{value!r},'
+                     f'flow,{plant}' for t, value in points)
+        table += 1
+    if not table:
+        return '\r\n'
+    return '\r\n'.join(lines) + '\r\n\r\n'
+
+
+@pytest.fixture
+def influx():
+    queries = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['query']
+            queries.append(query)
+            data = fake_result(query).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}', queries
+    server.shutdown()
+    server.server_close()
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.ns = NOW
+        self.monotonic = 1000.0
+        monkeypatch.setattr(query_proxy.time, 'time_ns', lambda: self.ns)
+        monkeypatch.setattr(query_proxy.time, 'monotonic', lambda: self.monotonic)
+
+    def advance(self, seconds):
+        self.ns += seconds * SECOND
+        self.monotonic += seconds
+
+
+def ask(proxy, query):
+    body = json.dumps({'query': query, 'dialect': {'annotations': ['group', 'datatype', 'default']}})
+    return proxy.query('/api/v2/query?org=o', {'Content-Type': 'application/json', 'Authorization': 'Token t'},
+                       body.encode('utf-8'))
+
+
+def test_format_rfc3339_round_trips():
+    for timestamp in (0, NOW, NOW + 500 * 10**6, NOW + 1):
+        assert parse_rfc3339(format_rfc3339(timestamp)) == timestamp
+    assert format_rfc3339(NOW + 500 * 10**6).endswith(':03.5Z')
+
+
+@pytest.mark.parametrize('pipeline, incremental', [
+    ('|> filter(fn: (r) => r._field == "flow") |> aggregateWindow(every: 1m, fn: mean)', True),
+    ('|> keep(columns: ["_time", "_value"])', True),
+    ('|> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")', False),
+    ('|> group(columns: ["plant"])', False),
+    ('|> aggregateWindow(every: 1m, fn: mean) |> aggregateWindow(every: 5m, fn: max)', False),
+])
+def test_only_row_wise_pipelines_are_extended(pipeline, incremental):
+    plan = QueryPlan.build(normalize(f'from(bucket: "b") |> range(start: -1h) {pipeline}'), NOW, 10 * SECOND)
+    assert plan.incremental is incremental
+
+
+@pytest.mark.parametrize('query', [
+    'from(bucket: "b")\n  |> range(start: -1h)\n  |> filter(fn: (r) => r._field == "flow")',
+    'from(bucket: "b") |> range(start: -1h, stop: now()) |> filter(fn: (r) => r._field == "flow") '
+    '|> aggregateWindow(every: 1m, fn: mean, createEmpty: false) |> yield(name: "mean")',
+    'from(bucket: "b") |> range(start: -30m) |> aggregateWindow(every: 10s, fn: mean)',
+])
+def test_extended_result_matches_a_direct_query(influx, monkeypatch, query):
+    url, queries = influx
+    clock = Clock(monkeypatch)
+    proxy = QueryProxy(url, align=10, ttl=10, lateness=60)
+
+    states = []
+    for _ in range(40):
+        status, _, data, state = ask(proxy, query)
+        plan = QueryPlan.build(normalize(query), clock.ns, proxy.align)
+        assert status == 200
+        assert data.decode('utf-8') == fake_result(plan.query(plan.start, plan.stop))
+        states.append(state)
+        clock.advance(7)
+
+    assert 'extend' in states
+    assert len(queries) < len(states)
+
+
+def test_concurrent_requests_share_one_upstream_query(influx, monkeypatch):
+    url, queries = influx
+    Clock(monkeypatch)
+    proxy = QueryProxy(url, align=10, ttl=10, lateness=60)
+    query = 'from(bucket: "b") |> range(start: -1h) |> filter(fn: (r) => r._field == "flow")'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ask(proxy, query))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(results) == 10
+    assert len({data for _, _, data, _ in results}) == 1
+    assert len(queries) == 1
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Agent Hot Path Benchmark
+Times the code every plant runs each cycle (reading generation, point
+encoding, system metric collection, a collector scheduler tick) and reports
+ops/sec, allocations and bytes on the wire, with a saved baseline to compare
+against
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import threading
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+# Keep the agents self-contained: no spool, no endpoint, no ping subprocesses
+os.environ.setdefault('SPOOL_ENABLED', 'false')
+os.environ['METRICS_PORT'] = '0'
+os.environ['PROBE_PING'] = 'false'
+os.environ['PROBE_TARGETS'] = ''
+
+from sensor_simulator import WaterSensorSimulator
+
+logging.disable(logging.WARNING)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0)
+
+# Metrics that count as regressions; retained_blocks is shown as a leak hint
+# only, since agent state (histograms, caches) legitimately grows at first
+GATED_METRICS = ('ops_per_sec', 'peak_alloc_bytes', 'wire_bytes', 'wire_points')
+
+
+class CaptureWriter:
+    """Stands in for BatchWriter and counts what would go over the wire"""
+
+    queue_depth = 0
+
+    def __init__(self):
+        self.bytes = 0
+        self.points = 0
+
+    def write(self, records, urgent=False):
+        lines = [record for record in records if record]
+        self.points += len(lines)
+        self.bytes += len('\n'.join(lines).encode('utf-8'))
+        return True
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_health_server():
+    """Local /health endpoint so connectivity probes are fast and repeatable"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HealthHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_simulator():
+    simulator = WaterSensorSimulator('BENCH', 'Benchmark Plant', 'Lab', connect=False)
+    simulator.simulation_time = TIMESTAMP
+    simulator.writer = CaptureWriter()
+    return simulator
+
+
+def make_collector():
+    from data_collector import DataCollector
+
+    collector = DataCollector('BENCH')
+    if collector.writer:
+        collector.writer.close(timeout=1)
+    if collector.client:
+        collector.client.close()
+    collector.writer = CaptureWriter()
+    return collector
+
+
+def build_cases(include_collector):
+    """{name: (function, writer-or-None)}; each function runs one operation"""
+    simulator = make_simulator()
+    readings = simulator.generate_readings()
+    sensors = list(simulator.baseline_values)
+
+    def time_factor_and_constraints():
+        for sensor in sensors:
+            simulator.apply_sensor_constraints(sensor, simulator.get_time_factor(sensor) * 1.0)
+
+    cases = {
+        'generate_readings': (simulator.generate_readings, None),
+        'time_factor_constraints': (time_factor_and_constraints, None),
+        'sensor_send': (lambda: simulator.send_to_influxdb(readings, TIMESTAMP), simulator.writer),
+    }
+
+    if include_collector:
+        import psutil
+        from collectors import CollectorScheduler
+
+        collector = make_collector()
+        # One scheduler tick with every collector due, as on the agent
+        scheduler = CollectorScheduler(collector.collectors, collector.writer)
+
+        cases.update({
+            'collect_system_metrics': (collector.collect_system_metrics, None),
+            'collector_tick': (lambda: scheduler.run_once(TIMESTAMP), collector.writer),
+        })
+        psutil.cpu_percent(interval=None)
+
+    return cases
+
+
+def measure(function, writer, min_time, repeats):
+    """Best-of-repeats ops/sec, peak allocation and retained blocks per op, wire bytes per op"""
+    # Calibrate the number of operations per repeat
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10 or number >= 1 << 20:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Allocations for a single warmed-up operation
+    function()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+
+    result = {
+        'ops_per_sec': number / best,
+        'peak_alloc_bytes': peak - base,
+        'retained_blocks': retained,
+    }
+    if writer is not None:
+        start_bytes, start_points = writer.bytes, writer.points
+        function()
+        result['wire_bytes'] = writer.bytes - start_bytes
+        result['wire_points'] = writer.points - start_points
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Print the change against a baseline; returns the number of regressions"""
+    regressions = 0
+    print(f"\n{'case':<26}{'metric':<18}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            print(f"{name:<26}(not in baseline)")
+            continue
+        for metric, value in result.items():
+            old = previous.get(metric)
+            if old is None:
+                continue
+            change = (value - old) / old if old else (0.0 if value == old else float('inf'))
+            # Higher is better for throughput, lower is better for everything else
+            worse = -change if metric == 'ops_per_sec' else change
+            flag = ''
+            if metric in GATED_METRICS and worse > threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"{name:<26}{metric:<18}{old:>14,.1f}{value:>14,.1f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agent hot path benchmark with baseline comparison')
+    parser.add_argument('--min-time', type=float, default=1.0, help='Target seconds per timed repeat')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed repeats per case (best is kept)')
+    parser.add_argument('--cases', help='Comma-separated subset of cases to run')
+    parser.add_argument('--no-collector', action='store_true',
+                        help='Skip the data collector cases (no psutil/requests needed)')
+    parser.add_argument('--save', nargs='?', const=BASELINE, metavar='FILE',
+                        help='Save results as the baseline (default vm2/benchmarks/baseline.json)')
+    parser.add_argument('--compare', nargs='?', const=BASELINE, metavar='FILE',
+                        help='Compare against a saved baseline and exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='Relative change counted as a regression')
+
+    args = parser.parse_args()
+
+    random.seed(42)
+    server = None
+    if not args.no_collector:
+        server = start_health_server()
+        os.environ['INFLUXDB_URL'] = f"http://127.0.0.1:{server.server_port}"
+
+    cases = build_cases(not args.no_collector)
+    if args.cases:
+        wanted = [name.strip() for name in args.cases.split(',')]
+        unknown = [name for name in wanted if name not in cases]
+        if unknown:
+            parser.error(f"Unknown cases {unknown}; choose from {sorted(cases)}")
+        cases = {name: cases[name] for name in wanted}
+
+    results = {}
+    print(f"{'case':<26}{'ops/sec':>14}{'peak alloc B':>14}{'retained':>10}{'wire B':>10}")
+    for name, (function, writer) in cases.items():
+        random.seed(42)
+        result = measure(function, writer, args.min_time, args.repeats)
+        results[name] = result
+        print(f"{name:<26}{result['ops_per_sec']:>14,.0f}{result['peak_alloc_bytes']:>14,}"
+              f"{result['retained_blocks']:>10}{result.get('wire_bytes', ''):>10}")
+
+    if server:
+        server.shutdown()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                'results': results
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
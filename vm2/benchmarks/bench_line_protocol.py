@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Line Protocol Encoder Benchmark
+Checks that the pre-encoded fast path matches Point.to_line_protocol() byte
+for byte, then times both paths for a fleet of simulated plants
+"""
+
+import os
+import sys
+import time
+import math
+import random
+import argparse
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from influxdb_client import Point
+from line_protocol import SeriesEncoder
+from schema import SCHEMA_MODES, MetricEncoder, build_metric_points
+
+SENSORS = ['flow_rate', 'ph_level', 'temperature', 'pressure', 'turbidity', 'chlorine',
+           'dissolved_oxygen', 'conductivity', 'total_dissolved_solids', 'alkalinity']
+
+# Tag values exercising every escaping rule
+AWKWARD_TAGS = [
+    {'plant_id': 'A', 'plant_name': 'Plant A', 'location': 'North District'},
+    {'plant_id': 'B,1', 'plant_name': 'a=b', 'location': 'tab\there'},
+    {'plant_id': 'C', 'plant_name': 'ends with\\', 'location': 'new\nline'},
+    {'plant_id': 'D', 'plant_name': '', 'location': None},
+]
+
+AWKWARD_FIELDS = {
+    'float': 1.5,
+    'whole float': 800.0,
+    'tiny': 1e-07,
+    'huge': 1.5e+20,
+    'negative': -2.25,
+    'int': 42,
+    'bool true': True,
+    'bool false': False,
+    'string': 'say "hi" \\ bye',
+    'nan': math.nan,
+    'inf': math.inf,
+    'none': None,
+    'key,with=escapes': 3.0,
+}
+
+TIMESTAMPS = [
+    datetime(2024, 1, 1, 12, 30, 45, 123456),
+    datetime(2024, 6, 1, 8, 0, tzinfo=timezone(timedelta(hours=2))),
+    datetime(1969, 12, 31, 23, 59, 59, 999999),
+    1704067200123456789,
+]
+
+
+def reference_line(measurement, tags, fields, timestamp):
+    point = Point(measurement)
+    for tag_name, tag_value in tags.items():
+        point.tag(tag_name, tag_value)
+    for field_name, value in fields.items():
+        point.field(field_name, value)
+    return point.time(timestamp).to_line_protocol()
+
+
+def check_equivalence():
+    """Compare the encoder against Point for awkward inputs; returns the mismatch count"""
+    mismatches = 0
+    checked = 0
+
+    def compare(expected, actual, label):
+        nonlocal mismatches, checked
+        checked += 1
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {label}\n  Point:   {expected!r}\n  encoder: {actual!r}")
+
+    for tags in AWKWARD_TAGS:
+        for timestamp in TIMESTAMPS:
+            for measurement in ('water_metrics', 'plant status', 'comma,measurement'):
+                encoder = SeriesEncoder(measurement, tags)
+                compare(reference_line(measurement, tags, AWKWARD_FIELDS, timestamp),
+                        encoder.encode(AWKWARD_FIELDS, timestamp),
+                        f"{measurement} {tags}")
+                for field_name, value in AWKWARD_FIELDS.items():
+                    compare(reference_line(measurement, tags, {'value': value}, timestamp),
+                            encoder.encode_value(value, timestamp),
+                            f"{measurement} {tags} value={field_name}")
+
+            readings = {sensor: round(random.uniform(0, 1000), 3) for sensor in SENSORS}
+            readings['whole'] = 800.0
+            for mode in SCHEMA_MODES:
+                expected = [line for line in (p.to_line_protocol() for p in
+                            build_metric_points('water_metrics', tags, readings, timestamp, mode)) if line]
+                actual = MetricEncoder('water_metrics', tags, mode).encode(readings, timestamp)
+                compare(expected, actual, f"{mode} water_metrics {tags}")
+
+    print(f"Equivalence: {checked - mismatches}/{checked} cases identical")
+    return mismatches
+
+
+def make_fleet(plants):
+    fleet = []
+    for i in range(plants):
+        tags = {'plant_id': f'P{i:04d}', 'plant_name': f'Plant {i}', 'location': f'District {i % 17}'}
+        readings = {sensor: round(random.uniform(0, 1000), 3) for sensor in SENSORS}
+        fleet.append((tags, readings))
+    return fleet
+
+
+def bench_points(fleet, mode, cycles):
+    start = time.perf_counter()
+    lines = 0
+    for _ in range(cycles):
+        timestamp = datetime.utcnow()
+        for tags, readings in fleet:
+            for point in build_metric_points('water_metrics', tags, readings, timestamp, mode):
+                point.to_line_protocol()
+                lines += 1
+    return lines, time.perf_counter() - start
+
+
+def bench_encoder(fleet, mode, cycles):
+    encoders = [(MetricEncoder('water_metrics', tags, mode), readings) for tags, readings in fleet]
+    start = time.perf_counter()
+    lines = 0
+    for _ in range(cycles):
+        timestamp = datetime.utcnow()
+        for encoder, readings in encoders:
+            lines += len(encoder.encode(readings, timestamp))
+    return lines, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Line protocol encoder equivalence check and benchmark')
+    parser.add_argument('--plants', type=int, default=200, help='Number of simulated plants')
+    parser.add_argument('--cycles', type=int, default=20, help='Collection cycles to encode')
+    parser.add_argument('--check-only', action='store_true', help='Only run the equivalence check')
+
+    args = parser.parse_args()
+
+    random.seed(42)
+    if check_equivalence():
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    fleet = make_fleet(args.plants)
+    for mode in SCHEMA_MODES:
+        point_lines, point_time = bench_points(fleet, mode, args.cycles)
+        encoder_lines, encoder_time = bench_encoder(fleet, mode, args.cycles)
+        print(f"{mode:>6}: Point {point_lines / point_time:>12,.0f} lines/s | "
+              f"encoder {encoder_lines / encoder_time:>12,.0f} lines/s | "
+              f"speedup {point_time / encoder_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Sensor Engine Benchmark
+Compares VectorSensorEngine with the scalar generate_readings loop, both for
+statistical agreement and for readings generated per second
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+os.environ.setdefault('SPOOL_ENABLED', 'false')
+
+import numpy as np
+from sensor_simulator import WaterSensorSimulator
+from vector_engine import VectorSensorEngine
+
+logging.getLogger('sensor_simulator').setLevel(logging.ERROR)
+logging.getLogger('write_pipeline').setLevel(logging.ERROR)
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def scalar_block(simulator, samples, hour):
+    simulator.simulation_time = datetime(2024, 1, 1, hour)
+    return np.array([list(simulator.generate_readings().values()) for _ in range(samples)])
+
+
+def compare_statistics(simulator, engine, samples, tolerance):
+    """Compare per-sensor mean and percentiles at every hour; returns the number of deviations"""
+    deviations = 0
+    for hour in range(24):
+        scalar = scalar_block(simulator, samples, hour)
+        minutes, days = engine.slots([datetime(2024, 1, 1, hour)])
+        vector = engine.generate(samples, minutes, days)[0][:, 0, :]
+        for i, sensor in enumerate(engine.sensors):
+            expected = [np.mean(scalar[:, i])] + list(np.percentile(scalar[:, i], PERCENTILES))
+            actual = [np.mean(vector[:, i])] + list(np.percentile(vector[:, i], PERCENTILES))
+            for name, e, a in zip(['mean'] + [f'p{p}' for p in PERCENTILES], expected, actual):
+                if abs(a - e) > tolerance * max(abs(e), 1e-9):
+                    deviations += 1
+                    print(f"DEVIATION hour {hour} {sensor} {name}: scalar {e:.4f} vector {a:.4f}")
+    return deviations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized sensor engine benchmark')
+    parser.add_argument('--plants', type=int, default=500, help='Plants per generated block')
+    parser.add_argument('--timesteps', type=int, default=2880, help='Timesteps per generated block')
+    parser.add_argument('--samples', type=int, default=4000, help='Samples per hour for the statistics check')
+    parser.add_argument('--tolerance', type=float, default=0.02, help='Allowed relative deviation')
+
+    args = parser.parse_args()
+
+    random.seed(42)
+    simulator = WaterSensorSimulator('BENCH', 'Benchmark Plant', 'Lab')
+    engine = VectorSensorEngine(simulator, seed=42)
+
+    deviations = compare_statistics(simulator, engine, args.samples, args.tolerance)
+    print(f"Statistics: {deviations} deviations beyond {args.tolerance:.0%} "
+          f"(24 hours x {len(engine.sensors)} sensors x mean/percentiles)")
+
+    scalar_readings = 20000 // len(engine.sensors) * len(engine.sensors)
+    start = time.perf_counter()
+    scalar_block(simulator, scalar_readings // len(engine.sensors), 8)
+    scalar_rate = scalar_readings / (time.perf_counter() - start)
+
+    minutes = np.arange(args.timesteps) * 1440 // args.timesteps
+    start = time.perf_counter()
+    values, _ = engine.generate(args.plants, minutes)
+    vector_rate = values.size / (time.perf_counter() - start)
+
+    print(f"scalar: {scalar_rate:>14,.0f} readings/s")
+    print(f"vector: {vector_rate:>14,.0f} readings/s "
+          f"({args.plants} plants x {args.timesteps} timesteps, speedup {vector_rate / scalar_rate:.0f}x)")
+
+    simulator.writer.close()
+    if deviations:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+InfluxDB Write API Stand-in
+Serves /health and /api/v2/write locally so the agents can be load tested
+without VM1: validates line protocol, optionally persists it, injects latency
+and errors, and reports request, byte and point rates
+"""
+
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PRECISIONS = {'ns': 1, 'us': 1000, 'ms': 1000**2, 's': 1000**3}
+
+FLOAT_VALUE = re.compile(r'^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$')
+INT_VALUE = re.compile(r'^[+-]?\d+i$')
+UINT_VALUE = re.compile(r'^\d+u$')
+BOOL_VALUES = {'t', 'T', 'true', 'True', 'TRUE', 'f', 'F', 'false', 'False', 'FALSE'}
+
+# Timestamps InfluxDB accepts, in nanoseconds
+MIN_TIMESTAMP = -9223372036854775806
+MAX_TIMESTAMP = 9223372036854775806
+
+
+class LineProtocolError(ValueError):
+    pass
+
+
+def split_unescaped(text, separator, quotes=False, limit=None):
+    """Split on separator, skipping backslash escapes (and double-quoted strings if quotes)"""
+    parts = []
+    start = 0
+    in_string = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quotes and char == '"':
+            in_string = not in_string
+        elif char == separator and not in_string:
+            parts.append(text[start:i])
+            start = i + 1
+            if limit is not None and len(parts) == limit:
+                break
+        i += 1
+    if in_string:
+        raise LineProtocolError('unterminated string')
+    parts.append(text[start:])
+    return parts
+
+
+def field_type(raw):
+    if raw.startswith('"'):
+        if len(raw) < 2 or not raw.endswith('"'):
+            raise LineProtocolError(f'invalid string field value {raw!r}')
+        return 'string'
+    if INT_VALUE.match(raw):
+        return 'integer'
+    if UINT_VALUE.match(raw):
+        return 'unsigned'
+    if raw in BOOL_VALUES:
+        return 'boolean'
+    if FLOAT_VALUE.match(raw):
+        return 'float'
+    raise LineProtocolError(f'invalid field value {raw!r}')
+
+
+def parse_line(line, precision='ns'):
+    """Validate one line; returns (measurement, tags, {field: type}, timestamp_ns or None)"""
+    sections = split_unescaped(line, ' ', quotes=True)
+    sections = [section for section in sections if section != '']
+    if len(sections) < 2:
+        raise LineProtocolError('missing fields')
+    if len(sections) > 3:
+        raise LineProtocolError('unexpected text after timestamp')
+
+    measurement, *tag_pairs = split_unescaped(sections[0], ',')
+    if not measurement:
+        raise LineProtocolError('missing measurement')
+    tags = {}
+    for pair in tag_pairs:
+        parts = split_unescaped(pair, '=', limit=1)
+        if len(parts) != 2 or not parts[0] or not parts[1]:
+            raise LineProtocolError(f'invalid tag {pair!r}')
+        tags[parts[0]] = parts[1]
+
+    fields = {}
+    for pair in split_unescaped(sections[1], ',', quotes=True):
+        parts = split_unescaped(pair, '=', limit=1)
+        if len(parts) != 2 or not parts[0] or not parts[1]:
+            raise LineProtocolError(f'invalid field {pair!r}')
+        fields[parts[0]] = field_type(parts[1])
+
+    timestamp = None
+    if len(sections) == 3:
+        if not re.match(r'^-?\d+$', sections[2]):
+            raise LineProtocolError(f'invalid timestamp {sections[2]!r}')
+        timestamp = int(sections[2]) * PRECISIONS[precision]
+        if not MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP:
+            raise LineProtocolError(f'timestamp {sections[2]} out of range')
+
+    return measurement, tags, fields, timestamp
+
+
+class WriteStats:
+    """Request, byte and point counters shared by the handler threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.statuses = {}
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.points = 0
+
+    def record(self, status, received=0, decoded=0, points=0):
+        with self._lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+            self.points += points
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                'uptime_s': elapsed,
+                'requests': self.requests,
+                'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+                'bytes_received': self.bytes_received,
+                'bytes_decoded': self.bytes_decoded,
+                'points': self.points,
+                'points_per_s': self.points / elapsed,
+                'bytes_per_s': self.bytes_received / elapsed
+            }
+
+
+class InfluxStub:
+    """Write endpoint state: fault injection settings, field types, output file and stats"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 unavailable_rate=0.0, retry_after=1, token=None, output=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.unavailable_rate = unavailable_rate
+        self.retry_after = retry_after
+        self.token = token
+        self.output = open(output, 'a') if output else None
+        self.stats = WriteStats()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._field_types = {}
+
+    def injected_status(self):
+        """Status to fail this request with (500, 429 or 503), or None to accept it"""
+        with self._lock:
+            roll = self._random.random()
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+        if roll < self.error_rate:
+            return 500
+        roll -= self.error_rate
+        if roll < self.throttle_rate:
+            return 429
+        roll -= self.throttle_rate
+        if roll < self.unavailable_rate:
+            return 503
+        return None
+
+    def validate(self, bucket, body, precision):
+        """Parse every line; returns (points, None) or (None, (status, message)). All or nothing."""
+        lines = [line for line in body.split('\n') if line.strip() and not line.startswith('#')]
+        types = {}
+        for number, line in enumerate(lines, 1):
+            try:
+                measurement, _, fields, _ = parse_line(line.rstrip('\r'), precision)
+            except LineProtocolError as e:
+                return None, (400, f'unable to parse line {number}: {e}')
+            for field, kind in fields.items():
+                types[(bucket, measurement, field)] = (kind, number)
+
+        with self._lock:
+            for key, (kind, number) in types.items():
+                existing = self._field_types.get(key)
+                if existing and existing != kind:
+                    return None, (422, f'failure writing points: line {number}: field type conflict: '
+                                       f'input field "{key[2]}" on measurement "{key[1]}" is type {kind}, '
+                                       f'already exists as type {existing}')
+            for key, (kind, _) in types.items():
+                self._field_types.setdefault(key, kind)
+            if self.output:
+                self.output.write('\n'.join(lines) + '\n')
+                self.output.flush()
+        return lines, None
+
+    def close(self):
+        if self.output:
+            self.output.close()
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status, payload=None, headers=None):
+            body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body:
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == '/health':
+                self._reply(200, {'name': 'influxdb', 'message': 'ready for queries and writes',
+                                  'status': 'pass', 'version': 'stub'})
+            elif path == '/ping':
+                self._reply(204)
+            elif path == '/stats':
+                self._reply(200, stub.stats.snapshot())
+            else:
+                self._reply(404, {'code': 'not found', 'message': 'path not found'})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+
+            if url.path != '/api/v2/write':
+                self._reply(404, {'code': 'not found', 'message': 'path not found'})
+                return
+
+            if stub.token and self.headers.get('Authorization') != f'Token {stub.token}':
+                stub.stats.record(401, len(raw))
+                self._reply(401, {'code': 'unauthorized', 'message': 'unauthorized access'})
+                return
+
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            bucket = params.get('bucket')
+            precision = params.get('precision', 'ns')
+            if not bucket:
+                stub.stats.record(400, len(raw))
+                self._reply(400, {'code': 'invalid', 'message': 'bucket not specified'})
+                return
+            if precision not in PRECISIONS:
+                stub.stats.record(400, len(raw))
+                self._reply(400, {'code': 'invalid', 'message': f'invalid precision {precision!r}'})
+                return
+
+            status = stub.injected_status()
+            if status == 429 or status == 503:
+                stub.stats.record(status, len(raw))
+                self._reply(status, {'code': 'too many requests' if status == 429 else 'unavailable',
+                                     'message': 'injected by stub'},
+                            {'Retry-After': str(stub.retry_after)})
+                return
+            if status:
+                stub.stats.record(status, len(raw))
+                self._reply(status, {'code': 'internal error', 'message': 'injected by stub'})
+                return
+
+            try:
+                if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+                    body = gzip.decompress(raw)
+                else:
+                    body = raw
+                body = body.decode('utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                stub.stats.record(400, len(raw))
+                self._reply(400, {'code': 'invalid', 'message': f'unable to decode request body: {e}'})
+                return
+
+            points, error = stub.validate(bucket, body, precision)
+            if error:
+                stub.stats.record(error[0], len(raw), len(body))
+                self._reply(error[0], {'code': 'invalid' if error[0] == 400 else 'unprocessable entity',
+                                       'message': error[1]})
+                return
+
+            stub.stats.record(204, len(raw), len(body), len(points))
+            self._reply(204)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def report(stub, interval, stop):
+    """Log throughput since the previous report"""
+    last = stub.stats.snapshot()
+    while not stop.wait(interval):
+        current = stub.stats.snapshot()
+        elapsed = current['uptime_s'] - last['uptime_s']
+        logger.info(f"{current['requests'] - last['requests']} requests, "
+                    f"{(current['points'] - last['points']) / elapsed:.0f} points/s, "
+                    f"{(current['bytes_received'] - last['bytes_received']) / elapsed / 1024:.1f} KiB/s; "
+                    f"totals {current['points']} points, statuses {current['statuses']}")
+        last = current
+
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the InfluxDB v2 write API')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8086, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency per write, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- jitter on the latency, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of writes answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of writes answered with 429')
+    parser.add_argument('--unavailable-rate', type=float, default=0.0, help='Share of writes answered with 503')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429/503')
+    parser.add_argument('--token', help='Require this API token')
+    parser.add_argument('--output', help='Append accepted line protocol to this file')
+    parser.add_argument('--seed', type=int, help='Seed for latency and error injection')
+    parser.add_argument('--report-interval', type=float, default=10.0, help='Seconds between throughput logs')
+
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    stub = InfluxStub(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, unavailable_rate=args.unavailable_rate,
+                      retry_after=args.retry_after, token=args.token, output=args.output, seed=args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    server.daemon_threads = True
+
+    stop = threading.Event()
+    threading.Thread(target=report, args=(stub, args.report_interval, stop), daemon=True).start()
+    logger.info(f"InfluxDB stand-in listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        stub.close()
+        logger.info(f"Final stats: {json.dumps(stub.stats.snapshot())}")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Fleet Load Generator
+Ramps a fleet of virtual plants (the WaterSensorSimulator reading model)
+through target write rates against VM1, either through nginx (/api/) or
+straight at InfluxDB, and reports throughput, latency percentiles, errors
+and the saturation knee as JSON
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import queue
+import logging
+import argparse
+import platform
+import threading
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+os.environ.setdefault('SPOOL_ENABLED', 'false')
+os.environ.setdefault('METRICS_PORT', '0')
+
+import requests
+from sensor_simulator import WaterSensorSimulator
+from fleet_simulator import generate_roster
+from profiles import DiurnalProfiles
+from vector_engine import VectorSensorEngine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+logging.getLogger('sensor_simulator').setLevel(logging.ERROR)
+
+
+def percentile(values, q):
+    """Linearly interpolated percentile of a list, or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class StageStats:
+    """Results of the requests sent during one ramp stage"""
+
+    def __init__(self, target_pps):
+        self.target_pps = target_pps
+        self._lock = threading.Lock()
+        self.latencies_ms = []
+        self.statuses = {}
+        self.points_ok = 0
+        self.points_failed = 0
+        self.bytes_sent = 0
+        self.batches_shed = 0
+
+    def record(self, status, latency_ms, points, size):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies_ms.append(latency_ms)
+            self.bytes_sent += size
+            if status == 204:
+                self.points_ok += points
+            else:
+                self.points_failed += points
+
+    def summary(self, elapsed):
+        with self._lock:
+            requests_sent = sum(self.statuses.values())
+            errors = requests_sent - self.statuses.get(204, 0)
+            return {
+                'target_pps': self.target_pps,
+                'achieved_pps': self.points_ok / elapsed,
+                'points_failed': self.points_failed,
+                'requests': requests_sent,
+                'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+                'error_rate': errors / requests_sent if requests_sent else 0.0,
+                'batches_shed': self.batches_shed,
+                'bytes_per_s': self.bytes_sent / elapsed,
+                'latency_ms': {
+                    'p50': percentile(self.latencies_ms, 50),
+                    'p95': percentile(self.latencies_ms, 95),
+                    'p99': percentile(self.latencies_ms, 99),
+                    'max': max(self.latencies_ms) if self.latencies_ms else None
+                }
+            }
+
+
+class LoadGenerator:
+    """Generates plant readings at a paced rate and writes them from a pool of sessions"""
+
+    def __init__(self, url, token, org, bucket, plants, batch_size=500, concurrency=8,
+                 gzip_body=False, verify_tls=True, timeout=10.0):
+        self.write_url = url.rstrip('/') + '/api/v2/write'
+        self.params = {'org': org, 'bucket': bucket, 'precision': 'ns'}
+        self.headers = {'Authorization': f'Token {token}', 'Content-Type': 'text/plain; charset=utf-8'}
+        if gzip_body:
+            self.headers['Content-Encoding'] = 'gzip'
+        self.gzip_body = gzip_body
+        self.verify_tls = verify_tls
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        # Virtual plants reuse the simulator model; no deadband so every
+        # reading becomes a point and rates are predictable. They share one
+        # set of profiles, and readings for a batch's plants are generated
+        # as one block
+        profiles = DiurnalProfiles.from_env()
+        self.plants = []
+        for entry in generate_roster(plants):
+            plant = WaterSensorSimulator(entry['plant_id'], entry['plant_name'], entry['location'],
+                                         connect=False, profiles=profiles)
+            plant.deadband = None
+            self.plants.append(plant)
+        self._next_plant = 0
+        self.engine = VectorSensorEngine(self.plants[0])
+        self.points_per_plant = len(self.engine.sensors) + 1
+
+        # Small queue: if writers fall behind, batches are shed rather than
+        # building an unbounded backlog that hides the saturation point
+        self.batches = queue.Queue(maxsize=concurrency * 2)
+        self._stop = threading.Event()
+        self._workers = [threading.Thread(target=self._writer, name=f'load-writer-{i}', daemon=True)
+                         for i in range(concurrency)]
+        for worker in self._workers:
+            worker.start()
+
+    def _make_batch(self):
+        """At least batch_size points from the next plants in turn"""
+        lines = []
+        timestamp = datetime.now(timezone.utc)
+        minutes, days = self.engine.slots([timestamp])
+        while len(lines) < self.batch_size:
+            # As many plants as the batch still needs, up to the end of the roster
+            first = self._next_plant
+            count = min(len(self.plants) - first,
+                        max(1, -(-(self.batch_size - len(lines)) // self.points_per_plant)))
+            values, _ = self.engine.generate(count, minutes, days)
+            for offset, plant in enumerate(self.plants[first:first + count]):
+                plant.simulation_time = timestamp
+                lines.extend(plant.encode_readings(self.engine.readings(values, offset, 0), timestamp))
+            self._next_plant = (first + count) % len(self.plants)
+        return lines
+
+    def _writer(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                stats, lines = self.batches.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            body = '\n'.join(lines).encode('utf-8')
+            if self.gzip_body:
+                body = gzip.compress(body)
+            start = time.perf_counter()
+            try:
+                response = session.post(self.write_url, params=self.params, data=body, headers=self.headers,
+                                        timeout=self.timeout, verify=self.verify_tls)
+                status = response.status_code
+            except requests.RequestException as e:
+                logger.debug(f"Write failed: {e}")
+                status = 'error'
+            stats.record(status, (time.perf_counter() - start) * 1000, len(lines), len(body))
+        session.close()
+
+    def run_stage(self, target_pps, seconds):
+        """Offer target_pps points per second for seconds; returns the stage summary"""
+        stats = StageStats(target_pps)
+        interval = self.batch_size / target_pps
+        started = time.monotonic()
+        next_send = started
+        while True:
+            now = time.monotonic()
+            if now - started >= seconds:
+                break
+            if next_send > now:
+                time.sleep(next_send - now)
+            batch = self._make_batch()
+            try:
+                self.batches.put_nowait((stats, batch))
+            except queue.Full:
+                stats.batches_shed += 1
+            next_send += interval
+            # Don't try to catch up a backlog the generator itself caused
+            next_send = max(next_send, time.monotonic() - interval)
+
+        # Let in-flight requests of this stage finish before measuring
+        deadline = time.monotonic() + self.timeout
+        while not self.batches.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(min(self.timeout, 0.5))
+        # Rates are per second of offered load; the drain only completes it
+        return stats.summary(seconds)
+
+    def close(self):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout=self.timeout)
+
+
+def is_saturated(stage, shortfall, max_error_rate, latency_slo_ms):
+    """Reasons a stage counts as past the knee (empty when healthy)"""
+    reasons = []
+    if stage['achieved_pps'] < (1 - shortfall) * stage['target_pps']:
+        reasons.append('throughput')
+    if stage['error_rate'] > max_error_rate:
+        reasons.append('errors')
+    p99 = stage['latency_ms']['p99']
+    if latency_slo_ms and p99 is not None and p99 > latency_slo_ms:
+        reasons.append('latency')
+    return reasons
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ramp virtual plants against the VM1 write path')
+    parser.add_argument('--url', default=os.getenv('INFLUXDB_URL', 'http://localhost:8086'),
+                        help='InfluxDB base URL, e.g. http://vm1:8086 (direct) or https://vm1 (nginx /api/)')
+    parser.add_argument('--token', default=os.getenv('INFLUXDB_TOKEN', 'water_monitoring_token_2024'))
+    parser.add_argument('--org', default=os.getenv('INFLUXDB_ORG', 'water_treatment'))
+    parser.add_argument('--bucket', default=os.getenv('INFLUXDB_BUCKET', 'water_metrics'))
+    parser.add_argument('--plants', type=int, default=100, help='Virtual plants to draw readings from')
+    parser.add_argument('--start-rate', type=float, default=1000, help='Points/s offered in the first stage')
+    parser.add_argument('--step', type=float, default=1000, help='Points/s added per stage')
+    parser.add_argument('--factor', type=float, default=1.0,
+                        help='Multiply the rate by this per stage instead of adding --step (e.g. 1.5)')
+    parser.add_argument('--max-rate', type=float, default=50000, help='Highest points/s to offer')
+    parser.add_argument('--stage-seconds', type=float, default=30, help='Duration of each stage')
+    parser.add_argument('--batch-size', type=int, default=500, help='Points per write request')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent write connections')
+    parser.add_argument('--gzip', action='store_true', help='Gzip request bodies')
+    parser.add_argument('--insecure', action='store_true', help='Skip TLS verification (self-signed nginx)')
+    parser.add_argument('--shortfall', type=float, default=0.05,
+                        help='Achieved rate this far below target marks saturation')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Error rate that marks saturation')
+    parser.add_argument('--latency-slo', type=float, default=1000, help='p99 latency (ms) that marks saturation')
+    parser.add_argument('--keep-going', action='store_true', help='Keep ramping after the knee')
+    parser.add_argument('--report', help='Write the JSON report here instead of stdout')
+
+    args = parser.parse_args()
+
+    if args.insecure:
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    generator = LoadGenerator(args.url, args.token, args.org, args.bucket, args.plants,
+                              batch_size=args.batch_size, concurrency=args.concurrency,
+                              gzip_body=args.gzip, verify_tls=not args.insecure)
+
+    stages = []
+    knee = None
+    rate = args.start_rate
+    try:
+        while rate <= args.max_rate:
+            logger.info(f"Stage {len(stages) + 1}: offering {rate:.0f} points/s for {args.stage_seconds:.0f}s")
+            stage = generator.run_stage(rate, args.stage_seconds)
+            stage['saturated'] = is_saturated(stage, args.shortfall, args.max_error_rate, args.latency_slo)
+            stages.append(stage)
+            latency = stage['latency_ms']
+            logger.info(f"  achieved {stage['achieved_pps']:.0f} points/s, error rate {stage['error_rate']:.1%}, "
+                        f"p50/p95/p99 {latency['p50'] or 0:.0f}/{latency['p95'] or 0:.0f}/"
+                        f"{latency['p99'] or 0:.0f} ms, shed {stage['batches_shed']} batches"
+                        + (f", saturated ({', '.join(stage['saturated'])})" if stage['saturated'] else ""))
+            if stage['saturated'] and knee is None:
+                healthy = [s for s in stages if not s['saturated']]
+                knee = {
+                    'first_saturated_pps': rate,
+                    'max_sustained_pps': max((s['achieved_pps'] for s in healthy), default=0.0),
+                    'reasons': stage['saturated']
+                }
+                if not args.keep_going:
+                    break
+            rate = rate * args.factor if args.factor > 1 else rate + args.step
+    except KeyboardInterrupt:
+        logger.info("Ramp stopped by user")
+    finally:
+        generator.close()
+
+    report = {
+        'target': generator.write_url,
+        'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'settings': {
+            'plants': args.plants, 'batch_size': args.batch_size, 'concurrency': args.concurrency,
+            'gzip': args.gzip, 'stage_seconds': args.stage_seconds, 'shortfall': args.shortfall,
+            'max_error_rate': args.max_error_rate, 'latency_slo_ms': args.latency_slo
+        },
+        'stages': stages,
+        'knee': knee
+    }
+    output = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(output + '\n')
+        logger.info(f"Report written to {args.report}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
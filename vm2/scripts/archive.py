@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Local Archive
+Append-only columnar history on the plant VM, partitioned by day with
+compression of finished days and a size cap, plus time-range queries
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from columnar import ColumnarWriter, ColumnarReader, format_ns
+from line_protocol import to_nanoseconds
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX = '.col'
+PARTITION_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.col$')
+NS_PER_DAY = 86400 * 10**9
+
+
+def partition_date(timestamp_ns):
+    """UTC date (YYYY-MM-DD) of a nanosecond timestamp"""
+    return datetime.fromtimestamp(timestamp_ns // 10**9, timezone.utc).strftime('%Y-%m-%d')
+
+
+def date_range_ns(date):
+    """[start, end) of a YYYY-MM-DD partition date in nanoseconds"""
+    start = to_nanoseconds(datetime.strptime(date, '%Y-%m-%d'))
+    return start, start + NS_PER_DAY
+
+
+class LocalArchive:
+    """Per-series daily partition files under one directory
+
+    Each series (e.g. water_metrics) has a directory of YYYY-MM-DD.col files
+    in the columnar format, dated by the rows' UTC timestamps. The current
+    day's partition takes small uncompressed blocks every flush_interval
+    seconds, so little is lost in a crash; when a series moves on to a new
+    day the finished partition is rewritten as large compressed blocks.
+    Once the archive exceeds max_bytes the oldest finished partitions are
+    deleted. A row with fields the partition has no column for starts a new
+    part file for the day (YYYY-MM-DD.1.col, ...).
+
+    With readonly the archive is only queried: nothing is created, sealed
+    or deleted.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024**2, flush_interval=60.0, block_rows=4096,
+                 readonly=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.block_rows = block_rows
+
+        # Counters
+        self.rows_archived = 0
+        self.partitions_sealed = 0
+        self.partitions_deleted = 0
+
+        self._lock = threading.Lock()
+        # series -> (partition date, ColumnarWriter)
+        self._writers = {}
+        self._metadata = {}
+        self._last_flush = time.monotonic()
+
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+            self._seal_finished()
+            self._enforce_retention()
+
+    @classmethod
+    def from_env(cls, name):
+        """Archive under ARCHIVE_DIR/name configured from ARCHIVE_*, or None when disabled or unusable"""
+        if os.getenv('ARCHIVE_ENABLED', 'true').lower() != 'true':
+            return None
+        directory = os.path.join(os.getenv('ARCHIVE_DIR', '/data/archive'), name)
+        try:
+            archive = cls(
+                directory,
+                max_bytes=int(os.getenv('ARCHIVE_MAX_MB', 1024)) * 1024**2,
+                flush_interval=float(os.getenv('ARCHIVE_FLUSH_INTERVAL', 60))
+            )
+        except OSError as e:
+            logger.warning(f"Archive disabled, cannot use {directory}: {e}")
+            return None
+        logger.info(f"Archiving readings to {directory}")
+        return archive
+
+    # Partitions
+
+    def series(self):
+        """Names of the series with at least one partition"""
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)))
+
+    def partitions(self, series):
+        """[(date, part, path)] for a series, oldest first"""
+        series_dir = os.path.join(self.directory, series)
+        if not os.path.isdir(series_dir):
+            return []
+        found = []
+        for name in os.listdir(series_dir):
+            match = PARTITION_PATTERN.match(name)
+            if match:
+                found.append((match.group(1), int(match.group(2) or 0), os.path.join(series_dir, name)))
+        return sorted(found)
+
+    def _partition_path(self, series, date, part):
+        name = f"{date}{PARTITION_SUFFIX}" if not part else f"{date}.{part}{PARTITION_SUFFIX}"
+        return os.path.join(self.directory, series, name)
+
+    def _open(self, series, date, columns):
+        """Writer for the first part of date that can take columns, creating one if needed"""
+        os.makedirs(os.path.join(self.directory, series), exist_ok=True)
+        part = 0
+        while True:
+            path = self._partition_path(series, date, part)
+            part += 1
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                # Append to an existing part only if its columns cover these
+                try:
+                    with ColumnarReader(path) as reader:
+                        existing = reader.columns
+                except ValueError as e:
+                    logger.warning(f"Skipping unreadable archive partition {path}: {e}")
+                    continue
+                if not set(columns) <= set(existing):
+                    continue
+                columns = existing
+            return ColumnarWriter(path, columns, self._metadata.get(series), block_rows=self.block_rows)
+
+    def _seal(self, path):
+        """Rewrite a finished partition as large compressed blocks"""
+        with ColumnarReader(path) as reader:
+            if reader.metadata.get('sealed'):
+                return
+            tmp_path = path + '.tmp'
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            metadata = {key: value for key, value in reader.metadata.items() if key != 'columns'}
+            with ColumnarWriter(tmp_path, reader.columns, {**metadata, 'sealed': True},
+                                block_rows=self.block_rows, compress=True) as writer:
+                for timestamp, values in reader.scan():
+                    writer.append(timestamp, values)
+        os.replace(tmp_path, path)
+        self.partitions_sealed += 1
+        logger.info(f"Sealed archive partition {path} ({os.path.getsize(path)} bytes)")
+
+    def _seal_finished(self):
+        """Seal partitions of past days that were left unsealed (e.g. by a restart)"""
+        today = partition_date(time.time_ns())
+        for series in self.series():
+            for date, _, path in self.partitions(series):
+                if date < today:
+                    try:
+                        self._seal(path)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not seal archive partition {path}: {e}")
+
+    def _enforce_retention(self):
+        """Delete the oldest inactive partitions while the archive is over max_bytes"""
+        active = {writer.path for _, writer in self._writers.values()}
+        partitions = []
+        total = 0
+        for series in self.series():
+            for date, part, path in self.partitions(series):
+                size = os.path.getsize(path)
+                total += size
+                if path not in active:
+                    partitions.append((date, part, path, size))
+        for date, _, path, size in sorted(partitions):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.partitions_deleted += 1
+            logger.warning(f"Archive over {self.max_bytes} bytes, deleted {path}")
+
+    # Writing
+
+    def append(self, series, timestamp, values, metadata=None):
+        """Archive one row of numeric values for a series (other values are skipped)
+
+        metadata (e.g. measurement and tags) is stored in each new partition
+        of the series.
+        """
+        row = {
+            name: float(value) for name, value in values.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        if not row:
+            return
+        timestamp = to_nanoseconds(timestamp)
+        date = partition_date(timestamp)
+
+        with self._lock:
+            if metadata is not None:
+                self._metadata[series] = metadata
+            current = self._writers.get(series)
+            if current is not None and (current[0] != date or not set(row) <= set(current[1].columns)):
+                self._close_writer(series, seal=current[0] < date)
+                current = None
+            if current is None:
+                current = self._writers[series] = (date, self._open(series, date, sorted(row)))
+            current[1].append(timestamp, row)
+            self.rows_archived += 1
+
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _close_writer(self, series, seal):
+        _, writer = self._writers.pop(series)
+        writer.close()
+        if seal:
+            try:
+                self._seal(writer.path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not seal archive partition {writer.path}: {e}")
+        self._enforce_retention()
+
+    def _flush_locked(self):
+        for _, writer in self._writers.values():
+            writer.flush()
+        self._last_flush = time.monotonic()
+        self._enforce_retention()
+
+    def flush(self):
+        """Write buffered rows to their partitions"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Write buffered rows and close the open partitions (they are sealed once their day is over)"""
+        with self._lock:
+            for series in list(self._writers):
+                self._close_writer(series, seal=False)
+
+    # Queries
+
+    def scan(self, series, start=None, end=None):
+        """Yield (timestamp ns, {field: value}) for a series in [start, end), oldest partition first
+
+        Only partitions whose day overlaps the range are opened, each through
+        a memory map. Rows still buffered by a writer are not included.
+        """
+        start = None if start is None else to_nanoseconds(start)
+        end = None if end is None else to_nanoseconds(end)
+        for date, _, path in self.partitions(series):
+            day_start, day_end = date_range_ns(date)
+            if (start is not None and day_end <= start) or (end is not None and day_start >= end):
+                continue
+            try:
+                reader = ColumnarReader(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable archive partition {path}: {e}")
+                continue
+            with reader:
+                yield from reader.scan(start, end)
+
+    def columns(self, series):
+        """Every column in any of the series' partitions"""
+        columns = set()
+        for _, _, path in self.partitions(series):
+            with ColumnarReader(path) as reader:
+                columns.update(reader.columns)
+        return sorted(columns)
+
+    def metadata(self, series):
+        """Metadata stored with the series' newest partition"""
+        partitions = self.partitions(series)
+        if not partitions:
+            return {}
+        with ColumnarReader(partitions[-1][2]) as reader:
+            return reader.metadata
+
+
+def parse_time(value):
+    """ISO 8601 timestamp (naive means UTC) or a relative age such as 15m, 6h or 2d"""
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if match:
+        unit = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}[match.group(2)]
+        return datetime.now(timezone.utc) - timedelta(**{unit: int(match.group(1))})
+    # fromisoformat only accepts a Z suffix from Python 3.11
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the local archive on a plant VM')
+    parser.add_argument('directory', help='Archive directory, e.g. /data/archive/data_collector_A')
+    parser.add_argument('--series', help='Series to scan; lists the series and partitions when omitted')
+    parser.add_argument('--start', type=parse_time, help='Start (ISO 8601 UTC or an age like 6h)')
+    parser.add_argument('--end', type=parse_time, help='End, exclusive (ISO 8601 UTC or an age)')
+    parser.add_argument('--format', choices=('csv', 'json', 'lp'), default='csv',
+                        help='Output format; lp writes line protocol in the SCHEMA_MODE layout, '
+                             'ready to send to VM1')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f'{args.directory} is not a directory')
+    archive = LocalArchive(args.directory, readonly=True)
+
+    if not args.series:
+        for series in archive.series():
+            for date, part, path in archive.partitions(series):
+                with ColumnarReader(path) as reader:
+                    sealed = 'sealed' if reader.metadata.get('sealed') else 'open'
+                    print(f"{series} {date}{f'.{part}' if part else ''}: {reader.rows} rows, "
+                          f"{os.path.getsize(path)} bytes, {sealed}")
+        return
+
+    rows = archive.scan(args.series, args.start, args.end)
+    if args.format == 'json':
+        for timestamp, values in rows:
+            print(json.dumps({'time': format_ns(timestamp), **values}))
+    elif args.format == 'lp':
+        from schema import MetricEncoder, get_schema_mode
+        metadata = archive.metadata(args.series)
+        encoder = MetricEncoder(metadata.get('measurement', args.series), metadata.get('tags', {}),
+                                get_schema_mode())
+        for timestamp, values in rows:
+            for line in encoder.encode(values, timestamp):
+                print(line)
+    else:
+        columns = archive.columns(args.series)
+        print(','.join(['time'] + columns))
+        for timestamp, values in rows:
+            print(','.join([format_ns(timestamp)] + [str(values.get(column, '')) for column in columns]))
+    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
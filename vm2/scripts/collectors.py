@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Collector Scheduler
+Runs independent collectors, each on its own interval and timeout, from a
+timing wheel so a slow collector never delays the others
+"""
+
+import os
+import math
+import time
+import logging
+from datetime import timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import IntervalScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Collector:
+    """A named collection job
+
+    run(timestamp) collects and returns line-protocol lines stamped with the
+    scheduled time. A run still in progress when the next one is due is an
+    overrun (the new run is skipped); a run that takes longer than timeout has
+    its lines dropped, since they describe a moment that has long passed.
+    """
+
+    def __init__(self, name, run, interval, timeout=None):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.timeout = timeout if timeout is not None else interval
+
+        # Accounting
+        self.runs = 0
+        self.overruns = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.running = False
+
+    @classmethod
+    def from_env(cls, name, run, interval, timeout=None):
+        """Collector whose interval/timeout can be overridden by COLLECT_<NAME>_INTERVAL/_TIMEOUT"""
+        prefix = f"COLLECT_{name.upper()}"
+        interval = int(os.getenv(f"{prefix}_INTERVAL", interval))
+        timeout = float(os.getenv(f"{prefix}_TIMEOUT", timeout if timeout is not None else interval))
+        return cls(name, run, interval, timeout)
+
+    def fields(self):
+        """Accounting as point fields"""
+        return {
+            "interval_s": self.interval,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "last_duration_ms": self.last_duration * 1000,
+            "max_duration_ms": self.max_duration * 1000
+        }
+
+
+class TimingWheel:
+    """Hashed timing wheel: each slot holds the entries due when the wheel reaches it
+
+    Scheduling and advancing are O(1) per entry regardless of how many
+    different intervals are in use; delays longer than one revolution are
+    kept as a count of remaining rounds.
+    """
+
+    def __init__(self, slots=64):
+        self.slots = [[] for _ in range(slots)]
+        self.position = 0
+
+    def schedule(self, item, ticks):
+        """Make item due ticks (>= 1) advances from now"""
+        ticks = max(1, int(ticks))
+        slot = (self.position + ticks) % len(self.slots)
+        self.slots[slot].append([(ticks - 1) // len(self.slots), item])
+
+    def advance(self):
+        """Move one tick forward and return the items now due"""
+        self.position = (self.position + 1) % len(self.slots)
+        due = []
+        remaining = []
+        for entry in self.slots[self.position]:
+            if entry[0] == 0:
+                due.append(entry[1])
+            else:
+                entry[0] -= 1
+                remaining.append(entry)
+        self.slots[self.position] = remaining
+        return due
+
+
+class CollectorScheduler:
+    """Runs collectors concurrently on a shared tick and writes their lines to one writer"""
+
+    def __init__(self, collectors, writer, on_run=None):
+        self.collectors = list(collectors)
+        self.writer = writer
+        # Called as on_run(collector, duration) after every completed run
+        self.on_run = on_run
+
+        # Tick on the greatest common divisor of the intervals
+        self.tick = math.gcd(*(collector.interval for collector in self.collectors))
+        self.wheel = TimingWheel()
+        self.scheduler = IntervalScheduler(self.tick)
+        self.executor = ThreadPoolExecutor(max_workers=len(self.collectors), thread_name_prefix='collector')
+
+    def _schedule_first(self, start):
+        """Place each collector so it runs on wall-clock multiples of its own interval"""
+        epoch = start.replace(tzinfo=timezone.utc).timestamp()
+        due_now = []
+        for collector in self.collectors:
+            offset = (math.ceil(epoch / collector.interval) * collector.interval - epoch) / self.tick
+            if offset < 0.5:
+                due_now.append(collector)
+            else:
+                self.wheel.schedule(collector, round(offset))
+        return due_now
+
+    def _execute(self, collector, timestamp):
+        start = time.monotonic()
+        lines = []
+        try:
+            lines = collector.run(timestamp) or []
+        except Exception as e:
+            collector.failures += 1
+            logger.error(f"Collector {collector.name} failed: {e}")
+        finally:
+            duration = time.monotonic() - start
+            collector.runs += 1
+            collector.last_duration = duration
+            collector.max_duration = max(collector.max_duration, duration)
+            collector.running = False
+
+        if duration > collector.timeout:
+            collector.timeouts += 1
+            logger.warning(f"Collector {collector.name} took {duration:.1f}s (timeout {collector.timeout:g}s), "
+                           f"dropping {len(lines)} points")
+            lines = []
+
+        if lines and self.writer:
+            self.writer.write(lines)
+        logger.debug(f"Collector {collector.name}: {len(lines)} points in {duration * 1000:.0f} ms")
+        if self.on_run:
+            self.on_run(collector, duration)
+
+    def _dispatch(self, collector, timestamp):
+        # Re-arm first so the schedule never depends on how long a run takes
+        self.wheel.schedule(collector, collector.interval // self.tick)
+        if collector.running:
+            collector.overruns += 1
+            logger.warning(f"Collector {collector.name} still running after {collector.interval}s, "
+                           f"skipping this run")
+            return
+        collector.running = True
+        self.executor.submit(self._execute, collector, timestamp)
+
+    def run_once(self, timestamp):
+        """Run every collector once, concurrently, as on a tick where all are due; waits for them"""
+        for future in [self.executor.submit(self._execute, collector, timestamp) for collector in self.collectors]:
+            future.result()
+
+    def run(self):
+        """Tick until KeyboardInterrupt, dispatching due collectors; waits for running ones on exit"""
+        for collector in self.collectors:
+            logger.info(f"Collector {collector.name}: every {collector.interval}s, timeout {collector.timeout:g}s")
+
+        first = True
+        skipped = 0
+        try:
+            while True:
+                timestamp = self.scheduler.wait()
+                if first:
+                    first = False
+                    due = self._schedule_first(timestamp)
+                else:
+                    # Ticks the main thread missed still move the wheel
+                    due = []
+                    for _ in range(self.scheduler.skipped_ticks - skipped + 1):
+                        due.extend(collector for collector in self.wheel.advance() if collector not in due)
+                    skipped = self.scheduler.skipped_ticks
+                for collector in due:
+                    self._dispatch(collector, timestamp)
+        finally:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Columnar Files
+Compact binary files of timestamped readings: one typed float64 array per
+column and delta-encoded int64 timestamps, written in blocks and read back
+through a memory map
+"""
+
+import os
+import sys
+import mmap
+import json
+import math
+import zlib
+import struct
+import logging
+import argparse
+from array import array
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from line_protocol import to_nanoseconds
+
+logger = logging.getLogger(__name__)
+
+# File header: magic, metadata length, reserved; then JSON metadata padded to 8 bytes
+FILE_MAGIC = b'WTRCOL01'
+FILE_HEADER = struct.Struct('<8sII')
+
+# Block header: magic, flags, columns, rows, payload length, min/max timestamp (ns).
+# The payload is the timestamp deltas (the first one absolute) followed by
+# each column, all 8-byte values, optionally zlib-compressed and padded to 8
+BLOCK_MAGIC = b'BLK1'
+BLOCK_HEADER = struct.Struct('<4sHHIIqq')
+FLAG_COMPRESSED = 1
+
+_NATIVE_LITTLE = sys.byteorder == 'little'
+
+
+def _pad(length):
+    return -length % 8
+
+
+def _to_bytes(values):
+    if not _NATIVE_LITTLE:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _typed(buffer, typecode):
+    """A little-endian buffer as a typed sequence, zero-copy where possible"""
+    if _NATIVE_LITTLE:
+        return memoryview(buffer).cast(typecode)
+    values = array(typecode, bytes(buffer))
+    values.byteswap()
+    return values
+
+
+class ColumnBlock:
+    """One block's rows: timestamps in nanoseconds and a typed sequence per column"""
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class ColumnarWriter:
+    """Appends rows to a columnar file, a block at a time
+
+    Rows are buffered until block_rows have accumulated (or flush/close is
+    called) and then written as one block, so a crash loses at most the
+    buffered rows. Opening an existing file appends to it; its columns must
+    match. Missing values are stored as NaN.
+    """
+
+    def __init__(self, path, columns, metadata=None, block_rows=4096, compress=False, compress_level=6):
+        self.path = path
+        self.columns = list(columns)
+        self.block_rows = block_rows
+        self.compress = compress
+        self.compress_level = compress_level
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+        # Counters
+        self.rows_written = 0
+        self.blocks_written = 0
+
+        self._timestamps = array('q')
+        self._values = [array('d') for _ in self.columns]
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with ColumnarReader(path) as reader:
+                if reader.columns != self.columns:
+                    raise ValueError(f"{path} has columns {reader.columns}, not {self.columns}")
+                self.metadata = reader.metadata
+                end = reader.end
+            self._file = open(path, 'r+b')
+            # Drop a partial block left by a crash before appending
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self.metadata = {**(metadata or {}), 'columns': self.columns}
+            self._file = open(path, 'wb')
+            encoded = json.dumps(self.metadata, separators=(',', ':')).encode()
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, len(encoded), 0))
+            self._file.write(encoded + b'\0' * _pad(FILE_HEADER.size + len(encoded)))
+
+    def append(self, timestamp, values):
+        """Buffer one row; timestamp is a datetime (naive means UTC) or nanoseconds"""
+        self._timestamps.append(to_nanoseconds(timestamp))
+        for name, column in zip(self.columns, self._values):
+            value = values.get(name)
+            column.append(math.nan if value is None else float(value))
+        if len(self._timestamps) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a block"""
+        rows = len(self._timestamps)
+        if not rows:
+            return
+        timestamps = self._timestamps
+        deltas = array('q', [timestamps[0]])
+        deltas.extend(timestamps[i] - timestamps[i - 1] for i in range(1, rows))
+
+        payload = _to_bytes(deltas) + b''.join(_to_bytes(column) for column in self._values)
+        flags = 0
+        if self.compress:
+            payload = zlib.compress(payload, self.compress_level)
+            flags |= FLAG_COMPRESSED
+        self._file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, flags, len(self.columns), rows, len(payload),
+                                           min(timestamps), max(timestamps)))
+        self._file.write(payload + b'\0' * _pad(len(payload)))
+        self._file.flush()
+
+        self.rows_written += rows
+        self.blocks_written += 1
+        self._timestamps = array('q')
+        self._values = [array('d') for _ in self.columns]
+
+    def close(self):
+        """Write buffered rows and close the file"""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarReader:
+    """Reads a columnar file through a read-only memory map
+
+    Uncompressed blocks are exposed as views into the map without copying;
+    blocks whose time range does not overlap a query are skipped using only
+    their headers. A truncated final block (from a crash mid-write) is
+    ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+
+        if len(self._map) < FILE_HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a columnar file")
+        magic, length, _ = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a columnar file")
+        self.metadata = json.loads(self._map[FILE_HEADER.size:FILE_HEADER.size + length])
+        self.columns = self.metadata['columns']
+        self._start = FILE_HEADER.size + length + _pad(FILE_HEADER.size + length)
+
+        # Block index: (offset, flags, rows, payload length, min ts, max ts)
+        self.index = []
+        self.truncated = False
+        offset = self._start
+        while offset + BLOCK_HEADER.size <= len(self._map):
+            magic, flags, columns, rows, length, min_ts, max_ts = BLOCK_HEADER.unpack_from(self._map, offset)
+            end = offset + BLOCK_HEADER.size + length + _pad(length)
+            if magic != BLOCK_MAGIC or columns != len(self.columns) or end > len(self._map):
+                break
+            self.index.append((offset, flags, rows, length, min_ts, max_ts))
+            offset = end
+        self.end = offset
+        if offset != len(self._map):
+            self.truncated = True
+            logger.warning(f"Ignoring {len(self._map) - offset} bytes of partial block at the end of {path}")
+
+    @property
+    def rows(self):
+        return sum(entry[2] for entry in self.index)
+
+    @property
+    def time_range(self):
+        """(min, max) timestamp in nanoseconds, or None for a file without rows"""
+        if not self.index:
+            return None
+        return min(entry[4] for entry in self.index), max(entry[5] for entry in self.index)
+
+    def blocks(self, start=None, end=None):
+        """Yield ColumnBlocks that may hold rows in [start, end) (datetimes or nanoseconds)"""
+        start = None if start is None else to_nanoseconds(start)
+        end = None if end is None else to_nanoseconds(end)
+        for offset, flags, rows, length, min_ts, max_ts in self.index:
+            if (start is not None and max_ts < start) or (end is not None and min_ts >= end):
+                continue
+            payload = memoryview(self._map)[offset + BLOCK_HEADER.size:offset + BLOCK_HEADER.size + length]
+            if flags & FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            timestamps = list(accumulate(_typed(payload[:rows * 8], 'q')))
+            columns = {
+                name: _typed(payload[(i + 1) * rows * 8:(i + 2) * rows * 8], 'd')
+                for i, name in enumerate(self.columns)
+            }
+            yield ColumnBlock(timestamps, columns)
+
+    def scan(self, start=None, end=None):
+        """Yield (timestamp ns, {column: value}) for rows in [start, end), skipping missing values"""
+        start = None if start is None else to_nanoseconds(start)
+        end = None if end is None else to_nanoseconds(end)
+        for block in self.blocks(start, end):
+            columns = [(name, values.tolist()) for name, values in block.columns.items()]
+            for row, timestamp in enumerate(block.timestamps):
+                if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+                    continue
+                yield timestamp, {
+                    name: values[row] for name, values in columns if not math.isnan(values[row])
+                }
+
+    def close(self):
+        if not self._map.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                # A block view is still referenced; the map closes when it is collected
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_ns(timestamp):
+    return datetime.fromtimestamp(timestamp / 1e9, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Describe a columnar recording or archive file')
+    parser.add_argument('path', help='Columnar file')
+    parser.add_argument('--head', type=int, default=0, help='Also print the first N rows')
+
+    args = parser.parse_args()
+
+    with ColumnarReader(args.path) as reader:
+        size = os.path.getsize(args.path)
+        print(f"{args.path}: {reader.rows} rows in {len(reader.index)} blocks, {size} bytes"
+              f"{' (truncated)' if reader.truncated else ''}")
+        print(f"Columns: {', '.join(reader.columns)}")
+        metadata = {key: value for key, value in reader.metadata.items() if key != 'columns'}
+        if metadata:
+            print(f"Metadata: {json.dumps(metadata)}")
+        if reader.time_range:
+            first, last = reader.time_range
+            print(f"Time range: {format_ns(first)} to {format_ns(last)}")
+            values = reader.rows * len(reader.columns)
+            print(f"{size / values:.2f} bytes per value")
+        for count, (timestamp, values) in enumerate(reader.scan()):
+            if count >= args.head:
+                break
+            print(format_ns(timestamp), json.dumps(values))
+
+if __name__ == "__main__":
+    main()
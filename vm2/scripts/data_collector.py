@@ -7,11 +7,26 @@ Collects system metrics and forwards them to InfluxDB
 import os
 import time
 import psutil
+import signal
 import argparse
 import logging
-from datetime import datetime
-from influxdb_client import InfluxDBClient, Point
+import threading
+from datetime import timezone
+from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
+from write_pipeline import BatchWriter
+from schema import MetricEncoder, get_schema_mode
+from line_protocol import SeriesEncoder
+from scheduler import IntervalScheduler
+from collectors import Collector, CollectorScheduler
+from docker_stats import DockerStatsCollector
+from probes import ProbeEngine, parse_targets
+from rates import RateTracker
+from summary import EdgeSampler
+from archive import LocalArchive
+from live import LiveServer
+from instrumentation import (MetricsRegistry, MetricsServer, register_writer, register_scheduler,
+                             register_collectors, register_archive)
 
 # Configure logging
 logging.basicConfig(
@@ -21,7 +36,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class DataCollector:
-    def __init__(self, plant_id):
+    def __init__(self, plant_id, collection_interval=None):
         self.plant_id = plant_id
         
         # InfluxDB configuration
@@ -30,13 +45,94 @@ class DataCollector:
         self.influxdb_org = os.getenv('INFLUXDB_ORG', 'water_treatment')
         self.influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'water_metrics')
         
-        # Collection interval
-        self.collection_interval = int(os.getenv('COLLECTION_INTERVAL', 30))
+        # Collection interval (--interval, else COLLECTION_INTERVAL)
+        self.collection_interval = collection_interval or int(os.getenv('COLLECTION_INTERVAL', 30))
+        
+        # Point layout: narrow (one point per metric) or wide (one per cycle)
+        self.schema_mode = get_schema_mode()
+        
+        # Series prefixes are escaped once here, not on every cycle
+        tags = {"plant_id": self.plant_id}
+        self.encoders = {
+            measurement: MetricEncoder(measurement, tags, self.schema_mode)
+            for measurement in ("system_metrics", "docker_metrics", "connectivity_metrics")
+        }
+        self.status_encoder = SeriesEncoder("plant_status", tags)
+        self.scheduler_encoder = SeriesEncoder("collector_scheduler", tags)
+        
+        # Prime psutil's CPU counters; later calls report usage since the
+        # previous call instead of blocking for a sampling interval
+        psutil.cpu_percent(interval=None)
+        
+        # Docker stats stream in the background; per-container series are
+        # tagged by container name
+        self.docker_stats = DockerStatsCollector(max_age=max(60, 2 * int(os.getenv(
+            'COLLECT_DOCKER_INTERVAL', self.collection_interval))))
+        self.container_metrics = {}
+        self.container_encoders = {}
+        
+        # Connectivity probes run concurrently within one deadline
+        self.probe_engine = ProbeEngine(
+            parse_targets(os.getenv('PROBE_TARGETS', ''), self.influxdb_url),
+            deadline=float(os.getenv('PROBE_DEADLINE', 5)),
+            ping=os.getenv('PROBE_PING', 'true').lower() == 'true',
+            tcp_samples=int(os.getenv('PROBE_TCP_SAMPLES', 3)),
+            dns_ttl=float(os.getenv('PROBE_DNS_TTL', 300)),
+            verify_tls=os.getenv('PROBE_TLS_VERIFY', 'true').lower() == 'true'
+        )
+        self.probe_results = {}
+        self.probe_encoders = {}
+        
+        # Previous counter snapshots for per-second rates
+        self.rate_tracker = RateTracker()
+        self.nic_rates = {}
+        self.disk_rates = {}
+        self.device_encoders = {}
+        
+        # Collectors, each with its own interval and timeout (both default to
+        # COLLECTION_INTERVAL, overridable per collector with
+        # COLLECT_<NAME>_INTERVAL / COLLECT_<NAME>_TIMEOUT); add a Collector
+        # here to collect something new
+        interval = self.collection_interval
+        self.collectors = [
+            Collector.from_env("system", self.run_system, interval),
+            Collector.from_env("docker", self.run_docker, interval),
+            Collector.from_env("connectivity", self.run_connectivity, interval),
+            Collector.from_env("status", self.run_status, interval)
+        ]
+        self.collector_encoders = {}
+        self.scheduler = None
+        
+        # Edge sampling: when SAMPLE_INTERVAL is shorter than the system
+        # collector's interval, system metrics are sampled that often on a background
+        # thread and only summaries are sent; the last EDGE_WINDOW seconds
+        # stay in memory at full resolution
+        self.sample_interval = float(os.getenv('SAMPLE_INTERVAL', 0))
+        self.edge_window = float(os.getenv('EDGE_WINDOW', 3600))
+        self.sampler = None
+        self.sampler_lock = threading.Lock()
+        self.sampling = threading.Event()
+        
+        # Local history: raw system (every sample when edge sampling), Docker
+        # and connectivity metrics in daily columnar partitions under
+        # ARCHIVE_DIR, and the last LIVE_WINDOW seconds in memory behind the
+        # live API on LIVE_PORT; both opened by run_collection
+        self.archive = None
+        self.live = None
+        
+        # Self-instrumentation, served on METRICS_PORT and optionally written
+        # to InfluxDB as agent_metrics points
+        self.metrics = MetricsRegistry("data_collector", {"plant_id": self.plant_id})
+        self.metrics_server = None
+        self.self_metrics_influx = os.getenv('SELF_METRICS_INFLUX', 'false').lower() == 'true'
         
         # Initialize InfluxDB client
         self.client = None
         self.write_api = None
+        self.writer = None
         self.connect_influxdb()
+        if self.writer:
+            register_writer(self.metrics, self.writer)
         
     def connect_influxdb(self):
         """Connect to InfluxDB"""
@@ -47,17 +143,22 @@ class DataCollector:
                 org=self.influxdb_org
             )
             self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            # Writes happen on a background thread so collection timing is
+            # independent of VM1 latency
+            self.writer = BatchWriter.from_env(self.write_api, self.influxdb_bucket,
+                                              f"data_collector_{self.plant_id}")
             logger.info(f"Connected to InfluxDB at {self.influxdb_url}")
         except Exception as e:
             logger.error(f"Failed to connect to InfluxDB: {e}")
             self.client = None
             self.write_api = None
+            self.writer = None
     
-    def collect_system_metrics(self):
+    def collect_system_metrics(self, include_devices=True):
         """Collect system performance metrics"""
         try:
-            # CPU metrics
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU metrics (since the previous cycle)
+            cpu_percent = psutil.cpu_percent(interval=None)
             cpu_count = psutil.cpu_count()
             cpu_freq = psutil.cpu_freq()
             
@@ -74,6 +175,8 @@ class DataCollector:
             # Process metrics
             process_count = len(psutil.pids())
             
+            now = time.monotonic()
+            
             metrics = {
                 'cpu_percent': cpu_percent,
                 'cpu_count': cpu_count,
@@ -91,213 +194,288 @@ class DataCollector:
                 'process_count': process_count
             }
             
+            # Per-second rates since the previous cycle
+            totals = {
+                'network_sent_mb': network.bytes_sent / (1024**2),
+                'network_recv_mb': network.bytes_recv / (1024**2)
+            }
+            if disk_io:
+                totals['disk_read_mb'] = disk_io.read_bytes / (1024**2)
+                totals['disk_write_mb'] = disk_io.write_bytes / (1024**2)
+            metrics.update(self.rate_tracker.rates('total', totals, now))
+            
+            if include_devices:
+                self.collect_device_rates(now)
+            
             return metrics
             
         except Exception as e:
             logger.error(f"Failed to collect system metrics: {e}")
             return {}
     
+    def collect_device_rates(self, now):
+        """Collect per-NIC and per-disk I/O rates"""
+        nic_rates = {}
+        for nic, counters in psutil.net_io_counters(pernic=True).items():
+            rates = self.rate_tracker.rates(('nic', nic), {
+                'bytes_sent': counters.bytes_sent,
+                'bytes_recv': counters.bytes_recv,
+                'packets_sent': counters.packets_sent,
+                'packets_recv': counters.packets_recv,
+                'errors_in': counters.errin,
+                'errors_out': counters.errout,
+                'drops_in': counters.dropin,
+                'drops_out': counters.dropout
+            }, now)
+            if rates:
+                nic_rates[nic] = rates
+        
+        disk_rates = {}
+        for disk, counters in (psutil.disk_io_counters(perdisk=True) or {}).items():
+            # Loop and RAM devices only add noise
+            if disk.startswith(('loop', 'ram')):
+                continue
+            rates = self.rate_tracker.rates(('disk', disk), {
+                'read_bytes': counters.read_bytes,
+                'write_bytes': counters.write_bytes,
+                'read_ops': counters.read_count,
+                'write_ops': counters.write_count
+            }, now)
+            if rates:
+                disk_rates[disk] = rates
+        
+        self.nic_rates = nic_rates
+        self.disk_rates = disk_rates
+    
+    def sample_system_metrics(self):
+        """Background loop feeding system metric samples into the edge sampler"""
+        scheduler = IntervalScheduler(self.sample_interval)
+        while self.sampling.is_set():
+            timestamp = scheduler.wait()
+            metrics = self.collect_system_metrics(include_devices=False)
+            self.keep_local("system_metrics", timestamp, metrics)
+            with self.sampler_lock:
+                self.sampler.add(metrics, timestamp.replace(tzinfo=timezone.utc).timestamp())
+    
+    def summarize_system_metrics(self):
+        """System metric summaries since the last cycle, plus per-device rates over the cycle"""
+        self.collect_device_rates(time.monotonic())
+        with self.sampler_lock:
+            return self.sampler.summarize()
+    
     def collect_docker_metrics(self):
         """Collect Docker container metrics"""
         try:
-            import docker
-            
-            client = docker.from_env()
-            containers = client.containers.list()
-            
-            docker_metrics = {
-                'container_count': len(containers),
-                'running_containers': len([c for c in containers if c.status == 'running']),
-                'total_cpu_usage': 0,
-                'total_memory_usage': 0
-            }
-            
-            for container in containers:
-                try:
-                    stats = container.stats(stream=False)
-                    
-                    # CPU usage calculation
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - \
-                               stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats']['system_cpu_usage'] - \
-                                  stats['precpu_stats']['system_cpu_usage']
-                    
-                    if system_delta > 0:
-                        cpu_percent = (cpu_delta / system_delta) * 100
-                        docker_metrics['total_cpu_usage'] += cpu_percent
-                    
-                    # Memory usage
-                    memory_usage = stats['memory_stats']['usage']
-                    docker_metrics['total_memory_usage'] += memory_usage / (1024**2)  # Convert to MB
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to get stats for container {container.name}: {e}")
-                    continue
-            
+            docker_metrics, self.container_metrics = self.docker_stats.collect()
             return docker_metrics
-            
-        except ImportError:
-            logger.warning("Docker Python library not available, skipping Docker metrics")
-            return {}
         except Exception as e:
             logger.error(f"Failed to collect Docker metrics: {e}")
+            self.container_metrics = {}
             return {}
     
     def collect_network_connectivity(self):
-        """Check network connectivity to main hub"""
-        import subprocess
-        import socket
-        
-        connectivity_metrics = {}
-        
-        # Check if we can reach the main hub
+        """Check network connectivity to main hub and peers"""
         try:
-            # Extract hostname from InfluxDB URL
-            hostname = self.influxdb_url.replace('http://', '').replace('https://', '').split(':')[0]
-            
-            # Ping test
-            try:
-                result = subprocess.run(['ping', '-c', '1', '-W', '5', hostname], 
-                                      capture_output=True, text=True, timeout=10)
-                connectivity_metrics['ping_success'] = result.returncode == 0
-                if result.returncode == 0:
-                    # Extract ping time
-                    for line in result.stdout.split('\n'):
-                        if 'time=' in line:
-                            ping_time = line.split('time=')[1].split()[0]
-                            connectivity_metrics['ping_time_ms'] = float(ping_time)
-                            break
-            except Exception:
-                connectivity_metrics['ping_success'] = False
-            
-            # TCP connection test
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                port = 8086 if '8086' in self.influxdb_url else 80
-                result = sock.connect_ex((hostname, port))
-                connectivity_metrics['tcp_connect'] = result == 0
-                sock.close()
-            except Exception:
-                connectivity_metrics['tcp_connect'] = False
-            
-            # HTTP connectivity test
-            try:
-                import requests
-                response = requests.get(self.influxdb_url, timeout=5)
-                connectivity_metrics['http_connect'] = response.status_code < 400
-            except Exception:
-                connectivity_metrics['http_connect'] = False
-                
+            self.probe_results = self.probe_engine.run()
         except Exception as e:
             logger.error(f"Failed to check network connectivity: {e}")
-            connectivity_metrics = {
-                'ping_success': False,
-                'tcp_connect': False,
-                'http_connect': False
-            }
+            self.probe_results = {}
         
-        return connectivity_metrics
+        # Main hub summary, kept for existing dashboards
+        return {
+            probe_name: self.probe_results.get(("influxdb", probe), {}).get("success", False)
+            for probe_name, probe in (("ping_success", "ping"), ("tcp_connect", "tcp"), ("http_connect", "http"))
+            if probe != "ping" or self.probe_engine.ping
+        }
     
-    def send_metrics_to_influxdb(self, system_metrics, docker_metrics, connectivity_metrics):
-        """Send collected metrics to InfluxDB"""
-        if not self.write_api:
-            logger.error("InfluxDB not connected")
-            return False
+    def encode_system_metrics(self, system_metrics, timestamp, summarized=False):
+        """System metrics and per-device I/O rates as line protocol"""
+        if summarized:
+            points = self.encoders["system_metrics"].encode_summaries(system_metrics, timestamp)
+        else:
+            points = self.encoders["system_metrics"].encode(system_metrics, timestamp)
         
-        try:
-            points = []
-            timestamp = datetime.utcnow()
-            
-            # System metrics
-            for metric_name, value in system_metrics.items():
-                point = Point("system_metrics") \
-                    .tag("plant_id", self.plant_id) \
-                    .tag("metric_type", metric_name) \
-                    .field("value", value) \
-                    .time(timestamp)
-                points.append(point)
-            
-            # Docker metrics
-            for metric_name, value in docker_metrics.items():
-                point = Point("docker_metrics") \
-                    .tag("plant_id", self.plant_id) \
-                    .tag("metric_type", metric_name) \
-                    .field("value", value) \
-                    .time(timestamp)
-                points.append(point)
-            
-            # Connectivity metrics
-            for metric_name, value in connectivity_metrics.items():
-                point = Point("connectivity_metrics") \
-                    .tag("plant_id", self.plant_id) \
-                    .tag("metric_type", metric_name) \
-                    .field("value", 1 if value else 0) \
-                    .time(timestamp)
-                points.append(point)
-            
-            # Plant status
-            status_point = Point("plant_status") \
-                .tag("plant_id", self.plant_id) \
-                .field("status", "operational") \
-                .field("last_collection", timestamp.isoformat()) \
-                .time(timestamp)
-            points.append(status_point)
-            
-            self.write_api.write(bucket=self.influxdb_bucket, record=points)
-            logger.info(f"Sent {len(points)} metric points to InfluxDB")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send metrics to InfluxDB: {e}")
-            return False
+        # Per-device I/O rates
+        for measurement, tag, device_rates in (("network_interface_metrics", "interface", self.nic_rates),
+                                               ("disk_device_metrics", "device", self.disk_rates)):
+            for device, rates in device_rates.items():
+                encoder = self.device_encoders.get((measurement, device))
+                if encoder is None:
+                    encoder = SeriesEncoder(measurement, {"plant_id": self.plant_id, tag: device})
+                    self.device_encoders[(measurement, device)] = encoder
+                points.append(encoder.encode(rates, timestamp))
+        return points
+    
+    def encode_docker_metrics(self, docker_metrics, timestamp):
+        """Docker totals and per-container metrics as line protocol"""
+        points = self.encoders["docker_metrics"].encode(docker_metrics, timestamp)
+        for container_name, metrics in self.container_metrics.items():
+            encoder = self.container_encoders.get(container_name)
+            if encoder is None:
+                encoder = SeriesEncoder("docker_container_metrics", {
+                    "plant_id": self.plant_id,
+                    "container_name": container_name
+                })
+                self.container_encoders[container_name] = encoder
+            points.append(encoder.encode(metrics, timestamp))
+        return points
+    
+    def encode_connectivity_metrics(self, connectivity_metrics, timestamp):
+        """Connectivity booleans and per-target probe results as line protocol"""
+        connectivity_values = {name: 1 if value else 0 for name, value in connectivity_metrics.items()}
+        points = self.encoders["connectivity_metrics"].encode(connectivity_values, timestamp)
+        
+        # Probe latencies and histograms per target
+        for (target, probe), result in self.probe_results.items():
+            encoder = self.probe_encoders.get((target, probe))
+            if encoder is None:
+                encoder = SeriesEncoder("connectivity_latency", {
+                    "plant_id": self.plant_id,
+                    "target": target,
+                    "probe": probe
+                })
+                self.probe_encoders[(target, probe)] = encoder
+            fields = {"success": 1 if result["success"] else 0, "latency_ms": result["latency_ms"]}
+            histogram = self.probe_engine.histograms.get((target, probe))
+            if histogram:
+                fields.update(histogram.fields("ms"))
+            points.append(encoder.encode(fields, timestamp))
+        return points
+    
+    def encode_status(self, timestamp):
+        """Plant status, scheduler and collector health, and self-metrics as line protocol"""
+        points = [self.status_encoder.encode({
+            "status": "operational",
+            "last_collection": timestamp.isoformat()
+        }, timestamp)]
+        
+        # Scheduler health
+        if self.scheduler:
+            ticker = self.scheduler.scheduler
+            points.append(self.scheduler_encoder.encode({
+                "lateness_ms": ticker.last_lateness * 1000,
+                "skipped_ticks": ticker.skipped_ticks,
+                "last_cycle_ms": max(collector.last_duration for collector in self.collectors) * 1000
+            }, timestamp))
+        
+        # Per-collector runs, overruns and durations
+        for collector in self.collectors:
+            encoder = self.collector_encoders.get(collector.name)
+            if encoder is None:
+                encoder = SeriesEncoder("collector_runs", {"plant_id": self.plant_id, "collector": collector.name})
+                self.collector_encoders[collector.name] = encoder
+            points.append(encoder.encode(collector.fields(), timestamp))
+        
+        # Agent self-metrics
+        if self.self_metrics_influx:
+            points.extend(self.metrics.encode(timestamp))
+        return points
+    
+    def keep_local(self, measurement, timestamp, metrics):
+        """Hand a measurement's metrics to the live API and the local archive"""
+        if self.live:
+            self.live.publish(measurement, timestamp, metrics)
+        if self.archive:
+            self.archive.append(measurement, timestamp, metrics, {
+                "measurement": measurement,
+                "tags": {"plant_id": self.plant_id}
+            })
+    
+    def run_system(self, timestamp):
+        """System collector: current metrics, or the summary of the samples since its last run"""
+        if self.sampler:
+            return self.encode_system_metrics(self.summarize_system_metrics(), timestamp, summarized=True)
+        system_metrics = self.collect_system_metrics()
+        self.keep_local("system_metrics", timestamp, system_metrics)
+        return self.encode_system_metrics(system_metrics, timestamp)
+    
+    def run_docker(self, timestamp):
+        """Docker collector"""
+        docker_metrics = self.collect_docker_metrics()
+        self.keep_local("docker_metrics", timestamp, docker_metrics)
+        return self.encode_docker_metrics(docker_metrics, timestamp)
+    
+    def run_connectivity(self, timestamp):
+        """Connectivity collector"""
+        connectivity_metrics = self.collect_network_connectivity()
+        self.keep_local("connectivity_metrics", timestamp,
+                        {name: 1 if value else 0 for name, value in connectivity_metrics.items()})
+        return self.encode_connectivity_metrics(connectivity_metrics, timestamp)
+    
+    def run_status(self, timestamp):
+        """Status collector"""
+        points = self.encode_status(timestamp)
+        logger.info(", ".join(f"{collector.name} {collector.runs} runs/{collector.overruns} overruns"
+                              for collector in self.collectors)
+                    + f" (queue depth {self.writer.queue_depth if self.writer else 0})")
+        return points
+    
+    def observe_collector(self, collector, duration):
+        self.metrics.histogram("stage_duration_seconds", "Time per collector run",
+                               stage=collector.name).observe(duration)
     
     def run_collection(self):
         """Run the data collection process"""
         logger.info(f"Starting data collection for Plant {self.plant_id}")
         logger.info(f"Collection interval: {self.collection_interval} seconds")
+        logger.info(f"Schema mode: {self.schema_mode}")
+        
+        self.archive = LocalArchive.from_env(f"data_collector_{self.plant_id}")
+        if self.archive:
+            register_archive(self.metrics, self.archive)
+        self.live = LiveServer.from_env({"agent": "data_collector", "plant_id": self.plant_id})
         
-        while True:
-            try:
-                # Collect metrics
-                system_metrics = self.collect_system_metrics()
-                docker_metrics = self.collect_docker_metrics()
-                connectivity_metrics = self.collect_network_connectivity()
-                
-                # Log collected metrics
-                logger.info(f"Collected {len(system_metrics)} system metrics, "
-                          f"{len(docker_metrics)} Docker metrics, "
-                          f"{len(connectivity_metrics)} connectivity metrics")
-                
-                # Send to InfluxDB
-                if self.send_metrics_to_influxdb(system_metrics, docker_metrics, connectivity_metrics):
-                    logger.info("Metrics sent successfully")
-                else:
-                    logger.warning("Failed to send metrics")
-                
-                # Wait for next collection
-                time.sleep(self.collection_interval)
-                
-            except KeyboardInterrupt:
-                logger.info("Data collection stopped by user")
-                break
-            except Exception as e:
-                logger.error(f"Collection error: {e}")
-                time.sleep(self.collection_interval)
+        system = self.collectors[0]
+        if 0 < self.sample_interval < system.interval:
+            logger.info(f"Sampling system metrics every {self.sample_interval} seconds, "
+                        f"keeping {self.edge_window} seconds locally")
+            self.sampler = EdgeSampler(max(1, int(self.edge_window / self.sample_interval)), system.interval)
+            self.sampling.set()
+            threading.Thread(target=self.sample_system_metrics, name="edge-sampler", daemon=True).start()
+        
+        # Collectors run concurrently, each on its own interval; their points
+        # are stamped with the scheduled time so timestamps stay on the grid
+        self.scheduler = CollectorScheduler(self.collectors, self.writer, on_run=self.observe_collector)
+        register_scheduler(self.metrics, self.scheduler.scheduler)
+        register_collectors(self.metrics, self.collectors)
+        self.metrics_server = MetricsServer.from_env(self.metrics)
+        
+        try:
+            self.scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("Data collection stopped by user")
         
         # Cleanup
+        self.sampling.clear()
+        if self.metrics_server:
+            self.metrics_server.close()
+        if self.live:
+            self.live.close()
+        self.docker_stats.close()
+        self.probe_engine.close()
+        if self.archive:
+            self.archive.close()
+        if self.writer:
+            self.writer.close()
         if self.client:
             self.client.close()
 
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
 def main():
     parser = argparse.ArgumentParser(description='Water Treatment Plant Data Collector')
     parser.add_argument('--plant-id', required=True, help='Plant identifier (A, B, etc.)')
-    parser.add_argument('--interval', type=int, default=30, help='Collection interval in seconds')
+    parser.add_argument('--interval', type=int,
+                        help='Collection interval in seconds (default COLLECTION_INTERVAL or 30)')
     
     args = parser.parse_args()
     
+    # Treat docker stop (SIGTERM) like Ctrl+C so queued points get flushed
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     # Create and run collector
-    collector = DataCollector(args.plant_id)
+    collector = DataCollector(args.plant_id, args.interval)
     collector.run_collection()
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Deadband Filter
+Report-by-exception for sensor uplink: a reading is sent only when it leaves
+the band around the last value sent, or when its heartbeat is due
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_deadbands(spec):
+    """Parse "name=0.05,name=2%,*=1%" into {name: (amount, is_percent)}; * is the default"""
+    bands = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, amount = item.partition('=')
+        amount = amount.strip()
+        if not amount:
+            raise ValueError(f"Deadband '{item}' must look like name=amount or name=percent%")
+        percent = amount.endswith('%')
+        bands[name.strip()] = (float(amount.rstrip('%')), percent)
+    return bands
+
+
+class Deadband:
+    """Per-key deadband with a max-silence heartbeat
+
+    Times are the points' own timestamps in seconds, so the same filter works
+    for live cycles and for backfilled history.
+    """
+
+    def __init__(self, bands, heartbeat=300.0):
+        self.bands = bands
+        self.heartbeat = heartbeat
+        self._last = {}
+
+        # Counters
+        self.points_sent = 0
+        self.points_suppressed = 0
+
+    @classmethod
+    def from_env(cls):
+        """Deadband from DEADBAND / DEADBAND_HEARTBEAT, or None when no bands are configured"""
+        try:
+            bands = parse_deadbands(os.getenv('DEADBAND', ''))
+        except ValueError as e:
+            logger.error(f"Ignoring DEADBAND: {e}")
+            return None
+        if not bands:
+            return None
+        return cls(bands, heartbeat=float(os.getenv('DEADBAND_HEARTBEAT', 300)))
+
+    def _outside(self, key, reference, value):
+        band = self.bands.get(key, self.bands.get('*'))
+        if band is None or isinstance(value, (bool, str)) or isinstance(reference, (bool, str)):
+            return value != reference
+        amount, percent = band
+        limit = abs(reference) * amount / 100 if percent else amount
+        return abs(value - reference) > limit
+
+    def allow(self, key, value, now, extremes=()):
+        """True if value should be sent; extremes (e.g. a summary's min/max) also count as movement"""
+        last = self._last.get(key)
+        send = (
+            last is None or
+            now - last[1] >= self.heartbeat or
+            any(self._outside(key, last[0], candidate) for candidate in (value, *extremes))
+        )
+        if send:
+            self._last[key] = (value, now)
+            self.points_sent += 1
+        else:
+            self.points_suppressed += 1
+        return send
+
+    def filter(self, readings, now):
+        """The subset of {name: value} that should be sent"""
+        return {name: value for name, value in readings.items() if self.allow(name, value, now)}
+
+    def filter_summaries(self, summaries, now):
+        """The subset of {name: summary fields} whose value, min or max left the band"""
+        return {
+            name: summary for name, summary in summaries.items()
+            if self.allow(name, summary['value'], now, (summary['min'], summary['max']))
+        }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Anomaly Detector
+Flags readings in the agent as they are produced: hard limits, EWMA z-score
+and rate-of-change, with constant time and memory per sensor
+"""
+
+import os
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SensorState:
+    """Running EWMA statistics for one sensor's level and rate of change"""
+
+    __slots__ = ('mean', 'var', 'rate_mean', 'rate_var', 'last', 'last_time', 'count', 'outliers')
+
+    def __init__(self, value, now):
+        self.mean = value
+        self.var = 0.0
+        self.rate_mean = 0.0
+        self.rate_var = 0.0
+        self.last = value
+        self.last_time = now
+        self.count = 1
+        self.outliers = 0
+
+
+def ewma_update(mean, var, value, alpha):
+    """One step of an exponentially weighted mean and variance"""
+    diff = value - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * (var + diff * increment)
+
+
+class AnomalyDetector:
+    """Per-sensor streaming detector
+
+    limits:         {sensor: (low, high)} hard bounds, checked from the first sample
+    alpha:          EWMA smoothing factor (higher reacts faster)
+    z_threshold:    level and rate z-scores above this raise an alert
+    warmup:         samples to learn from before z-score checks start
+    min_std:        floor for the standard deviation, relative to the mean,
+                    so near-constant sensors don't alert on rounding noise
+    relearn:        consecutive outliers after which the level is taken as
+                    the new baseline
+
+    Samples that raise a z-score alert are not folded into the statistics (nor
+    used as the previous value for the next rate), so a spike neither widens
+    the band it is judged against nor raises a second alert when it recovers.
+    A level shift that persists for relearn samples is not a spike: the mean
+    is moved to the current value (keeping the learned spread) and alerts
+    stop until the level moves again.
+    """
+
+    def __init__(self, limits=None, alpha=0.05, z_threshold=4.0, warmup=30, min_std=0.001, relearn=10):
+        self.limits = limits or {}
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.min_std = min_std
+        self.relearn = relearn
+        self._states = {}
+
+        # Counters
+        self.samples = 0
+        self.alerts = 0
+        self.relearns = 0
+
+    @classmethod
+    def from_env(cls, limits=None):
+        """Detector configured from DETECTOR_* variables, or None when disabled"""
+        return cls.factory_from_env(limits)()
+
+    @classmethod
+    def factory_from_env(cls, limits=None):
+        """Callable returning a new detector (or None when disabled), reading DETECTOR_* only once
+
+        For many plants that each need their own sensor state but share one
+        configuration.
+        """
+        if os.getenv('DETECTOR_ENABLED', 'true').lower() != 'true':
+            return lambda: None
+        settings = {
+            'alpha': float(os.getenv('DETECTOR_ALPHA', 0.05)),
+            'z_threshold': float(os.getenv('DETECTOR_Z_THRESHOLD', 4)),
+            'warmup': int(os.getenv('DETECTOR_WARMUP', 30)),
+            'relearn': int(os.getenv('DETECTOR_RELEARN', 10))
+        }
+        return lambda: cls(limits, **settings)
+
+    def _zscore(self, value, mean, var):
+        std = max(math.sqrt(var), self.min_std * abs(mean), 1e-12)
+        return (value - mean) / std
+
+    def observe(self, sensor, value, now):
+        """Check one sample (now in seconds) and return a list of alert dicts"""
+        self.samples += 1
+        alerts = []
+
+        low, high = self.limits.get(sensor, (None, None))
+        if (low is not None and value < low) or (high is not None and value > high):
+            alerts.append({'alert_type': 'limit', 'value': value,
+                           'limit': low if low is not None and value < low else high})
+
+        state = self._states.get(sensor)
+        if state is None:
+            self._states[sensor] = SensorState(value, now)
+            self.alerts += len(alerts)
+            return alerts
+
+        elapsed = now - state.last_time
+        rate = (value - state.last) / elapsed if elapsed > 0 else 0.0
+        level_z = self._zscore(value, state.mean, state.var)
+        rate_z = self._zscore(rate, state.rate_mean, state.rate_var)
+
+        outlier = False
+        if state.count >= self.warmup:
+            if abs(level_z) > self.z_threshold:
+                outlier = True
+                alerts.append({'alert_type': 'zscore', 'value': value, 'mean': state.mean,
+                               'std': math.sqrt(state.var), 'zscore': level_z})
+            if abs(rate_z) > self.z_threshold:
+                outlier = True
+                alerts.append({'alert_type': 'rate', 'value': value, 'rate_per_s': rate,
+                               'zscore': rate_z})
+
+        if outlier:
+            state.outliers += 1
+            if state.outliers >= self.relearn:
+                # The level has shifted: re-centre on it and judge later samples against the new level
+                state.mean = value
+                state.rate_mean = 0.0
+                state.last = value
+                state.last_time = now
+                state.outliers = 0
+                self.relearns += 1
+                logger.info(f"{sensor} shifted to {value:g}, re-learning its baseline")
+        else:
+            state.mean, state.var = ewma_update(state.mean, state.var, value, self.alpha)
+            state.rate_mean, state.rate_var = ewma_update(state.rate_mean, state.rate_var, rate, self.alpha)
+            state.count += 1
+            state.outliers = 0
+            state.last = value
+            state.last_time = now
+
+        self.alerts += len(alerts)
+        return alerts
+
+    def observe_all(self, readings, now):
+        """Check a dict of readings; returns {sensor: [alerts]} for sensors that alerted"""
+        result = {}
+        for sensor, value in readings.items():
+            alerts = self.observe(sensor, value, now)
+            if alerts:
+                result[sensor] = alerts
+        return result
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Docker Stats
+Keeps a streaming stats subscription open per container so a collection
+cycle only reads the latest sample from memory
+"""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def container_metrics(stats):
+    """Per-container CPU, memory, network and block I/O metrics from one stats sample"""
+    metrics = {}
+
+    cpu_stats = stats.get('cpu_stats', {})
+    precpu_stats = stats.get('precpu_stats', {})
+    cpu_delta = cpu_stats.get('cpu_usage', {}).get('total_usage', 0) - \
+        precpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    # Share of total host CPU, as in the original totals
+    metrics['cpu_percent'] = (cpu_delta / system_delta) * 100 if system_delta > 0 else 0.0
+
+    memory_stats = stats.get('memory_stats', {})
+    memory_usage = memory_stats.get('usage', 0)
+    memory_limit = memory_stats.get('limit', 0)
+    metrics['memory_usage_mb'] = memory_usage / (1024**2)
+    metrics['memory_limit_mb'] = memory_limit / (1024**2)
+    metrics['memory_percent'] = memory_usage / memory_limit * 100 if memory_limit else 0.0
+
+    networks = stats.get('networks') or {}
+    metrics['network_rx_bytes'] = sum(net.get('rx_bytes', 0) for net in networks.values())
+    metrics['network_tx_bytes'] = sum(net.get('tx_bytes', 0) for net in networks.values())
+
+    blkio_read = blkio_write = 0
+    for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = entry.get('op', '').lower()
+        if op == 'read':
+            blkio_read += entry.get('value', 0)
+        elif op == 'write':
+            blkio_write += entry.get('value', 0)
+    metrics['blkio_read_bytes'] = blkio_read
+    metrics['blkio_write_bytes'] = blkio_write
+
+    return metrics
+
+
+class DockerStatsCollector:
+    """Long-lived Docker client with one background stats stream per running container"""
+
+    def __init__(self, max_age=60.0):
+        # Samples older than this are treated as stale and not reported
+        self.max_age = max_age
+
+        self.client = None
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._latest = {}
+        self._unavailable = False
+
+    def _connect(self):
+        import docker
+
+        self.client = docker.from_env()
+        logger.info("Connected to Docker daemon")
+
+    def _watch(self, container):
+        """Store every sample from the container's stats stream until it ends"""
+        try:
+            for stats in container.stats(stream=True, decode=True):
+                with self._lock:
+                    self._latest[container.id] = (container.name, stats, time.monotonic())
+        except Exception as e:
+            logger.debug(f"Stats stream for container {container.name} ended: {e}")
+        finally:
+            with self._lock:
+                self._streams.pop(container.id, None)
+                self._latest.pop(container.id, None)
+
+    def collect(self):
+        """Return (totals, per-container metrics keyed by container name)"""
+        if self._unavailable:
+            return {}, {}
+
+        try:
+            if self.client is None:
+                self._connect()
+            containers = self.client.containers.list()
+        except ImportError:
+            logger.warning("Docker Python library not available, skipping Docker metrics")
+            self._unavailable = True
+            return {}, {}
+        except Exception as e:
+            logger.error(f"Failed to list Docker containers: {e}")
+            self.client = None
+            return {}, {}
+
+        # Subscribe to any container we are not streaming yet
+        with self._lock:
+            for container in containers:
+                if container.id not in self._streams:
+                    thread = threading.Thread(target=self._watch, args=(container,),
+                                              name=f"docker-stats-{container.name}", daemon=True)
+                    self._streams[container.id] = thread
+                    thread.start()
+            latest = dict(self._latest)
+
+        totals = {
+            'container_count': len(containers),
+            'running_containers': len([c for c in containers if c.status == 'running']),
+            'total_cpu_usage': 0,
+            'total_memory_usage': 0
+        }
+        per_container = {}
+        now = time.monotonic()
+
+        for container in containers:
+            sample = latest.get(container.id)
+            if not sample or now - sample[2] > self.max_age:
+                continue
+            try:
+                metrics = container_metrics(sample[1])
+            except Exception as e:
+                logger.warning(f"Failed to parse stats for container {container.name}: {e}")
+                continue
+            per_container[container.name] = metrics
+            totals['total_cpu_usage'] += metrics['cpu_percent']
+            totals['total_memory_usage'] += metrics['memory_usage_mb']
+
+        return totals, per_container
+
+    def close(self):
+        """Close the Docker client, which ends the stats streams"""
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
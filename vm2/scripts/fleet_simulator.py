@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Fleet Simulator
+Runs many virtual plants in one asyncio event loop that share a single
+pooled InfluxDB connection and batch writer
+"""
+
+import os
+import csv
+import json
+import signal
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timezone
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS
+from write_pipeline import BatchWriter
+from sensor_simulator import WaterSensorSimulator, SENSOR_CONSTRAINTS
+from detector import AnomalyDetector
+from profiles import DiurnalProfiles
+from instrumentation import MetricsRegistry, MetricsServer, register_writer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def load_roster(path):
+    """Load plants from a JSON list or a CSV file with plant_id, plant_name and location"""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            roster = list(csv.DictReader(f))
+        else:
+            roster = json.load(f)
+
+    for entry in roster:
+        missing = {'plant_id', 'plant_name', 'location'} - set(entry)
+        if missing:
+            raise ValueError(f"Roster entry {entry} is missing {', '.join(sorted(missing))}")
+    return roster
+
+
+def generate_roster(count):
+    """Synthetic roster for load testing"""
+    return [
+        {'plant_id': f'SIM{i:04d}', 'plant_name': f'Simulated Plant {i}', 'location': f'District {i % 20}'}
+        for i in range(count)
+    ]
+
+
+class FleetSimulator:
+    def __init__(self, roster, interval=30):
+        self.interval = interval
+
+        # InfluxDB configuration
+        self.influxdb_url = os.getenv('INFLUXDB_URL', 'http://localhost:8086')
+        self.influxdb_token = os.getenv('INFLUXDB_TOKEN', 'water_monitoring_token_2024')
+        self.influxdb_org = os.getenv('INFLUXDB_ORG', 'water_treatment')
+        self.influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'water_metrics')
+
+        # Virtual plants reuse the simulator model without their own client;
+        # the profiles, detector configuration and metrics registry are built
+        # once and shared, each plant keeping only its own detector state
+        self.profiles = DiurnalProfiles.from_env()
+        new_detector = AnomalyDetector.factory_from_env(SENSOR_CONSTRAINTS)
+        self.metrics = MetricsRegistry("fleet_simulator")
+        self.metrics_server = None
+        self.plants = []
+        for entry in roster:
+            plant = WaterSensorSimulator(entry['plant_id'], entry['plant_name'], entry['location'],
+                                         connect=False, profiles=self.profiles, new_detector=new_detector,
+                                         metrics=self.metrics)
+            plant.interval = float(entry.get('interval') or interval)
+            self.plants.append(plant)
+        self.register_metrics()
+
+        # Counters
+        self.cycles = 0
+        self.points_generated = 0
+        self.skipped_ticks = 0
+
+        # One client (one urllib3 connection pool) and one batch writer for the fleet
+        self.client = None
+        self.write_api = None
+        self.writer = None
+        self.connect_influxdb()
+
+    def register_metrics(self):
+        """Fleet-wide totals of the per-plant detector and deadband counters"""
+        self.metrics.counter("plant_cycles_total", "Plant sampling cycles run", lambda: self.cycles)
+        self.metrics.counter("skipped_ticks_total", "Plant ticks skipped because the loop was busy",
+                             lambda: self.skipped_ticks)
+        detectors = [plant.detector for plant in self.plants if plant.detector]
+        if detectors:
+            self.metrics.counter("detector_samples_total", "Readings checked by the anomaly detectors",
+                                 lambda: sum(detector.samples for detector in detectors))
+            self.metrics.counter("detector_alerts_total", "Alerts raised by the anomaly detectors",
+                                 lambda: sum(detector.alerts for detector in detectors))
+            self.metrics.counter("detector_relearns_total", "Level shifts the detectors re-learned baselines for",
+                                 lambda: sum(detector.relearns for detector in detectors))
+        deadbands = [plant.deadband for plant in self.plants if plant.deadband]
+        if deadbands:
+            self.metrics.counter("deadband_points_sent_total", "Readings sent under the deadband",
+                                 lambda: sum(deadband.points_sent for deadband in deadbands))
+            self.metrics.counter("deadband_points_suppressed_total", "Readings suppressed by the deadband",
+                                 lambda: sum(deadband.points_suppressed for deadband in deadbands))
+
+    def connect_influxdb(self):
+        """Connect to InfluxDB"""
+        try:
+            self.client = InfluxDBClient(
+                url=self.influxdb_url,
+                token=self.influxdb_token,
+                org=self.influxdb_org
+            )
+            self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            self.writer = BatchWriter.from_env(self.write_api, self.influxdb_bucket, "fleet_simulator")
+            register_writer(self.metrics, self.writer)
+            logger.info(f"Connected to InfluxDB at {self.influxdb_url}")
+        except Exception as e:
+            logger.error(f"Failed to connect to InfluxDB: {e}")
+            self.client = None
+            self.write_api = None
+            self.writer = None
+
+    async def run_plant(self, plant, phase):
+        """Sample one virtual plant on its own fixed schedule, offset by phase seconds"""
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + phase
+
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+
+            timestamp = datetime.now(timezone.utc)
+            plant.simulation_time = timestamp
+            readings = plant.generate_readings()
+            alerts = plant.encode_alerts(readings, timestamp)
+            if alerts:
+                self.writer.write(alerts, urgent=True)
+            points = plant.encode_readings(readings, timestamp)
+            self.writer.write(points)
+            self.cycles += 1
+            self.points_generated += len(points)
+
+            # Stay on the schedule grid; drop ticks the loop was too busy to run
+            next_run += plant.interval
+            behind = loop.time() - next_run
+            if behind > 0:
+                missed = int(behind // plant.interval) + 1
+                self.skipped_ticks += missed
+                next_run += missed * plant.interval
+
+    async def report(self):
+        """Log fleet throughput once per interval"""
+        loop = asyncio.get_running_loop()
+        last_points, last_time = 0, loop.time()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            rate = (self.points_generated - last_points) / (now - last_time)
+            last_points, last_time = self.points_generated, now
+            logger.info(f"{len(self.plants)} plants: {self.cycles} cycles, {self.points_generated} points "
+                        f"({rate:.0f} points/s), queue depth {self.writer.queue_depth}, "
+                        f"{self.writer.points_written} written, {self.skipped_ticks} skipped ticks")
+            suppressed = sum(plant.deadband.points_suppressed for plant in self.plants if plant.deadband)
+            if suppressed:
+                logger.info(f"Deadband suppressed {suppressed} points")
+
+    async def run(self):
+        # Spread plants evenly across the interval so writes don't all land at once
+        count = len(self.plants)
+        tasks = [
+            asyncio.create_task(self.run_plant(plant, plant.interval * i / count))
+            for i, plant in enumerate(self.plants)
+        ]
+        tasks.append(asyncio.create_task(self.report()))
+        await asyncio.gather(*tasks)
+
+    def run_fleet(self):
+        """Run every virtual plant until interrupted"""
+        if not self.writer:
+            logger.error("InfluxDB not connected")
+            return
+
+        logger.info(f"Starting fleet simulation with {len(self.plants)} plants")
+        logger.info(f"Data collection interval: {self.interval} seconds")
+        self.metrics_server = MetricsServer.from_env(self.metrics)
+
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("Fleet simulation stopped by user")
+        finally:
+            if self.metrics_server:
+                self.metrics_server.close()
+            self.writer.close()
+            if self.client:
+                self.client.close()
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+def main():
+    parser = argparse.ArgumentParser(description='Water Treatment Plant Fleet Simulator')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--roster', help='JSON or CSV file listing plant_id, plant_name and location')
+    source.add_argument('--plants', type=int, help='Generate this many synthetic plants instead')
+    parser.add_argument('--interval', type=int, default=30, help='Data collection interval in seconds')
+
+    args = parser.parse_args()
+
+    # Treat docker stop (SIGTERM) like Ctrl+C so queued points get flushed
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    roster = load_roster(args.roster) if args.roster else generate_roster(args.plants)
+    if not roster:
+        parser.error('Roster is empty')
+
+    # Create and run fleet
+    fleet = FleetSimulator(roster, args.interval)
+    fleet.run_fleet()
+
+if __name__ == "__main__":
+    main()
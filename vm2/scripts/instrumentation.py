@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Agent Instrumentation
+Exposes the agents' own counters, gauges and timing histograms in the
+Prometheus text format, and optionally as InfluxDB points
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from line_protocol import SeriesEncoder
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Shortest window for the points_per_second gauge
+RATE_WINDOW = 10.0
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds"""
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a block, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    def fields(self, unit=''):
+        """Cumulative bucket counts (le_<bound><unit>) plus count and sum, as point fields"""
+        counts, count, total = self.snapshot()
+        fields = {f"le_{bound:g}{unit}": bucket_count for bound, bucket_count in zip(self.bounds, counts)}
+        fields['le_inf'] = count
+        fields['count'] = count
+        fields[f"sum_{unit}" if unit else 'sum'] = total
+        return fields
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=None):
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in items.items()) + '}'
+
+
+def format_value(value):
+    """Sample value with full precision, so large counters keep advancing"""
+    if isinstance(value, int):
+        return str(int(value))
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsRegistry:
+    """Named metrics for one agent
+
+    Counters and gauges are callables read at scrape time, so they stay the
+    plain attributes the rest of the code already keeps (writer.points_written
+    and so on). Histograms are owned by the registry.
+    """
+
+    def __init__(self, prefix='agent', labels=None):
+        self.prefix = prefix
+        self.labels = dict(labels or {})
+        self._metrics = {}
+        self._encoders = {}
+
+    def _register(self, name, kind, help_text, labels, value):
+        name = f"{self.prefix}_{name}"
+        entry = self._metrics.setdefault(name, {'kind': kind, 'help': help_text, 'series': {}})
+        entry['series'][tuple(sorted(labels.items()))] = value
+        return value
+
+    def counter(self, name, help_text, read, **labels):
+        """Register a monotonically increasing value, read through a callable"""
+        self._register(name, 'counter', help_text, labels, read)
+
+    def gauge(self, name, help_text, read, **labels):
+        """Register a point-in-time value, read through a callable"""
+        self._register(name, 'gauge', help_text, labels, read)
+
+    def histogram(self, name, help_text, bounds=DURATION_BUCKETS, **labels):
+        """Return the histogram for name and labels, creating it on first use"""
+        full_name = f"{self.prefix}_{name}"
+        existing = self._metrics.get(full_name, {}).get('series', {}).get(tuple(sorted(labels.items())))
+        if existing is not None:
+            return existing
+        return self.add_histogram(name, help_text, Histogram(bounds), **labels)
+
+    def add_histogram(self, name, help_text, histogram, **labels):
+        """Register a histogram kept elsewhere (e.g. by the write pipeline)"""
+        return self._register(name, 'histogram', help_text, labels, histogram)
+
+    def _samples(self):
+        """(name, kind, help, labels, value-or-histogram) for every series, skipping failed reads"""
+        for name, entry in self._metrics.items():
+            for labels, value in entry['series'].items():
+                if callable(value):
+                    try:
+                        value = value()
+                    except Exception as e:
+                        logger.debug(f"Failed to read metric {name}: {e}")
+                        continue
+                    if value is None:
+                        continue
+                yield name, entry['kind'], entry['help'], {**self.labels, **dict(labels)}, value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+        for name, kind, help_text, labels, value in self._samples():
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == 'histogram':
+                counts, count, total = value.snapshot()
+                for bound, bucket_count in zip(value.bounds, counts):
+                    lines.append(f"{name}_bucket{format_labels(labels, {'le': f'{bound:g}'})} {bucket_count}")
+                lines.append(f"{name}_bucket{format_labels(labels, {'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def encode(self, timestamp):
+        """All metrics as agent_metrics line-protocol points, one per series"""
+        points = []
+        for name, kind, _, labels, value in self._samples():
+            key = (name, tuple(sorted(labels.items())))
+            encoder = self._encoders.get(key)
+            if encoder is None:
+                encoder = SeriesEncoder("agent_metrics", {**labels, "metric": name})
+                self._encoders[key] = encoder
+            if kind == 'histogram':
+                counts, count, total = value.snapshot()
+                fields = {f"le_{bound:g}": bucket_count for bound, bucket_count in zip(value.bounds, counts)}
+                fields.update({'count': count, 'sum': total})
+            else:
+                fields = {'value': value}
+            line = encoder.encode(fields, timestamp)
+            if line:
+                points.append(line)
+        return points
+
+
+class MetricsServer:
+    """Serves a registry at /metrics from a background thread"""
+
+    def __init__(self, registry, port, host='0.0.0.0'):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+        logger.info(f"Serving agent metrics on http://{host}:{self.server.server_port}/metrics")
+
+    @classmethod
+    def from_env(cls, registry):
+        """Start a server on METRICS_PORT, or return None when it is 0 or unusable"""
+        port = int(os.getenv('METRICS_PORT', 9108))
+        if not port:
+            return None
+        try:
+            return cls(registry, port)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint disabled, cannot listen on port {port}: {e}")
+            return None
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def register_writer(registry, writer):
+    """Expose a BatchWriter's counters, queue depth and write histograms"""
+    registry.counter('points_written_total', 'Points written to InfluxDB', lambda: writer.points_written)
+    registry.counter('points_dropped_total', 'Points dropped without being written or spooled',
+                     lambda: writer.points_dropped)
+    registry.counter('writes_total', 'Successful batch writes', lambda: writer.writes)
+    registry.counter('write_retries_total', 'Batch write retries', lambda: writer.retries)
+    registry.counter('points_spooled_total', 'Points saved to the disk spool', lambda: writer.points_spooled)
+    registry.counter('points_replayed_total', 'Spooled points written after an outage',
+                     lambda: writer.points_replayed)
+    registry.gauge('write_queue_depth', 'Points waiting in the write queue', lambda: writer.queue_depth)
+    registry.gauge('spool_pending_bytes', 'Bytes waiting in the disk spool',
+                   lambda: writer.spool.size_bytes if writer.spool else None)
+    registry.add_histogram('write_duration_seconds', 'Time per batch write attempt', writer.write_seconds)
+    registry.add_histogram('write_payload_bytes', 'Size of each batch write payload', writer.payload_bytes)
+
+    # Recomputed at most every RATE_WINDOW seconds, so a scrape and the
+    # InfluxDB self-report don't shorten each other's window
+    state = {'rate': None, 'points': writer.points_written, 'time': time.monotonic()}
+
+    def points_per_second():
+        now = time.monotonic()
+        if now - state['time'] >= RATE_WINDOW:
+            state['rate'] = (writer.points_written - state['points']) / (now - state['time'])
+            state['points'], state['time'] = writer.points_written, now
+        return state['rate']
+
+    registry.gauge('points_per_second', f'Points written per second over at least {RATE_WINDOW:g}s',
+                   points_per_second)
+
+
+def register_archive(registry, archive):
+    """Expose a LocalArchive's counters"""
+    registry.counter('archive_rows_total', 'Rows appended to the local archive', lambda: archive.rows_archived)
+    registry.counter('archive_partitions_sealed_total', 'Finished daily partitions compressed',
+                     lambda: archive.partitions_sealed)
+    registry.counter('archive_partitions_deleted_total', 'Partitions deleted to stay under ARCHIVE_MAX_MB',
+                     lambda: archive.partitions_deleted)
+
+
+def register_scheduler(registry, scheduler):
+    """Expose an IntervalScheduler's tick accounting"""
+    registry.counter('scheduler_ticks_total', 'Scheduler ticks fired', lambda: scheduler.ticks)
+    registry.counter('scheduler_skipped_ticks_total', 'Ticks skipped because a cycle overran',
+                     lambda: scheduler.skipped_ticks)
+    registry.gauge('scheduler_lateness_seconds', 'Lateness of the last tick', lambda: scheduler.last_lateness)
+    registry.gauge('scheduler_max_lateness_seconds', 'Largest tick lateness so far',
+                   lambda: scheduler.max_lateness)
+
+
+def register_collectors(registry, collectors):
+    """Expose each Collector's run accounting, labelled by collector"""
+    for collector in collectors:
+        registry.counter('collector_runs_total', 'Collector runs completed', lambda c=collector: c.runs,
+                         collector=collector.name)
+        registry.counter('collector_overruns_total', 'Runs skipped because the previous run was still going',
+                         lambda c=collector: c.overruns, collector=collector.name)
+        registry.counter('collector_timeouts_total', 'Runs that exceeded their timeout (points dropped)',
+                         lambda c=collector: c.timeouts, collector=collector.name)
+        registry.counter('collector_failures_total', 'Runs that raised an error',
+                         lambda c=collector: c.failures, collector=collector.name)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Line Protocol Encoder
+Formats points directly as line protocol, reusing each series' escaped
+measurement and tag prefix instead of rebuilding Point objects every cycle
+"""
+
+import math
+from datetime import datetime, timezone
+
+# Same escaping rules as influxdb_client's Point
+_ESCAPE_MEASUREMENT = str.maketrans({
+    ',': r'\,',
+    ' ': r'\ ',
+    '\n': r'\n',
+    '\t': r'\t',
+    '\r': r'\r',
+})
+
+_ESCAPE_KEY = str.maketrans({
+    ',': r'\,',
+    '=': r'\=',
+    ' ': r'\ ',
+    '\n': r'\n',
+    '\t': r'\t',
+    '\r': r'\r',
+})
+
+_ESCAPE_STRING = str.maketrans({
+    '"': r'\"',
+    '\\': r'\\',
+})
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def escape_key(key):
+    return str(key).translate(_ESCAPE_KEY)
+
+
+def escape_tag_value(value):
+    escaped = str(value).translate(_ESCAPE_KEY)
+    if escaped.endswith('\\'):
+        escaped += ' '
+    return escaped
+
+
+def format_field_value(value):
+    """Format a field value, or return None if the field should be skipped"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        text = str(value)
+        # Whole floats are written without the trailing ".0", as Point does
+        return text[:-2] if text.endswith('.0') else text
+    if isinstance(value, int):
+        return f'{value}i'
+    if isinstance(value, str):
+        return f'"{value.translate(_ESCAPE_STRING)}"'
+
+    kind = getattr(getattr(value, 'dtype', None), 'kind', None)
+    if kind == 'f':
+        return format_field_value(float(value))
+    if kind in ('i', 'u'):
+        return f'{int(value)}i'
+    raise ValueError(f'Type: "{type(value)}" of field value is not supported.')
+
+
+def to_nanoseconds(timestamp):
+    """Convert a datetime (naive means UTC) or integer nanoseconds to integer nanoseconds"""
+    if isinstance(timestamp, int):
+        return timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 10**3
+
+
+class SeriesEncoder:
+    """Encoder for one measurement + tag set with the escaped prefix computed once"""
+
+    def __init__(self, measurement, tags=None):
+        self.measurement = measurement
+        self.tags = dict(tags or {})
+
+        tag_parts = []
+        for tag_key, tag_value in sorted(self.tags.items()):
+            if tag_value is None:
+                continue
+            key = escape_key(tag_key)
+            value = escape_tag_value(tag_value)
+            if key and value:
+                tag_parts.append(f'{key}={value}')
+
+        self.prefix = str(measurement).translate(_ESCAPE_MEASUREMENT) + \
+            ''.join(',' + part for part in tag_parts) + ' '
+        self._field_keys = {}
+
+    def _field_key(self, name):
+        key = self._field_keys.get(name)
+        if key is None:
+            key = self._field_keys[name] = escape_key(name) + '='
+        return key
+
+    def encode(self, fields, timestamp=None):
+        """Encode one point; returns an empty string if no field is writable"""
+        parts = []
+        for name in sorted(fields):
+            value = format_field_value(fields[name])
+            if value is not None:
+                parts.append(self._field_key(name) + value)
+        if not parts:
+            return ''
+
+        line = self.prefix + ','.join(parts)
+        if timestamp is not None:
+            line += f' {to_nanoseconds(timestamp)}'
+        return line
+
+    def encode_value(self, value, timestamp=None, field='value'):
+        """Encode a single-field point, the narrow-schema hot path"""
+        value = format_field_value(value)
+        if value is None:
+            return ''
+        line = self.prefix + self._field_key(field) + value
+        if timestamp is not None:
+            line += f' {to_nanoseconds(timestamp)}'
+        return line
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Live Metrics API
+Keeps the agents' latest readings and a short history in memory and serves
+them on the plant network as a JSON snapshot, time-range queries and a
+Server-Sent Events stream
+"""
+
+import os
+import json
+import math
+import queue
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from line_protocol import to_nanoseconds
+from columnar import format_ns
+from archive import parse_time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE keep-alive comments, so proxies keep idle streams open
+KEEPALIVE_INTERVAL = 15.0
+
+
+def _json_value(value):
+    """Values as JSON can carry them (NaN and infinity become null)"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    return value
+
+
+class Subscription:
+    """A stream client's event queue; overflowed once the client falls too far behind"""
+
+    def __init__(self, series=None, maxsize=1000):
+        self.series = series
+        self.events = queue.Queue(maxsize)
+        self.overflowed = False
+
+
+class LiveStore:
+    """Latest values and a time-bounded history per series, with push to subscribers
+
+    History is kept for window seconds and at most max_points entries per
+    series. Subscribers get every new entry; one whose queue fills up is
+    marked overflowed and dropped rather than slowing the agent down.
+    """
+
+    def __init__(self, window=3600.0, max_points=10000):
+        self.window = window
+        self.max_points = max_points
+        self._history = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def add(self, series, timestamp, values):
+        """Record values for a series at timestamp (a datetime or nanoseconds)"""
+        timestamp = to_nanoseconds(timestamp)
+        values = _json_value(dict(values))
+        with self._lock:
+            history = self._history.get(series)
+            if history is None:
+                history = self._history[series] = deque(maxlen=self.max_points)
+            history.append((timestamp, values))
+            horizon = timestamp - int(self.window * 10**9)
+            while history[0][0] < horizon:
+                history.popleft()
+            subscribers = list(self._subscribers)
+
+        event = (series, timestamp, values)
+        for subscription in subscribers:
+            if subscription.series and series not in subscription.series:
+                continue
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def series(self):
+        """{series: (entries, first ns, last ns)}"""
+        with self._lock:
+            return {name: (len(history), history[0][0], history[-1][0])
+                    for name, history in self._history.items() if history}
+
+    def latest(self):
+        """{series: (timestamp ns, values)} for the newest entry of each series"""
+        with self._lock:
+            return {name: history[-1] for name, history in self._history.items() if history}
+
+    def query(self, series, start=None, end=None):
+        """[(timestamp ns, values)] for a series in [start, end), or None for an unknown series"""
+        start = None if start is None else to_nanoseconds(start)
+        end = None if end is None else to_nanoseconds(end)
+        with self._lock:
+            history = self._history.get(series)
+            if history is None:
+                return None
+            return [
+                (timestamp, values) for timestamp, values in history
+                if (start is None or timestamp >= start) and (end is None or timestamp < end)
+            ]
+
+    def subscribe(self, series=None, maxsize=1000):
+        subscription = Subscription(series, maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class LiveServer:
+    """Serves a LiveStore under /live from a background thread
+
+    GET /live/snapshot            newest values of every series
+    GET /live/series              series with entry counts and time ranges
+    GET /live/query?series=NAME&start=&end=
+                                  history in [start, end) (ISO 8601 UTC or an age like 15m)
+    GET /live/stream[?series=A,B] Server-Sent Events: a snapshot, then every new entry
+    """
+
+    def __init__(self, store, port, host='0.0.0.0', info=None, max_streams=32):
+        self.store = store
+        self.info = dict(info or {})
+        self.max_streams = max_streams
+        self.closing = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def send_json(self, status, document):
+                body = json.dumps(document).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                routes = {
+                    '/live/snapshot': server.snapshot,
+                    '/live/series': server.series,
+                    '/live/query': server.query
+                }
+                if url.path == '/live/stream':
+                    server.stream(self, params)
+                elif url.path in routes:
+                    try:
+                        self.send_json(*routes[url.path](params))
+                    except ValueError as e:
+                        self.send_json(400, {'error': str(e)})
+                else:
+                    self.send_json(404, {'error': f'{url.path} not found'})
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name='live-http', daemon=True)
+        self._thread.start()
+        logger.info(f"Serving live metrics on http://{host}:{self.server.server_port}/live/snapshot")
+
+    @classmethod
+    def from_env(cls, info=None):
+        """Start a server on LIVE_PORT with LIVE_WINDOW/LIVE_MAX_POINTS history, or None when 0 or unusable"""
+        port = int(os.getenv('LIVE_PORT', 8081))
+        if not port:
+            return None
+        store = LiveStore(window=float(os.getenv('LIVE_WINDOW', 3600)),
+                          max_points=int(os.getenv('LIVE_MAX_POINTS', 10000)))
+        try:
+            return cls(store, port, info=info)
+        except OSError as e:
+            logger.warning(f"Live metrics API disabled, cannot listen on port {port}: {e}")
+            return None
+
+    def publish(self, series, timestamp, values):
+        """Add an entry to the store, pushing it to stream clients"""
+        self.store.add(series, timestamp, values)
+
+    # Handlers return (status, JSON document)
+
+    def snapshot(self, params):
+        return 200, {
+            **self.info,
+            'series': {
+                name: {'time': format_ns(timestamp), 'values': values}
+                for name, (timestamp, values) in self.store.latest().items()
+            }
+        }
+
+    def series(self, params):
+        return 200, {
+            **self.info,
+            'window_seconds': self.store.window,
+            'series': {
+                name: {'points': count, 'first': format_ns(first), 'last': format_ns(last)}
+                for name, (count, first, last) in self.store.series().items()
+            }
+        }
+
+    def query(self, params):
+        series = params.get('series')
+        if not series:
+            raise ValueError('series is required')
+        start = parse_time(params['start']) if params.get('start') else None
+        end = parse_time(params['end']) if params.get('end') else None
+        entries = self.store.query(series, start, end)
+        if entries is None:
+            return 404, {'error': f'no series {series}'}
+        return 200, {
+            **self.info,
+            'series': series,
+            'points': [{'time': format_ns(timestamp), **values} for timestamp, values in entries]
+        }
+
+    def stream(self, handler, params):
+        """Hold the connection open and write one SSE event per new entry"""
+        if self.store.subscriber_count >= self.max_streams:
+            handler.send_json(503, {'error': 'too many live streams'})
+            return
+        series = set(filter(None, params.get('series', '').split(','))) or None
+        subscription = self.store.subscribe(series)
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        # Tell nginx not to buffer the stream
+        handler.send_header('X-Accel-Buffering', 'no')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+
+        def send(event, document):
+            handler.wfile.write(f"event: {event}\ndata: {json.dumps(document)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+
+        try:
+            _, snapshot = self.snapshot(params)
+            if series:
+                snapshot['series'] = {name: entry for name, entry in snapshot['series'].items() if name in series}
+            send('snapshot', snapshot)
+            while not self.closing.is_set() and not subscription.overflowed:
+                try:
+                    name, timestamp, values = subscription.events.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    handler.wfile.write(b": keepalive\n\n")
+                    handler.wfile.flush()
+                    continue
+                send('reading', {'series': name, 'time': format_ns(timestamp), 'values': values})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.store.unsubscribe(subscription)
+
+    def close(self):
+        self.closing.set()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Connectivity Probes
+Runs TCP connect, HTTP /health and ping probes against several targets
+concurrently within one overall deadline and keeps latency histograms
+"""
+
+import re
+import time
+import socket
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from instrumentation import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+PING_TIME = re.compile(r'time[=<]([\d.]+)')
+
+
+class ProbeTarget:
+    def __init__(self, name, url):
+        parts = urlsplit(url if '://' in url else f'http://{url}')
+        self.name = name
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.health_url = f"{parts.scheme}://{parts.netloc}/health"
+
+
+def parse_targets(spec, default_url):
+    """Parse "name=url,name=url" into targets; the InfluxDB URL is always probed first"""
+    targets = [ProbeTarget('influxdb', default_url)]
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, url = item.partition('=')
+        if not url:
+            raise ValueError(f"Probe target '{item}' must look like name=url")
+        if name.strip() == 'influxdb':
+            targets[0] = ProbeTarget('influxdb', url.strip())
+        else:
+            targets.append(ProbeTarget(name.strip(), url.strip()))
+    return targets
+
+
+class ProbeEngine:
+    """Concurrent connectivity probes with cached DNS and a persistent HTTP session
+
+    HTTP probes run on a thread each, which the deadline cannot interrupt:
+    a target whose previous HTTP probe is still running is reported as
+    failed instead of being probed again, so slow targets never hold more
+    than one thread each. histograms holds a latency Histogram (in
+    milliseconds) per (target, probe).
+    """
+
+    def __init__(self, targets, deadline=5.0, ping=True, tcp_samples=3, dns_ttl=300.0,
+                 verify_tls=True):
+        import requests
+
+        self.targets = targets
+        self.deadline = deadline
+        self.ping = ping
+        self.tcp_samples = tcp_samples
+        self.dns_ttl = dns_ttl
+        self.verify_tls = verify_tls
+
+        # Keep-alive connections are reused across cycles
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(targets)), thread_name_prefix='probe-http')
+
+        self._dns = {}
+        self._http_running = set()
+        self._http_lock = threading.Lock()
+        self.histograms = {}
+
+    def run(self):
+        """Probe every target concurrently; returns {(target, probe): result}"""
+        return asyncio.run(self._run_all())
+
+    async def _run_all(self):
+        probes = {}
+        for target in self.targets:
+            probes[(target.name, 'tcp')] = self._probe_tcp(target)
+            probes[(target.name, 'http')] = self._probe_http(target)
+            if self.ping:
+                probes[(target.name, 'ping')] = self._probe_ping(target)
+
+        tasks = {asyncio.ensure_future(coro): key for key, coro in probes.items()}
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+
+        results = {}
+        for task, key in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                results[key] = task.result()
+            else:
+                error = 'deadline exceeded' if task in pending else str(task.exception())
+                results[key] = {'success': False, 'latency_ms': None, 'error': error}
+
+        for key, result in results.items():
+            if result['latency_ms'] is not None:
+                self.histograms.setdefault(key, Histogram(LATENCY_BUCKETS_MS)).observe(result['latency_ms'])
+        return results
+
+    async def _resolve(self, target):
+        """Resolve a target's host, caching the address for dns_ttl seconds"""
+        cached = self._dns.get(target.host)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(target.host, target.port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._dns[target.host] = (address, time.monotonic() + self.dns_ttl)
+        return address
+
+    async def _probe_tcp(self, target):
+        """Median TCP connect time over tcp_samples connections"""
+        address = await self._resolve(target)
+        samples = []
+        for _ in range(self.tcp_samples):
+            start = time.perf_counter()
+            _, writer = await asyncio.open_connection(address, target.port)
+            samples.append((time.perf_counter() - start) * 1000)
+            writer.close()
+            await writer.wait_closed()
+        samples.sort()
+        return {'success': True, 'latency_ms': samples[len(samples) // 2]}
+
+    def _http_get(self, target):
+        try:
+            start = time.perf_counter()
+            response = self.session.get(target.health_url, timeout=self.deadline, verify=self.verify_tls)
+            latency_ms = (time.perf_counter() - start) * 1000
+            return {'success': response.status_code < 400, 'latency_ms': latency_ms,
+                    'status_code': response.status_code}
+        finally:
+            with self._http_lock:
+                self._http_running.discard(target.name)
+
+    async def _probe_http(self, target):
+        with self._http_lock:
+            if target.name in self._http_running:
+                return {'success': False, 'latency_ms': None, 'error': 'previous probe still running'}
+            self._http_running.add(target.name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._http_get, target)
+
+    async def _probe_ping(self, target):
+        address = await self._resolve(target)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ping', '-c', '1', '-W', str(max(1, int(self.deadline))), address,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        except FileNotFoundError:
+            if self.ping:
+                logger.warning("ping not available, disabling ping probes")
+                self.ping = False
+            raise
+        try:
+            stdout, _ = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        match = PING_TIME.search(stdout.decode(errors='replace'))
+        if process.returncode != 0 or not match:
+            return {'success': False, 'latency_ms': None}
+        return {'success': True, 'latency_ms': float(match.group(1))}
+
+    def close(self):
+        self.session.close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Diurnal Profiles
+Compiles per-sensor daily and seasonal curves from a config file into
+minute-resolution lookup tables, so a time factor is a table index
+"""
+
+import os
+import json
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 1440
+DAYS_PER_YEAR = 366
+WEEKEND_OFFSET = MINUTES_PER_DAY
+
+DEFAULT_PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diurnal_profiles.json')
+
+# Month midpoints as zero-based day of year, where the monthly multipliers apply
+MONTH_MIDPOINTS = [15, 45, 74, 105, 135, 166, 196, 227, 258, 288, 319, 349]
+
+
+def _cosine_curve(points, period, samples):
+    """Sample a periodic curve through (x, y) control points at samples evenly spaced x values
+
+    Consecutive points are joined with cosine interpolation, which is smooth
+    and never overshoots the control values, and the last point joins the
+    first one period later.
+    """
+    if len(points) == 1:
+        return [float(points[0][1])] * samples
+
+    curve = []
+    step = period / samples
+    segment = 0
+    for i in range(samples):
+        x = i * step
+        # Advance to the segment containing x; before the first point we are
+        # still on the wrapping segment from the last point
+        while segment < len(points) and points[segment][0] <= x:
+            segment += 1
+        x0, y0 = points[segment - 1] if segment else (points[-1][0] - period, points[-1][1])
+        x1, y1 = points[segment] if segment < len(points) else (points[0][0] + period, points[0][1])
+        t = (x - x0) / (x1 - x0)
+        curve.append(y0 + (y1 - y0) * (1 - math.cos(math.pi * t)) / 2)
+    return curve
+
+
+def _parse_points(sensor, name, points):
+    """Validate [[hour, factor], ...] and return them sorted by hour"""
+    if not isinstance(points, list) or not points:
+        raise ValueError(f"{sensor}.{name} must be a non-empty list of [hour, factor] pairs")
+    parsed = []
+    for point in points:
+        if not isinstance(point, (list, tuple)) or len(point) != 2:
+            raise ValueError(f"{sensor}.{name}: {point!r} is not an [hour, factor] pair")
+        hour, factor = float(point[0]), float(point[1])
+        if not 0 <= hour < 24:
+            raise ValueError(f"{sensor}.{name}: hour {hour} is outside [0, 24)")
+        if factor <= 0:
+            raise ValueError(f"{sensor}.{name}: factor {factor} must be positive")
+        parsed.append((hour, factor))
+    parsed.sort()
+    if len({hour for hour, _ in parsed}) != len(parsed):
+        raise ValueError(f"{sensor}.{name} has more than one factor for the same hour")
+    return parsed
+
+
+class DiurnalProfiles:
+    """Per-sensor time factor tables
+
+    Each profiled sensor gets a 2 x 1440 table (weekday minutes, then weekend
+    minutes) and a 366-entry day-of-year table interpolated from monthly
+    multipliers. The time factor at a timestamp is the product of one entry
+    from each; sensors without a profile have a factor of 1.0.
+    """
+
+    def __init__(self, profiles):
+        self.sensors = []
+        self.daily = {}
+        self.seasonal = {}
+        for sensor, spec in profiles.items():
+            weekday = _parse_points(sensor, 'weekday', spec.get('weekday', [[0, 1.0]]))
+            weekend = _parse_points(sensor, 'weekend', spec['weekend']) if 'weekend' in spec else weekday
+            seasonal = spec.get('seasonal', [1.0] * 12)
+            if len(seasonal) != 12 or any(float(factor) <= 0 for factor in seasonal):
+                raise ValueError(f"{sensor}.seasonal must be 12 positive monthly multipliers")
+
+            self.sensors.append(sensor)
+            self.daily[sensor] = [
+                factor
+                for points in (weekday, weekend)
+                for factor in _cosine_curve([(hour * 60, f) for hour, f in points], MINUTES_PER_DAY, MINUTES_PER_DAY)
+            ]
+            self.seasonal[sensor] = _cosine_curve(list(zip(MONTH_MIDPOINTS, map(float, seasonal))),
+                                                  DAYS_PER_YEAR, DAYS_PER_YEAR)
+
+    @classmethod
+    def load(cls, path):
+        """Profiles from a JSON file mapping sensor names to weekday, weekend and seasonal curves"""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_env(cls):
+        """Profiles from PROFILE_CONFIG (default: diurnal_profiles.json next to this file)
+
+        A missing or invalid file is logged and leaves every factor at 1.0
+        rather than stopping the agent.
+        """
+        path = os.getenv('PROFILE_CONFIG') or DEFAULT_PROFILE_FILE
+        try:
+            profiles = cls.load(path)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Ignoring diurnal profiles in {path}: {e}")
+            return cls({})
+        logger.info(f"Loaded diurnal profiles for {len(profiles.sensors)} sensors from {path}")
+        return profiles
+
+    @staticmethod
+    def slot(timestamp):
+        """(daily table index, seasonal table index) for a datetime"""
+        minute = timestamp.hour * 60 + timestamp.minute
+        if timestamp.weekday() >= 5:
+            minute += WEEKEND_OFFSET
+        return minute, timestamp.timetuple().tm_yday - 1
+
+    def factor(self, sensor, timestamp):
+        """Time factor for one sensor at timestamp"""
+        daily = self.daily.get(sensor)
+        if daily is None:
+            return 1.0
+        minute, day = self.slot(timestamp)
+        return daily[minute] * self.seasonal[sensor][day]
+
+    def factors(self, timestamp):
+        """{sensor: time factor} for every profiled sensor at timestamp"""
+        minute, day = self.slot(timestamp)
+        return {sensor: self.daily[sensor][minute] * self.seasonal[sensor][day] for sensor in self.sensors}
+
+    def daily_table(self, sensor):
+        """The sensor's 2 x 1440 daily table as one list (flat 1.0 if unprofiled)"""
+        return self.daily.get(sensor, [1.0] * (2 * MINUTES_PER_DAY))
+
+    def seasonal_table(self, sensor):
+        """The sensor's day-of-year table (flat 1.0 if unprofiled)"""
+        return self.seasonal.get(sensor, [1.0] * DAYS_PER_YEAR)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Counter Rates
+Turns cumulative counters (bytes since boot, etc.) into per-second rates on
+the agent, so dashboards don't have to run derivative() over raw history
+"""
+
+import time
+
+
+class RateTracker:
+    """Per-second rates from successive counter snapshots
+
+    Each counter is remembered with the monotonic time it was read. A counter
+    that goes backwards (reboot, driver reload, wrap) is treated as a reset:
+    no rate is reported for that sample and the new value becomes the baseline.
+    """
+
+    def __init__(self):
+        self._previous = {}
+        self.resets = 0
+
+    def rate(self, key, value, now=None):
+        """Rate of change per second since the last call for key, or None"""
+        now = time.monotonic() if now is None else now
+        previous = self._previous.get(key)
+        self._previous[key] = (value, now)
+
+        if previous is None:
+            return None
+        previous_value, previous_time = previous
+        elapsed = now - previous_time
+        if elapsed <= 0:
+            return None
+        if value < previous_value:
+            self.resets += 1
+            return None
+        return (value - previous_value) / elapsed
+
+    def rates(self, prefix, counters, now=None):
+        """Rates for a dict of counters, as {name + '_per_s': rate}; unknown rates are omitted"""
+        now = time.monotonic() if now is None else now
+        result = {}
+        for name, value in counters.items():
+            rate = self.rate((prefix, name), value, now)
+            if rate is not None:
+                result[f"{name}_per_s"] = rate
+        return result
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Interval Scheduler
+Fires on fixed interval boundaries using the monotonic clock so collection
+timestamps do not drift with collection or write time
+"""
+
+import math
+import time
+from datetime import datetime, timezone
+
+
+class IntervalScheduler:
+    """Ticks every interval seconds, aligned to wall-clock multiples of the interval
+
+    Sleeps are measured on the monotonic clock, so wall-clock adjustments do
+    not shift the schedule. If a cycle overruns one or more whole intervals,
+    the missed ticks are skipped and counted rather than fired late in a burst.
+    """
+
+    def __init__(self, interval, align=True):
+        self.interval = interval
+
+        now_wall = time.time()
+        first_wall = math.ceil(now_wall / interval) * interval if align else now_wall
+        self._next_wall = first_wall
+        self._next_mono = time.monotonic() + (first_wall - now_wall)
+
+        # Accounting
+        self.ticks = 0
+        self.skipped_ticks = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def wait(self):
+        """Sleep until the next boundary and return its scheduled time (naive UTC)"""
+        delay = self._next_mono - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        lateness = time.monotonic() - self._next_mono
+        if lateness >= self.interval:
+            missed = int(lateness // self.interval)
+            self.skipped_ticks += missed
+            self._next_mono += missed * self.interval
+            self._next_wall += missed * self.interval
+            lateness -= missed * self.interval
+
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        scheduled = datetime.fromtimestamp(self._next_wall, timezone.utc).replace(tzinfo=None)
+
+        self._next_mono += self.interval
+        self._next_wall += self.interval
+        self.ticks += 1
+        return scheduled
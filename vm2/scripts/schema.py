@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Point Schema
+Builds narrow (one point per metric) or wide (one point per cycle) records
+and the Flux helpers that let narrow-schema queries read wide data
+"""
+
+import os
+import argparse
+import logging
+from influxdb_client import Point
+from line_protocol import SeriesEncoder, to_nanoseconds
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_NARROW = 'narrow'
+SCHEMA_WIDE = 'wide'
+SCHEMA_MODES = (SCHEMA_NARROW, SCHEMA_WIDE)
+
+# Tag that names the metric in the narrow schema, per measurement
+NARROW_KEY_TAGS = {
+    'water_metrics': 'sensor_type',
+    'system_metrics': 'metric_type',
+    'docker_metrics': 'metric_type',
+    'connectivity_metrics': 'metric_type'
+}
+
+# Wide-schema summary fields (<metric>_min, _max, _mean, _p95 and so on, see
+# encode_summaries), as a regular expression valid in both Python and Flux
+SUMMARY_FIELD_PATTERN = r'_(min|max|mean|p[0-9]+(_[0-9]+)?)$'
+
+
+def get_schema_mode():
+    """Read SCHEMA_MODE from the environment, falling back to narrow"""
+    mode = os.getenv('SCHEMA_MODE', SCHEMA_NARROW).lower()
+    if mode not in SCHEMA_MODES:
+        logger.warning(f"Unknown SCHEMA_MODE '{mode}', using '{SCHEMA_NARROW}'")
+        return SCHEMA_NARROW
+    return mode
+
+
+def build_metric_points(measurement, tags, metrics, timestamp, mode=SCHEMA_NARROW):
+    """Build Point objects for a dict of metrics
+
+    This is the reference layout that MetricEncoder reproduces byte for byte.
+
+    narrow: one point per metric, named by the measurement's key tag, with a
+            single "value" field (the original layout)
+    wide:   one point carrying every metric as its own field
+    """
+    if not metrics:
+        return []
+
+    if mode == SCHEMA_WIDE:
+        point = Point(measurement)
+        for tag_name, tag_value in tags.items():
+            point.tag(tag_name, tag_value)
+        for metric_name, value in metrics.items():
+            point.field(metric_name, value)
+        return [point.time(timestamp)]
+
+    key_tag = NARROW_KEY_TAGS[measurement]
+    points = []
+    for metric_name, value in metrics.items():
+        point = Point(measurement)
+        for tag_name, tag_value in tags.items():
+            point.tag(tag_name, tag_value)
+        point.tag(key_tag, metric_name) \
+            .field("value", value) \
+            .time(timestamp)
+        points.append(point)
+    return points
+
+
+class MetricEncoder:
+    """Line-protocol encoder for one measurement with fixed tags, in either schema mode
+
+    Each series' escaped measurement and tag prefix is built once and reused,
+    so a cycle only formats field values and the timestamp.
+    """
+
+    def __init__(self, measurement, tags, mode=SCHEMA_NARROW):
+        self.measurement = measurement
+        self.tags = dict(tags)
+        self.mode = mode
+        self.key_tag = NARROW_KEY_TAGS[measurement]
+        self._wide = SeriesEncoder(measurement, self.tags)
+        self._series = {}
+
+    def _series_encoder(self, metric_name):
+        encoder = self._series.get(metric_name)
+        if encoder is None:
+            encoder = SeriesEncoder(self.measurement, {**self.tags, self.key_tag: metric_name})
+            self._series[metric_name] = encoder
+        return encoder
+
+    def encode(self, metrics, timestamp):
+        """Encode a dict of metrics to a list of line-protocol lines"""
+        if not metrics:
+            return []
+        timestamp = to_nanoseconds(timestamp)
+
+        if self.mode == SCHEMA_WIDE:
+            line = self._wide.encode(metrics, timestamp)
+            return [line] if line else []
+
+        lines = []
+        for metric_name, value in metrics.items():
+            line = self._series_encoder(metric_name).encode_value(value, timestamp)
+            if line:
+                lines.append(line)
+        return lines
+
+    def encode_summaries(self, summaries, timestamp):
+        """Encode per-metric summary fields (value/min/max/mean/p95/samples)
+
+        narrow: the summary fields sit next to "value" on each metric's point
+        wide:   one point with <metric> plus <metric>_<stat> fields and a
+                single samples count
+        """
+        if not summaries:
+            return []
+        timestamp = to_nanoseconds(timestamp)
+
+        if self.mode == SCHEMA_WIDE:
+            fields = {}
+            for metric_name, summary in summaries.items():
+                for stat, value in summary.items():
+                    if stat == 'value':
+                        fields[metric_name] = value
+                    elif stat != 'samples':
+                        fields[f"{metric_name}_{stat}"] = value
+            fields['samples'] = max(summary['samples'] for summary in summaries.values())
+            line = self._wide.encode(fields, timestamp)
+            return [line] if line else []
+
+        lines = []
+        for metric_name, summary in summaries.items():
+            line = self._series_encoder(metric_name).encode(summary, timestamp)
+            if line:
+                lines.append(line)
+        return lines
+
+
+def compat_function_name(measurement):
+    """Flux function name for a measurement, e.g. water_metrics -> waterMetricsNarrow"""
+    head, *rest = measurement.split('_')
+    return head + ''.join(word.capitalize() for word in rest) + 'Narrow'
+
+
+def compat_flux(measurement):
+    """Flux function that reshapes wide rows of a measurement into the narrow layout
+
+    Only the base reading fields become narrow series; the summary fields
+    of edge-sampled points (samples, <metric>_min, ...) are left out rather
+    than turned into sensor types of their own.
+    """
+    key_tag = NARROW_KEY_TAGS[measurement]
+    return (
+        f'// Reshape wide {measurement} rows into the narrow {key_tag}/value layout\n'
+        f'{compat_function_name(measurement)} = (tables=<-) => tables\n'
+        f'    |> filter(fn: (r) => r._measurement == "{measurement}")\n'
+        f'    |> filter(fn: (r) => r._field != "samples" and r._field !~ /{SUMMARY_FIELD_PATTERN}/)\n'
+        f'    |> map(fn: (r) => ({{r with {key_tag}: r._field, _field: "value"}}))\n'
+        f'    |> group(columns: ["_time", "_value"], mode: "except")\n'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print Flux helpers for reading wide-schema data '
+                                                 'with narrow-schema queries')
+    parser.add_argument('--measurement', choices=sorted(NARROW_KEY_TAGS),
+                        help='Only print the helper for this measurement')
+
+    args = parser.parse_args()
+
+    measurements = [args.measurement] if args.measurement else list(NARROW_KEY_TAGS)
+    print('\n'.join(compat_flux(measurement) for measurement in measurements))
+
+if __name__ == "__main__":
+    main()
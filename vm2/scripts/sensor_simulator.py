@@ -5,13 +5,28 @@ Simulates various water quality sensors and sends data to InfluxDB
 """
 
 import os
+import sys
 import time
 import random
+import signal
 import argparse
 import logging
-from datetime import datetime, timedelta
-from influxdb_client import InfluxDBClient, Point
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
+from write_pipeline import BatchWriter
+from schema import MetricEncoder, get_schema_mode
+from line_protocol import SeriesEncoder
+from scheduler import IntervalScheduler
+from summary import EdgeSampler
+from deadband import Deadband
+from detector import AnomalyDetector
+from profiles import DiurnalProfiles
+from columnar import ColumnarWriter, ColumnarReader
+from archive import LocalArchive
+from live import LiveServer
+from instrumentation import MetricsRegistry, MetricsServer, register_writer, register_scheduler, register_archive
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +35,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Realistic operating ranges, readings are clipped to these
+SENSOR_CONSTRAINTS = {
+    'ph_level': (6.5, 8.5),
+    'temperature': (15.0, 30.0),
+    'pressure': (1.5, 4.0),
+    'turbidity': (0.1, 2.0),
+    'chlorine': (0.5, 2.0),
+    'dissolved_oxygen': (6.0, 12.0),
+    'conductivity': (200, 800),
+    'total_dissolved_solids': (150, 500),
+    'alkalinity': (80, 200)
+}
+
+# Multiplier ranges for simulated anomalies
+ANOMALY_RANGES = {
+    'flow_rate': (0.5, 2.0),      # Drastic flow changes
+    'ph_level': (0.3, 3.0),       # pH spikes
+    'temperature': (0.7, 1.5),    # Temperature anomalies
+    'pressure': (0.5, 2.0),       # Pressure spikes
+    'turbidity': (2.0, 5.0),      # High turbidity events
+    'chlorine': (0.1, 3.0)        # Chlorine variations
+}
+
+ANOMALY_CHANCE = 0.001  # 0.1% chance per reading
+
+# Timesteps generated per vectorized block in backfills (a day at 30s)
+BULK_BLOCK_STEPS = 2880
+
 class WaterSensorSimulator:
-    def __init__(self, plant_id, plant_name, location):
+    def __init__(self, plant_id, plant_name, location, connect=True, profiles=None, new_detector=None,
+                 metrics=None):
         self.plant_id = plant_id
         self.plant_name = plant_name
         self.location = location
@@ -32,6 +76,34 @@ class WaterSensorSimulator:
         self.influxdb_org = os.getenv('INFLUXDB_ORG', 'water_treatment')
         self.influxdb_bucket = os.getenv('INFLUXDB_BUCKET', 'water_metrics')
         
+        # Point layout: narrow (one point per sensor) or wide (one per cycle)
+        self.schema_mode = get_schema_mode()
+        
+        # Series prefixes are escaped once here, not on every cycle
+        tags = {
+            "plant_id": self.plant_id,
+            "plant_name": self.plant_name,
+            "location": self.location
+        }
+        self.water_encoder = MetricEncoder("water_metrics", tags, self.schema_mode)
+        self.status_encoder = SeriesEncoder("plant_status", tags)
+        
+        # Edge sampling: when SAMPLE_INTERVAL is shorter than the uplink
+        # interval, sensors are read that often and only summaries are sent;
+        # the last EDGE_WINDOW seconds stay in memory at full resolution
+        self.sample_interval = float(os.getenv('SAMPLE_INTERVAL', 0))
+        self.edge_window = float(os.getenv('EDGE_WINDOW', 3600))
+        self.sampler = None
+        
+        # Report-by-exception: with DEADBAND set, readings are only sent when
+        # they move outside their band or DEADBAND_HEARTBEAT seconds pass
+        self.deadband = Deadband.from_env()
+        
+        # Streaming anomaly detection against the sensor constraints; alerts
+        # go out as sensor_alerts points without waiting for a batch
+        self.detector = new_detector() if new_detector else AnomalyDetector.from_env(SENSOR_CONSTRAINTS)
+        self.alert_encoders = {}
+        
         # Sensor baseline values
         self.baseline_values = {
             'flow_rate': 800,  # L/min
@@ -46,6 +118,11 @@ class WaterSensorSimulator:
             'alkalinity': 120  # mg/L as CaCO3
         }
         
+        # Daily, weekday/weekend and seasonal curves, compiled once into
+        # per-minute lookup tables (PROFILE_CONFIG); a fleet loads them once
+        # and passes them to every plant
+        self.profiles = profiles if profiles is not None else DiurnalProfiles.from_env()
+        
         # Sensor variation ranges
         self.variation_ranges = {
             'flow_rate': (0.95, 1.05),  # ±5%
@@ -63,11 +140,52 @@ class WaterSensorSimulator:
         # Initialize InfluxDB client
         self.client = None
         self.write_api = None
-        self.connect_influxdb()
+        self.writer = None
+        if connect:
+            self.connect_influxdb()
+        
+        # Self-instrumentation, served on METRICS_PORT and optionally written
+        # to InfluxDB as agent_metrics points. A shared registry belongs to
+        # the fleet, which registers its own totals; the stage histograms
+        # are then shared by all its plants
+        shared_metrics = metrics is not None
+        self.metrics = metrics if shared_metrics else MetricsRegistry("sensor_simulator",
+                                                                      {"plant_id": self.plant_id})
+        self.stage_seconds = {
+            stage: self.metrics.histogram("stage_duration_seconds", "Time per simulation stage", stage=stage)
+            for stage in ("generate", "detect", "send")
+        }
+        self.metrics_server = None
+        self.self_metrics_influx = os.getenv('SELF_METRICS_INFLUX', 'false').lower() == 'true'
+        if self.writer:
+            register_writer(self.metrics, self.writer)
+        
+        # Recording: every generated reading is also appended to a columnar
+        # file (see start_recording)
+        self.recorder = None
+        self.record_flush_interval = 60.0
+        self._last_record_flush = time.monotonic()
+        
+        # Local history of live readings in daily columnar partitions under
+        # ARCHIVE_DIR, and the last LIVE_WINDOW seconds in memory behind the
+        # live API on LIVE_PORT; both opened by run_simulation
+        self.archive = None
+        self.live = None
+        if self.detector and not shared_metrics:
+            self.metrics.counter("detector_samples_total", "Readings checked by the anomaly detector",
+                                 lambda: self.detector.samples)
+            self.metrics.counter("detector_alerts_total", "Alerts raised by the anomaly detector",
+                                 lambda: self.detector.alerts)
+            self.metrics.counter("detector_relearns_total", "Level shifts the detector re-learned its baseline for",
+                                 lambda: self.detector.relearns)
+        if self.deadband and not shared_metrics:
+            self.metrics.counter("deadband_points_sent_total", "Readings sent under the deadband",
+                                 lambda: self.deadband.points_sent)
+            self.metrics.counter("deadband_points_suppressed_total", "Readings suppressed by the deadband",
+                                 lambda: self.deadband.points_suppressed)
         
         # Simulation state
-        self.simulation_time = datetime.now()
-        self.day_cycle = 0  # Days since simulation start
+        self.simulation_time = datetime.now(timezone.utc)
         
     def connect_influxdb(self):
         """Connect to InfluxDB"""
@@ -78,16 +196,22 @@ class WaterSensorSimulator:
                 org=self.influxdb_org
             )
             self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            # Writes happen on a background thread so collection timing is
+            # independent of VM1 latency
+            self.writer = BatchWriter.from_env(self.write_api, self.influxdb_bucket,
+                                              f"sensor_simulator_{self.plant_id}")
             logger.info(f"Connected to InfluxDB at {self.influxdb_url}")
         except Exception as e:
             logger.error(f"Failed to connect to InfluxDB: {e}")
             self.client = None
             self.write_api = None
+            self.writer = None
     
-    def generate_sensor_reading(self, sensor_name, base_value, variation_range):
+    def generate_sensor_reading(self, sensor_name, base_value, variation_range, time_factor=None):
         """Generate a realistic sensor reading with natural variation"""
         # Add time-based variation (daily cycles, seasonal trends)
-        time_factor = self.get_time_factor(sensor_name)
+        if time_factor is None:
+            time_factor = self.get_time_factor(sensor_name)
         
         # Add random variation
         random_factor = random.uniform(*variation_range)
@@ -103,77 +227,44 @@ class WaterSensorSimulator:
         
         return round(final_value, 3)
     
-    def get_time_factor(self, sensor_name):
-        """Get time-based variation factor for different sensors"""
-        current_hour = self.simulation_time.hour
-        current_day = self.day_cycle
-        
-        if sensor_name == 'flow_rate':
-            # Peak usage during morning (7-9) and evening (18-20)
-            if 7 <= current_hour <= 9:
-                return 1.15
-            elif 18 <= current_hour <= 20:
-                return 1.10
-            elif 23 <= current_hour or current_hour <= 5:
-                return 0.85
-            else:
-                return 1.0
-                
-        elif sensor_name == 'temperature':
-            # Daily temperature cycle
-            if 14 <= current_hour <= 16:
-                return 1.05  # Warmest in afternoon
-            elif 4 <= current_hour <= 6:
-                return 0.95  # Coolest in early morning
-            else:
-                return 1.0
-                
-        elif sensor_name == 'ph_level':
-            # Slight variation during peak usage
-            if 7 <= current_hour <= 9 or 18 <= current_hour <= 20:
-                return 1.02
-            else:
-                return 1.0
-                
-        else:
-            return 1.0
+    @property
+    def simulation_time(self):
+        return self._simulation_time
+    
+    @simulation_time.setter
+    def simulation_time(self, timestamp):
+        # Time factors are looked up once per tick, on first use
+        self._simulation_time = timestamp
+        self._time_factors = None
+    
+    def time_factors(self):
+        """{sensor: time factor} at the current simulation time"""
+        if self._time_factors is None:
+            self._time_factors = self.profiles.factors(self._simulation_time)
+        return self._time_factors
+    
+    def get_time_factor(self, sensor_name, timestamp=None):
+        """Get time-based variation factor (daily, weekday/weekend and seasonal) for a sensor"""
+        if timestamp is not None:
+            return self.profiles.factor(sensor_name, timestamp)
+        factors = self._time_factors
+        if factors is None:
+            factors = self.time_factors()
+        return factors.get(sensor_name, 1.0)
     
     def apply_sensor_constraints(self, sensor_name, value):
         """Apply realistic constraints to sensor values"""
-        constraints = {
-            'ph_level': (6.5, 8.5),
-            'temperature': (15.0, 30.0),
-            'pressure': (1.5, 4.0),
-            'turbidity': (0.1, 2.0),
-            'chlorine': (0.5, 2.0),
-            'dissolved_oxygen': (6.0, 12.0),
-            'conductivity': (200, 800),
-            'total_dissolved_solids': (150, 500),
-            'alkalinity': (80, 200)
-        }
-        
-        if sensor_name in constraints:
-            min_val, max_val = constraints[sensor_name]
+        if sensor_name in SENSOR_CONSTRAINTS:
+            min_val, max_val = SENSOR_CONSTRAINTS[sensor_name]
             return max(min_val, min(max_val, value))
         
         return value
     
     def simulate_anomaly(self, sensor_name, value):
         """Simulate occasional sensor anomalies"""
-        anomaly_chance = 0.001  # 0.1% chance per reading
-        
-        if random.random() < anomaly_chance:
-            anomaly_types = {
-                'flow_rate': (0.5, 2.0),      # Drastic flow changes
-                'ph_level': (0.3, 3.0),       # pH spikes
-                'temperature': (0.7, 1.5),    # Temperature anomalies
-                'pressure': (0.5, 2.0),       # Pressure spikes
-                'turbidity': (2.0, 5.0),      # High turbidity events
-                'chlorine': (0.1, 3.0)        # Chlorine variations
-            }
-            
-            if sensor_name in anomaly_types:
-                min_factor, max_factor = anomaly_types[sensor_name]
+        if random.random() < ANOMALY_CHANCE:
+            if sensor_name in ANOMALY_RANGES:
+                min_factor, max_factor = ANOMALY_RANGES[sensor_name]
                 anomaly_factor = random.uniform(min_factor, max_factor)
                 logger.warning(f"Simulating anomaly for {sensor_name}: {value} -> {value * anomaly_factor}")
                 return value * anomaly_factor
@@ -183,47 +274,127 @@ class WaterSensorSimulator:
     def generate_readings(self):
         """Generate readings for all sensors"""
         readings = {}
+        time_factors = self.time_factors()
         
         for sensor_name, base_value in self.baseline_values.items():
             variation_range = self.variation_ranges.get(sensor_name, (0.95, 1.05))
-            reading = self.generate_sensor_reading(sensor_name, base_value, variation_range)
+            reading = self.generate_sensor_reading(sensor_name, base_value, variation_range,
+                                                   time_factors.get(sensor_name, 1.0))
             reading = self.simulate_anomaly(sensor_name, reading)
             readings[sensor_name] = reading
         
         return readings
     
-    def send_to_influxdb(self, readings):
+    def vector_engine(self):
+        """VectorSensorEngine for this plant's model, or None without NumPy"""
+        try:
+            from vector_engine import VectorSensorEngine
+        except ImportError:
+            logger.info("NumPy not available, generating bulk readings one timestep at a time")
+            return None
+        return VectorSensorEngine(self, seed=random.getrandbits(64))
+    
+    def bulk_readings(self, timestamps, block_steps=BULK_BLOCK_STEPS):
+        """Yield (timestamp, readings) for each timestamp, advancing simulation_time
+
+        Readings are generated block_steps timesteps at a time by the
+        vectorized engine when NumPy is available, otherwise one
+        generate_readings call per timestep.
+        """
+        engine = self.vector_engine()
+        if engine is None:
+            for timestamp in timestamps:
+                self.simulation_time = timestamp
+                yield timestamp, self.generate_readings()
+            return
+        
+        timestamps = iter(timestamps)
+        while True:
+            block = list(islice(timestamps, block_steps))
+            if not block:
+                return
+            values, _ = engine.generate(1, *engine.slots(block))
+            for step, timestamp in enumerate(block):
+                self.simulation_time = timestamp
+                yield timestamp, engine.readings(values, 0, step)
+    
+    def encode_readings(self, readings, timestamp, summarized=False):
+        """Encode sensor readings (or their summaries) plus a plant status point as line protocol"""
+        status = {
+            "status": "operational",
+            "uptime_hours": random.uniform(95, 100)
+        }
+        
+        if self.deadband:
+            now = timestamp.replace(tzinfo=timezone.utc).timestamp()
+            if summarized:
+                readings = self.deadband.filter_summaries(readings, now)
+            else:
+                readings = self.deadband.filter(readings, now)
+            if not self.deadband.allow("plant_status", status["status"], now):
+                status = None
+            else:
+                status["points_sent"] = self.deadband.points_sent
+                status["points_suppressed"] = self.deadband.points_suppressed
+        
+        if summarized:
+            points = self.water_encoder.encode_summaries(readings, timestamp)
+        else:
+            points = self.water_encoder.encode(readings, timestamp)
+        
+        # Add plant status point
+        if status:
+            points.append(self.status_encoder.encode(status, timestamp))
+        return points
+    
+    def encode_alerts(self, readings, timestamp):
+        """Run readings through the anomaly detector and encode any alerts as line protocol"""
+        if not self.detector:
+            return []
+        
+        lines = []
+        now = timestamp.replace(tzinfo=timezone.utc).timestamp()
+        for sensor_name, alerts in self.detector.observe_all(readings, now).items():
+            for alert in alerts:
+                alert_type = alert.pop("alert_type")
+                encoder = self.alert_encoders.get((sensor_name, alert_type))
+                if encoder is None:
+                    encoder = SeriesEncoder("sensor_alerts", {
+                        **self.water_encoder.tags,
+                        "sensor_type": sensor_name,
+                        "alert_type": alert_type
+                    })
+                    self.alert_encoders[(sensor_name, alert_type)] = encoder
+                lines.append(encoder.encode(alert, timestamp))
+                logger.warning(f"{alert_type} alert for {sensor_name}: {alert}")
+        return lines
+    
+    def send_alerts(self, readings, timestamp):
+        """Detect anomalies in readings and write alerts immediately"""
+        with self.stage_seconds["detect"].time():
+            lines = self.encode_alerts(readings, timestamp)
+        if lines and self.writer:
+            self.writer.write(lines, urgent=True)
+    
+    def send_to_influxdb(self, readings, timestamp=None, summarized=False):
         """Send sensor readings to InfluxDB"""
-        if not self.write_api:
+        if not self.writer:
             logger.error("InfluxDB not connected")
             return False
         
         try:
-            points = []
-            timestamp = datetime.utcnow()
-            
-            for sensor_name, value in readings.items():
-                point = Point("water_metrics") \
-                    .tag("plant_id", self.plant_id) \
-                    .tag("plant_name", self.plant_name) \
-                    .tag("location", self.location) \
-                    .tag("sensor_type", sensor_name) \
-                    .field("value", value) \
-                    .time(timestamp)
-                points.append(point)
-            
-            # Add plant status point
-            status_point = Point("plant_status") \
-                .tag("plant_id", self.plant_id) \
-                .tag("plant_name", self.plant_name) \
-                .tag("location", self.location) \
-                .field("status", "operational") \
-                .field("uptime_hours", random.uniform(95, 100)) \
-                .time(timestamp)
-            points.append(status_point)
+            timestamp = timestamp or datetime.now(timezone.utc)
+            points = self.encode_readings(readings, timestamp, summarized)
+            if self.self_metrics_influx:
+                points.extend(self.metrics.encode(timestamp))
+            if not points:
+                logger.info("No readings outside their deadband, nothing sent")
+                return True
             
-            self.write_api.write(bucket=self.influxdb_bucket, record=points)
-            logger.info(f"Sent {len(points)} data points to InfluxDB")
+            if not self.writer.write(points):
+                return False
+            logger.info(f"Queued {len(points)} data points for InfluxDB "
+                        f"(queue depth {self.writer.queue_depth})")
             return True
             
         except Exception as e:
@@ -234,20 +405,39 @@ class WaterSensorSimulator:
         """Run the sensor simulation"""
         logger.info(f"Starting sensor simulation for {self.plant_name} ({self.location})")
         logger.info(f"Data collection interval: {interval} seconds")
+        logger.info(f"Schema mode: {self.schema_mode}")
+        if self.deadband:
+            logger.info(f"Deadband: {self.deadband.bands}, heartbeat {self.deadband.heartbeat} seconds")
+        
+        self.archive = LocalArchive.from_env(f"sensor_simulator_{self.plant_id}")
+        if self.archive:
+            register_archive(self.metrics, self.archive)
+        self.live = LiveServer.from_env({"agent": "sensor_simulator", **self.water_encoder.tags})
+        self.metrics_server = MetricsServer.from_env(self.metrics)
+        
+        if 0 < self.sample_interval < interval:
+            self.run_sampled(interval)
+            return
         
         while True:
             try:
-                # Update simulation time
-                self.simulation_time = datetime.now()
+                # Update simulation time (UTC, like backfills and point timestamps)
+                timestamp = datetime.now(timezone.utc)
+                self.simulation_time = timestamp
                 
                 # Generate sensor readings
-                readings = self.generate_readings()
+                with self.stage_seconds["generate"].time():
+                    readings = self.generate_readings()
+                self.record(timestamp, readings)
                 
                 # Log readings
                 logger.info(f"Generated readings: {readings}")
                 
-                # Send to InfluxDB
-                if self.send_to_influxdb(readings):
+                # Alerts first, then the regular points
+                self.send_alerts(readings, timestamp)
+                with self.stage_seconds["send"].time():
+                    sent = self.send_to_influxdb(readings, timestamp)
+                if sent:
                     logger.info("Data sent successfully")
                 else:
                     logger.warning("Failed to send data")
@@ -262,9 +452,237 @@ class WaterSensorSimulator:
                 logger.error(f"Simulation error: {e}")
                 time.sleep(interval)
         
-        # Cleanup
+        self.close()
+    
+    def run_sampled(self, interval):
+        """Sample every sample_interval seconds and send summaries every interval"""
+        logger.info(f"Sampling every {self.sample_interval} seconds, "
+                    f"keeping {self.edge_window} seconds locally")
+        
+        self.sampler = EdgeSampler(max(1, int(self.edge_window / self.sample_interval)), interval)
+        scheduler = IntervalScheduler(self.sample_interval)
+        register_scheduler(self.metrics, scheduler)
+        
+        while True:
+            try:
+                timestamp = scheduler.wait()
+                self.simulation_time = timestamp
+                epoch = timestamp.replace(tzinfo=timezone.utc).timestamp()
+                
+                with self.stage_seconds["generate"].time():
+                    readings = self.generate_readings()
+                self.send_alerts(readings, timestamp)
+                self.record(timestamp, readings)
+                self.sampler.add(readings, epoch)
+                if not self.sampler.due(epoch):
+                    continue
+                
+                summaries = self.sampler.summarize()
+                logger.info(f"Summarized readings: {summaries}")
+                with self.stage_seconds["send"].time():
+                    sent = self.send_to_influxdb(summaries, timestamp, summarized=True)
+                if sent:
+                    logger.info("Data sent successfully")
+                else:
+                    logger.warning("Failed to send data")
+                
+            except KeyboardInterrupt:
+                logger.info("Simulation stopped by user")
+                break
+            except Exception as e:
+                logger.error(f"Simulation error: {e}")
+        
+        self.close()
+    
+    def start_recording(self, path, interval=None, flush_interval=60.0):
+        """Append every generated reading to the columnar file at path
+
+        Live readings are flushed as a (short) block at least every
+        flush_interval seconds, so a crash loses at most that much of the
+        recording; backfills write full blocks.
+        """
+        self.recorder = ColumnarWriter(path, list(self.baseline_values), metadata={
+            "measurement": "water_metrics",
+            "tags": dict(self.water_encoder.tags),
+            "interval": interval
+        })
+        self.record_flush_interval = flush_interval
+        self._last_record_flush = time.monotonic()
+        logger.info(f"Recording readings to {path}")
+    
+    def record(self, timestamp, readings):
+        """Hand live readings to the recording, the live API and the local archive"""
+        if self.recorder:
+            self.recorder.append(timestamp, readings)
+            if time.monotonic() - self._last_record_flush >= self.record_flush_interval:
+                self.recorder.flush()
+                self._last_record_flush = time.monotonic()
+        if self.live:
+            self.live.publish("water_metrics", timestamp, readings)
+        if self.archive:
+            self.archive.append("water_metrics", timestamp, readings, {
+                "measurement": "water_metrics",
+                "tags": dict(self.water_encoder.tags)
+            })
+    
+    def close(self):
+        """Flush queued points and close the InfluxDB client"""
+        if self.recorder:
+            self.recorder.close()
+            logger.info(f"Recorded {self.recorder.rows_written} readings to {self.recorder.path}")
+        if self.archive:
+            self.archive.close()
+        if self.metrics_server:
+            self.metrics_server.close()
+        if self.live:
+            self.live.close()
+        if self.writer:
+            self.writer.close()
         if self.client:
             self.client.close()
+    
+    def write_bulk(self, lines, max_retries=5):
+        """Write a chunk of line protocol synchronously, retrying with backoff"""
+        payload = '\n'.join(lines)
+        for attempt in range(max_retries + 1):
+            try:
+                self.write_api.write(bucket=self.influxdb_bucket, record=payload)
+                return
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = random.uniform(0, min(30, 2 ** attempt))
+                logger.warning(f"Bulk write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def run_backfill(self, start, end, interval=30, chunk_size=50000):
+        """Generate readings from start to end in simulated time and bulk-write them
+
+        While recording, the readings go to the recording instead of InfluxDB.
+        """
+        if not self.write_api and not self.recorder:
+            logger.error("InfluxDB not connected")
+            return False
+        
+        total_steps = int((end - start).total_seconds() // interval) + 1
+        logger.info(f"Backfilling {self.plant_name} from {start.isoformat()} to {end.isoformat()} "
+                    f"({total_steps} timesteps every {interval} seconds)")
+        
+        chunk = []
+        points_written = 0
+        started = time.monotonic()
+        step = timedelta(seconds=interval)
+        
+        try:
+            # Advance simulated time instead of sleeping
+            timestamps = (start + index * step for index in range(total_steps))
+            for index, (timestamp, readings) in enumerate(self.bulk_readings(timestamps)):
+                if self.recorder:
+                    self.recorder.append(timestamp, readings)
+                    chunk.append(readings)
+                else:
+                    chunk.extend(self.encode_alerts(readings, timestamp))
+                    chunk.extend(self.encode_readings(readings, timestamp))
+                
+                if len(chunk) >= chunk_size or index == total_steps - 1:
+                    if not self.recorder:
+                        self.write_bulk(chunk)
+                    points_written += len(chunk)
+                    chunk = []
+                    
+                    elapsed = time.monotonic() - started
+                    rate = points_written / elapsed if elapsed > 0 else 0
+                    done = (index + 1) / total_steps
+                    eta = elapsed / done - elapsed
+                    logger.info(f"Backfill {done:.1%}: {points_written} points up to "
+                                f"{self.simulation_time.isoformat()} ({rate:.0f} points/s, ETA {eta:.0f}s)")
+        except KeyboardInterrupt:
+            logger.info(f"Backfill stopped by user at {self.simulation_time.isoformat()}")
+            return False
+        except Exception as e:
+            logger.error(f"Backfill failed at {self.simulation_time.isoformat()}: {e}")
+            return False
+        finally:
+            self.close()
+        
+        logger.info(f"Backfill complete: {points_written} points in {time.monotonic() - started:.1f}s")
+        return True
+    
+    def run_replay(self, path, speed=1.0, rebase=False, chunk_size=50000):
+        """Stream a recording to InfluxDB as water_metrics points under this plant's tags
+        
+        speed is a multiple of real time (0 for as fast as possible). With
+        rebase the recording is shifted to start now; otherwise points keep
+        their recorded timestamps. The same recording and options always
+        produce the same points.
+        """
+        if not self.write_api:
+            logger.error("InfluxDB not connected")
+            return False
+        
+        reader = ColumnarReader(path)
+        if not reader.rows:
+            logger.error(f"{path} holds no readings")
+            reader.close()
+            return False
+        first, last = reader.time_range
+        offset = time.time_ns() - first if rebase else 0
+        logger.info(f"Replaying {reader.rows} readings ({(last - first) / 1e9:.0f}s recorded) from {path} "
+                    f"at {f'{speed:g}x' if speed else 'max'} speed")
+        
+        chunk = []
+        points_written = 0
+        started = time.monotonic()
+        
+        try:
+            for timestamp, readings in reader.scan():
+                lines = self.water_encoder.encode(readings, timestamp + offset)
+                if not speed:
+                    # As fast as possible: large synchronous bulk writes
+                    chunk.extend(lines)
+                    if len(chunk) >= chunk_size:
+                        self.write_bulk(chunk)
+                        points_written += len(chunk)
+                        chunk = []
+                    continue
+                
+                # Paced: hold each reading until its recorded offset, scaled by speed
+                delay = started + (timestamp - first) / 1e9 / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.writer.write(lines)
+                points_written += len(lines)
+            
+            if chunk:
+                self.write_bulk(chunk)
+                points_written += len(chunk)
+        except KeyboardInterrupt:
+            logger.info("Replay stopped by user")
+            return False
+        except Exception as e:
+            logger.error(f"Replay failed: {e}")
+            return False
+        finally:
+            reader.close()
+            self.close()
+        
+        elapsed = time.monotonic() - started
+        logger.info(f"Replay complete: {points_written} points in {elapsed:.1f}s "
+                    f"({points_written / elapsed if elapsed > 0 else 0:.0f} points/s)")
+        return True
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 date or datetime; naive values are taken as UTC"""
+    # fromisoformat only accepts a Z suffix from Python 3.11
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
 
 def main():
     parser = argparse.ArgumentParser(description='Water Treatment Plant Sensor Simulator')
@@ -272,12 +690,41 @@ def main():
     parser.add_argument('--plant-name', required=True, help='Plant name')
     parser.add_argument('--location', required=True, help='Plant location')
     parser.add_argument('--interval', type=int, default=30, help='Data collection interval in seconds')
+    parser.add_argument('--backfill', nargs=2, type=parse_timestamp, metavar=('START', 'END'),
+                        help='Generate history between two ISO 8601 UTC timestamps without sleeping')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help='Points per bulk write when backfilling or replaying')
+    parser.add_argument('--record', metavar='PATH',
+                        help='Also append every reading to a columnar recording (with --backfill: instead of '
+                             'writing to InfluxDB)')
+    parser.add_argument('--replay', metavar='PATH', help='Stream a recording to InfluxDB instead of simulating')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed as a multiple of real time, 0 for as fast as possible')
+    parser.add_argument('--rebase', action='store_true', help='Shift replayed timestamps to start now')
     
     args = parser.parse_args()
     
+    # Treat docker stop (SIGTERM) like Ctrl+C so queued points get flushed
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     # Create and run simulator
     simulator = WaterSensorSimulator(args.plant_id, args.plant_name, args.location)
-    simulator.run_simulation(args.interval)
+    if args.replay:
+        if args.record or args.backfill:
+            parser.error('--replay cannot be combined with --record or --backfill')
+        if not simulator.run_replay(args.replay, args.speed, args.rebase, args.chunk_size):
+            sys.exit(1)
+        return
+    if args.record:
+        simulator.start_recording(args.record, args.interval)
+    if args.backfill:
+        start, end = args.backfill
+        if end < start:
+            parser.error('--backfill END must not be before START')
+        if not simulator.run_backfill(start, end, args.interval, args.chunk_size):
+            sys.exit(1)
+    else:
+        simulator.run_simulation(args.interval)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Write Spool
+Append-only on-disk segments that hold line protocol while VM1 is unreachable
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.lp'
+CHECKPOINT_FILE = 'replay.offset'
+
+
+class DiskSpool:
+    """Segmented append-only spool with batched fsync, a size cap and a replay cursor
+
+    Lines are appended to the newest segment, which rolls over once it reaches
+    segment_bytes. Replay reads sealed segments oldest first and records its
+    position in a checkpoint file so a restart resumes where it left off.
+    """
+
+    def __init__(self, directory, segment_bytes=8 * 1024**2, max_bytes=512 * 1024**2,
+                 fsync_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+
+        # Counters
+        self.lines_spooled = 0
+        self.bytes_dropped = 0
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_seq = None
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._scan_segments()
+        self._read_seq, self._read_offset = self._load_checkpoint()
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _scan_segments(self):
+        """Return existing segment sequence numbers, oldest first"""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _load_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        try:
+            with open(path) as f:
+                checkpoint = json.load(f)
+            return checkpoint['segment'], checkpoint['offset']
+        except FileNotFoundError:
+            return None, 0
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable spool checkpoint {path}: {e}")
+            return None, 0
+
+    def _save_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'segment': self._read_seq, 'offset': self._read_offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @property
+    def size_bytes(self):
+        total = 0
+        for seq in self._segments:
+            try:
+                total += os.path.getsize(self._segment_path(seq))
+            except OSError:
+                continue
+        return total
+
+    @property
+    def pending(self):
+        """True if there is anything left to replay"""
+        with self._lock:
+            if not self._segments:
+                return False
+            if len(self._segments) > 1 or self._segments[0] != self._read_seq:
+                return True
+            try:
+                return os.path.getsize(self._segment_path(self._read_seq)) > self._read_offset
+            except OSError:
+                return False
+
+    def append(self, lines):
+        """Append line-protocol lines to the active segment"""
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            self._active.write(data)
+            self._dirty = True
+            self.lines_spooled += len(lines)
+
+            if self._active.tell() >= self.segment_bytes:
+                self._seal_active()
+            elif time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync_active()
+
+            self._enforce_size_cap()
+
+    def _open_segment(self):
+        self._active_seq = (self._segments[-1] + 1) if self._segments else 1
+        self._active = open(self._segment_path(self._active_seq), 'ab')
+        self._segments.append(self._active_seq)
+
+    def _fsync_active(self):
+        if self._active is not None and self._dirty:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _seal_active(self):
+        if self._active is None:
+            return
+        self._fsync_active()
+        self._active.close()
+        self._active = None
+        self._active_seq = None
+
+    def _enforce_size_cap(self):
+        """Delete the oldest sealed segments until the spool fits in max_bytes"""
+        total = self.size_bytes
+        while total > self.max_bytes and len(self._segments) > 1:
+            seq = self._segments.pop(0)
+            path = self._segment_path(seq)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                size = 0
+            total -= size
+            self.bytes_dropped += size
+            if seq == self._read_seq:
+                self._read_seq, self._read_offset = None, 0
+            logger.warning(f"Spool over {self.max_bytes} bytes, dropped oldest segment {seq} ({size} bytes)")
+
+    def read_chunk(self, max_lines):
+        """Read up to max_lines from the replay cursor
+
+        Returns (lines, position); pass position to commit() once the lines
+        have been written successfully.
+        """
+        with self._lock:
+            if self._segments and self._segments[-1] == self._active_seq and len(self._segments) == 1:
+                # Only the active segment has data; seal it so it can be read
+                self._seal_active()
+
+            while self._segments:
+                seq = self._segments[0]
+                if seq == self._active_seq:
+                    return [], None
+                offset = self._read_offset if seq == self._read_seq else 0
+
+                lines = []
+                with open(self._segment_path(seq), 'rb') as f:
+                    f.seek(offset)
+                    while len(lines) < max_lines:
+                        raw = f.readline()
+                        if not raw.endswith(b'\n'):
+                            # EOF, or a torn write from a crash
+                            break
+                        offset += len(raw)
+                        line = raw.decode('utf-8', errors='replace').rstrip('\n')
+                        if line:
+                            lines.append(line)
+                    at_end = not raw or not raw.endswith(b'\n')
+
+                if lines:
+                    return lines, (seq, offset, at_end)
+
+                # Nothing readable left in this segment
+                self._remove_segment(seq)
+
+            return [], None
+
+    def commit(self, position):
+        """Advance the replay cursor past a chunk returned by read_chunk()"""
+        if position is None:
+            return
+        seq, offset, at_end = position
+        with self._lock:
+            if seq not in self._segments:
+                return
+            if at_end:
+                self._remove_segment(seq)
+            else:
+                self._read_seq, self._read_offset = seq, offset
+                self._save_checkpoint()
+
+    def _remove_segment(self, seq):
+        self._segments.remove(seq)
+        try:
+            os.remove(self._segment_path(seq))
+        except OSError as e:
+            logger.warning(f"Failed to remove spool segment {seq}: {e}")
+        self._read_seq, self._read_offset = None, 0
+        self._save_checkpoint()
+
+    def close(self):
+        """fsync and close the active segment"""
+        with self._lock:
+            self._seal_active()
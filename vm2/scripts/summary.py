@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Edge Summaries
+Keeps a fixed-size full-resolution window per metric on the agent and
+incrementally computes the min/max/mean/last/p95 shipped to VM1
+"""
+
+from array import array
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) buffer backed by two float arrays"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.size = 0
+        self._head = 0
+
+    def append(self, timestamp, value):
+        self.times[self._head] = timestamp
+        self.values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def items(self, since=None, until=None):
+        """(timestamp, value) pairs oldest first, optionally limited to a time range"""
+        start = (self._head - self.size) % self.capacity
+        result = []
+        for offset in range(self.size):
+            index = (start + offset) % self.capacity
+            timestamp = self.times[index]
+            if (since is None or timestamp >= since) and (until is None or timestamp <= until):
+                result.append((timestamp, self.values[index]))
+        return result
+
+
+class P2Quantile:
+    """Streaming quantile estimate in O(1) time and memory (the P-square algorithm)
+
+    The first exact_limit samples are kept and the quantile is exact; after
+    that the five P-square markers are seeded from them and updated per sample.
+    """
+
+    def __init__(self, quantile, exact_limit=128):
+        self.quantile = quantile
+        self.exact_limit = max(5, exact_limit)
+        self._initial = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = (0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0)
+
+    def _seed(self):
+        ordered = sorted(self._initial)
+        last = len(ordered) - 1
+        self._desired = [last * increment for increment in self._increments]
+        # Marker positions must be strictly increasing: near the tails two
+        # desired positions round to the same rank
+        self._positions = [0]
+        for i in range(1, 4):
+            self._positions.append(min(max(round(self._desired[i]), self._positions[-1] + 1), last - (4 - i)))
+        self._positions.append(last)
+        self._heights = [ordered[position] for position in self._positions]
+        self._initial = None
+
+    def add(self, value):
+        if self._heights is None:
+            self._initial.append(value)
+            if len(self._initial) > self.exact_limit:
+                self._seed()
+            return
+
+        heights, positions = self._heights, self._positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Nudge the three middle markers toward their desired positions
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (delta <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / \
+                        (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        if n[i + 1] == n[i] or n[i] == n[i - 1]:
+            # Coincident markers: fall back to the linear adjustment in add
+            return q[i]
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        # Exact, linearly interpolated between the closest ranks
+        ordered = sorted(self._initial)
+        rank = (len(ordered) - 1) * self.quantile
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def quantile_field(quantile):
+    """Field name for a quantile: p95 for 0.95, p99_9 for 0.999"""
+    return f"p{quantile * 100:g}".replace('.', '_')
+
+
+class StreamingSummary:
+    """min/max/mean/last and a quantile (p95 by default) over the samples since the last reset"""
+
+    def __init__(self, quantile=0.95):
+        self.quantile = quantile
+        self.quantile_field = quantile_field(quantile)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self._quantile = P2Quantile(self.quantile)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        self.last = value
+        self._quantile.add(value)
+
+    def fields(self):
+        """Summary fields; "value" is the last sample, so it reads like an ordinary point"""
+        return {
+            'value': self.last,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count,
+            self.quantile_field: float(self._quantile.value()),
+            'samples': self.count
+        }
+
+
+class EdgeSampler:
+    """Per-metric ring buffers plus summaries for the current uplink interval"""
+
+    def __init__(self, capacity, uplink_interval, quantile=0.95):
+        self.capacity = capacity
+        self.uplink_interval = uplink_interval
+        self.quantile = quantile
+        self.buffers = {}
+        self.summaries = {}
+        self._period = None
+
+    def add(self, metrics, timestamp):
+        """Record one sample of every metric; timestamp is epoch seconds"""
+        for name, value in metrics.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if name not in self.buffers:
+                self.buffers[name] = RingBuffer(self.capacity)
+                self.summaries[name] = StreamingSummary(self.quantile)
+            self.buffers[name].append(timestamp, value)
+            self.summaries[name].add(value)
+
+    def due(self, timestamp):
+        """True once timestamp (epoch seconds) enters a new uplink interval"""
+        period = int(timestamp // self.uplink_interval)
+        if self._period is None:
+            self._period = period
+            return False
+        if period == self._period:
+            return False
+        self._period = period
+        return True
+
+    def summarize(self):
+        """Summary fields per metric since the last call, then start a new interval"""
+        result = {}
+        for name, summary in self.summaries.items():
+            if summary.count:
+                result[name] = summary.fields()
+                summary.reset()
+        return result
+
+    def window(self, name, since=None, until=None):
+        """Full-resolution (timestamp, value) samples still held for a metric"""
+        buffer = self.buffers.get(name)
+        return buffer.items(since, until) if buffer else []
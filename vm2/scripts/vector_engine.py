@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Vectorized Sensor Engine
+Generates whole (plants x timesteps x sensors) blocks of readings with NumPy,
+following the same model as WaterSensorSimulator.generate_readings
+"""
+
+import numpy as np
+
+from sensor_simulator import SENSOR_CONSTRAINTS, ANOMALY_RANGES, ANOMALY_CHANCE
+
+NOISE_RANGE = 0.02
+
+
+class VectorSensorEngine:
+    """Array-backed sensor model for bulk generation
+
+    Per-sensor baselines, variation ranges, clip bounds and anomaly ranges
+    are held as arrays in sensor order, and the simulator's compiled diurnal
+    profiles as (2880, sensors) minute and (366, sensors) day-of-year tables,
+    so a block is generated with a handful of array ops.
+    """
+
+    def __init__(self, simulator, seed=None):
+        self.sensors = list(simulator.baseline_values)
+        self.rng = np.random.default_rng(seed)
+
+        self.baselines = np.array([simulator.baseline_values[s] for s in self.sensors], dtype=np.float64)
+        variation = [simulator.variation_ranges.get(s, (0.95, 1.05)) for s in self.sensors]
+        self.variation_low = np.array([low for low, _ in variation])
+        self.variation_high = np.array([high for _, high in variation])
+
+        self.clip_min = np.array([SENSOR_CONSTRAINTS.get(s, (-np.inf, np.inf))[0] for s in self.sensors],
+                                 dtype=np.float64)
+        self.clip_max = np.array([SENSOR_CONSTRAINTS.get(s, (-np.inf, np.inf))[1] for s in self.sensors],
+                                 dtype=np.float64)
+
+        self.anomaly_mask = np.array([s in ANOMALY_RANGES for s in self.sensors])
+        self.anomaly_low = np.array([ANOMALY_RANGES.get(s, (1.0, 1.0))[0] for s in self.sensors])
+        self.anomaly_high = np.array([ANOMALY_RANGES.get(s, (1.0, 1.0))[1] for s in self.sensors])
+
+        self.profiles = simulator.profiles
+        self.daily_factors = np.array([self.profiles.daily_table(s) for s in self.sensors]).T
+        self.seasonal_factors = np.array([self.profiles.seasonal_table(s) for s in self.sensors]).T
+
+    def slots(self, timestamps):
+        """(minutes, days) table indices for a sequence of datetimes, for generate"""
+        indices = np.array([self.profiles.slot(timestamp) for timestamp in timestamps], dtype=np.intp)
+        return indices[:, 0], indices[:, 1]
+
+    def generate(self, plants, minutes, days=None):
+        """Generate readings for every plant at each timestep
+
+        minutes and days are the daily and seasonal profile indices, one per
+        timestep, as returned by slots (days defaults to the first day of the
+        year). Returns (values, anomalies): a float array of shape (plants,
+        timesteps, sensors) and a boolean array marking the injected anomalies.
+        """
+        minutes = np.asarray(minutes, dtype=np.intp)
+        days = np.zeros_like(minutes) if days is None else np.asarray(days, dtype=np.intp)
+        shape = (plants, len(minutes), len(self.sensors))
+
+        # base * time factor * uniform(variation) * (1 + uniform(noise)),
+        # computed in place to avoid block-sized temporaries
+        values = self.rng.random(shape)
+        values *= self.variation_high - self.variation_low
+        values += self.variation_low
+        noise = self.rng.random(shape)
+        noise *= 2 * NOISE_RANGE
+        noise += 1 - NOISE_RANGE
+        values *= noise
+        del noise
+        values *= self.baselines * self.daily_factors[minutes] * self.seasonal_factors[days]
+        np.clip(values, self.clip_min, self.clip_max, out=values)
+        np.round(values, 3, out=values)
+
+        # Anomalies are rare, so draw their count and positions rather than
+        # a random number for every reading
+        anomalies = np.zeros(shape, dtype=bool)
+        count = self.rng.binomial(values.size, ANOMALY_CHANCE)
+        if count:
+            flat = self.rng.integers(0, values.size, size=count)
+            sensor = flat % len(self.sensors)
+            flat, sensor = flat[self.anomaly_mask[sensor]], sensor[self.anomaly_mask[sensor]]
+            values.reshape(-1)[flat] *= self.rng.uniform(self.anomaly_low[sensor], self.anomaly_high[sensor])
+            anomalies.reshape(-1)[flat] = True
+
+        return values, anomalies
+
+    def readings(self, values, plant, timestep):
+        """Readings dict for one plant and timestep, as generate_readings returns"""
+        return dict(zip(self.sensors, values[plant, timestep].tolist()))
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Water Treatment Plant Write Pipeline
+Batches points in the background so collection never waits on InfluxDB
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+from spool import DiskSpool
+from instrumentation import Histogram, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+def to_line_protocol(record):
+    """Convert a Point (or an already encoded line) to a line-protocol string"""
+    if isinstance(record, bytes):
+        return record.decode('utf-8')
+    if isinstance(record, str):
+        return record
+    return record.to_line_protocol()
+
+
+class BatchWriter:
+    """Bounded in-memory queue drained by a background thread in batches
+
+    If a spool is given, batches that cannot be written (and points pushed out
+    of a full queue) are saved to disk instead of dropped, and replayed in
+    throttled chunks once InfluxDB is reachable again.
+    """
+
+    def __init__(self, write_api, bucket, batch_size=500, flush_interval=15.0,
+                 queue_size=10000, max_retries=5, retry_interval=1.0,
+                 max_retry_delay=30.0, spool=None, replay_batch_size=5000,
+                 replay_rate=5000.0):
+        self.write_api = write_api
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.max_retry_delay = max_retry_delay
+        self.spool = spool
+        self.replay_batch_size = replay_batch_size
+        self.replay_rate = replay_rate
+
+        # Counters
+        self.points_written = 0
+        self.points_dropped = 0
+        self.writes = 0
+        self.retries = 0
+        self.points_spooled = 0
+        self.points_replayed = 0
+
+        # Per-attempt write latency (seconds) and payload size (bytes)
+        self.write_seconds = Histogram()
+        self.payload_bytes = Histogram(SIZE_BUCKETS)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._in_flight = 0
+        self._closing = False
+        self._oldest_queued = None
+
+        # Set while InfluxDB is unreachable: batches get a single attempt and
+        # go straight to the spool instead of sitting through retries
+        self._outage = False
+        self._recovered = threading.Event()
+        self._stop_replay = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name='influx-writer', daemon=True)
+        self._thread.start()
+
+        self._replay_thread = None
+        if self.spool:
+            self._replay_thread = threading.Thread(target=self._replay, name='spool-replay', daemon=True)
+            self._replay_thread.start()
+
+    @classmethod
+    def from_env(cls, write_api, bucket, name):
+        """Create a writer configured from WRITE_* and SPOOL_* environment variables"""
+        spool = None
+        if os.getenv('SPOOL_ENABLED', 'true').lower() == 'true':
+            spool_dir = os.path.join(os.getenv('SPOOL_DIR', '/data/spool'), name)
+            try:
+                spool = DiskSpool(
+                    spool_dir,
+                    segment_bytes=int(os.getenv('SPOOL_SEGMENT_MB', 8)) * 1024**2,
+                    max_bytes=int(os.getenv('SPOOL_MAX_MB', 512)) * 1024**2,
+                    fsync_interval=float(os.getenv('SPOOL_FSYNC_INTERVAL', 1))
+                )
+                logger.info(f"Spooling undeliverable points to {spool_dir}")
+            except OSError as e:
+                logger.warning(f"Spool disabled, cannot use {spool_dir}: {e}")
+
+        return cls(
+            write_api,
+            bucket,
+            batch_size=int(os.getenv('WRITE_BATCH_SIZE', 500)),
+            flush_interval=float(os.getenv('WRITE_FLUSH_INTERVAL', 15)),
+            queue_size=int(os.getenv('WRITE_QUEUE_SIZE', 10000)),
+            max_retries=int(os.getenv('WRITE_MAX_RETRIES', 5)),
+            retry_interval=float(os.getenv('WRITE_RETRY_INTERVAL', 1)),
+            max_retry_delay=float(os.getenv('WRITE_MAX_RETRY_DELAY', 30)),
+            spool=spool,
+            replay_batch_size=int(os.getenv('SPOOL_REPLAY_BATCH_SIZE', 5000)),
+            replay_rate=float(os.getenv('SPOOL_REPLAY_RATE', 5000))
+        )
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def write(self, records, urgent=False):
+        """Queue points for writing; never blocks on the network
+
+        urgent points (alerts) start a write right away instead of waiting
+        for a full batch or the flush interval.
+        """
+        lines = [to_line_protocol(record) for record in records]
+        lines = [line for line in lines if line]
+
+        with self._cond:
+            if self._closing:
+                logger.warning(f"Writer is closed, dropping {len(lines)} points")
+                self.points_dropped += len(lines)
+                return False
+
+            overflow = len(self._queue) + len(lines) - self.queue_size
+            if overflow > 0:
+                # Keep the newest data in memory; spill (or drop) the oldest
+                evicted = [self._queue.popleft() for _ in range(min(overflow, len(self._queue)))]
+                evicted.extend(lines[:max(0, len(lines) - self.queue_size)])
+                lines = lines[-self.queue_size:]
+                if self._spool_lines(evicted):
+                    logger.warning(f"Write queue full, spooled {overflow} oldest points")
+                else:
+                    self.points_dropped += overflow
+                    logger.warning(f"Write queue full, dropped {overflow} oldest points")
+
+            if not self._queue:
+                self._oldest_queued = time.monotonic()
+            self._queue.extend(lines)
+            if urgent and lines:
+                self._flush_requested = True
+                self._cond.notify()
+            elif len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written or dropped"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=30.0):
+        """Flush pending points and stop the background threads"""
+        self._stop_replay.set()
+        self._recovered.set()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+            with self._cond:
+                leftover = list(self._queue)
+                self._queue.clear()
+            if self._spool_lines(leftover):
+                logger.warning(f"Writer did not drain within {timeout}s, spooled {len(leftover)} points")
+            else:
+                self.points_dropped += len(leftover)
+                logger.warning(f"Writer did not drain within {timeout}s, {len(leftover)} points left unsent")
+        else:
+            logger.info(f"Writer closed after {self.writes} writes, "
+                        f"{self.points_written} points written, {self.points_dropped} dropped")
+
+        if self._replay_thread:
+            self._replay_thread.join(timeout)
+        if self.spool:
+            self.spool.close()
+
+    def _spool_lines(self, lines):
+        """Save lines to the spool; returns False if there is no usable spool"""
+        if not self.spool or not lines:
+            return False
+        try:
+            self.spool.append(lines)
+            self.points_spooled += len(lines)
+            return True
+        except OSError as e:
+            logger.error(f"Failed to spool {len(lines)} points: {e}")
+            return False
+
+    def _next_batch(self):
+        """Wait for a full batch, the flush deadline or shutdown"""
+        with self._cond:
+            while True:
+                due = (self._oldest_queued or time.monotonic()) + self.flush_interval
+                if (len(self._queue) >= self.batch_size or self._closing or
+                        (self._queue and (self._flush_requested or time.monotonic() >= due))):
+                    break
+                if not self._queue:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    self._cond.wait(self.flush_interval)
+                else:
+                    self._cond.wait(max(0.0, due - time.monotonic()))
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight = len(batch)
+            self._oldest_queued = time.monotonic() if self._queue else None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+                if self._closing and not self._queue:
+                    break
+
+    def _write_batch(self, batch):
+        """Write one batch, retrying with exponential backoff and full jitter"""
+        payload = '\n'.join(batch)
+        max_retries = 0 if self._outage and self.spool else self.max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                self.payload_bytes.observe(len(payload))
+                with self.write_seconds.time():
+                    self.write_api.write(bucket=self.bucket, record=payload)
+                self.writes += 1
+                self.points_written += len(batch)
+                logger.debug(f"Wrote batch of {len(batch)} points ({len(payload)} bytes)")
+                if self._outage:
+                    logger.info("InfluxDB reachable again")
+                    self._outage = False
+                    self._recovered.set()
+                return True
+            except Exception as e:
+                if attempt == max_retries:
+                    logger.error(f"Failed to write batch of {len(batch)} points after "
+                                 f"{attempt + 1} attempts: {e}")
+                    break
+                self.retries += 1
+                delay = random.uniform(0, min(self.max_retry_delay, self.retry_interval * 2 ** attempt))
+                logger.warning(f"Batch write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        self._outage = True
+        if self._spool_lines(batch):
+            logger.warning(f"Spooled {len(batch)} points to disk for later replay")
+        else:
+            self.points_dropped += len(batch)
+        return False
+
+    def _replay(self):
+        """Drain the spool in throttled chunks whenever InfluxDB is reachable"""
+        replaying = False
+        while not self._stop_replay.is_set():
+            if self._outage or not self.spool.pending:
+                if replaying:
+                    logger.info(f"Spool replay complete, {self.points_replayed} points replayed so far")
+                    replaying = False
+                self._recovered.wait(self.max_retry_delay)
+                self._recovered.clear()
+                continue
+
+            lines, position = self.spool.read_chunk(self.replay_batch_size)
+            if not lines:
+                continue
+
+            started = time.monotonic()
+            try:
+                self.write_api.write(bucket=self.bucket, record='\n'.join(lines))
+            except Exception as e:
+                logger.warning(f"Spool replay paused, write failed: {e}")
+                self._outage = True
+                continue
+
+            self.spool.commit(position)
+            self.points_replayed += len(lines)
+            self.writes += 1
+            if not replaying:
+                logger.info(f"Replaying spooled points ({self.spool.size_bytes} bytes on disk)")
+                replaying = True
+            logger.debug(f"Replayed {len(lines)} spooled points")
+
+            # Throttle so a long backlog does not swamp InfluxDB
+            if self.replay_rate > 0:
+                self._stop_replay.wait(max(0.0, len(lines) / self.replay_rate - (time.monotonic() - started)))
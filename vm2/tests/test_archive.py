@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from archive import parse_time
+
+UTC_MIDNIGHT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('value', ['2024-01-01T00:00:00Z', '2024-01-01T00:00:00', '2024-01-01',
+                                   '2024-01-01T02:00:00+02:00'])
+def test_iso_timestamps_are_utc(value):
+    assert parse_time(value) == UTC_MIDNIGHT
+
+
+def test_ages_are_relative_to_now():
+    before = datetime.now(timezone.utc)
+    parsed = parse_time('6h')
+    assert before - timedelta(hours=6) <= parsed <= datetime.now(timezone.utc) - timedelta(hours=6)
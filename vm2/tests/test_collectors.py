@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+
+from collectors import Collector, CollectorScheduler, TimingWheel
+
+TIMESTAMP = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, records, urgent=False):
+        self.lines.extend(records)
+        return True
+
+
+def test_timing_wheel_handles_delays_longer_than_a_revolution():
+    wheel = TimingWheel(slots=4)
+    wheel.schedule('soon', 2)
+    wheel.schedule('late', 10)
+    due = {tick: wheel.advance() for tick in range(1, 11)}
+    assert due[2] == ['soon']
+    assert due[10] == ['late']
+    assert sum(len(items) for items in due.values()) == 2
+
+
+def test_run_once_runs_every_collector_and_writes_their_lines():
+    writer = ListWriter()
+    collectors = [Collector(name, lambda timestamp, name=name: [f'{name} value=1'], 30)
+                  for name in ('system', 'docker')]
+    scheduler = CollectorScheduler(collectors, writer)
+    scheduler.run_once(TIMESTAMP)
+    assert sorted(writer.lines) == ['docker value=1', 'system value=1']
+    assert all(collector.runs == 1 and not collector.running for collector in collectors)
+
+
+def test_run_past_its_timeout_drops_its_lines():
+    def slow(timestamp):
+        time.sleep(0.05)
+        return ['slow value=1']
+
+    writer = ListWriter()
+    collector = Collector('slow', slow, 30, timeout=0.01)
+    CollectorScheduler([collector], writer).run_once(TIMESTAMP)
+    assert writer.lines == []
+    assert collector.timeouts == 1
+
+
+def test_failing_collector_is_counted_and_does_not_stop_the_others():
+    def broken(timestamp):
+        raise RuntimeError('no docker socket')
+
+    writer = ListWriter()
+    collectors = [Collector('broken', broken, 30), Collector('ok', lambda timestamp: ['ok value=1'], 30)]
+    CollectorScheduler(collectors, writer).run_once(TIMESTAMP)
+    assert writer.lines == ['ok value=1']
+    assert collectors[0].failures == 1
+
+
+def test_collectors_start_on_multiples_of_their_interval():
+    collectors = [Collector('fast', None, 10), Collector('slow', None, 60)]
+    scheduler = CollectorScheduler(collectors, ListWriter())
+    assert scheduler.tick == 10
+    # 12:00:30 is a multiple of 10s but 30s before the next whole minute
+    due = scheduler._schedule_first(datetime(2024, 1, 1, 12, 0, 30))
+    assert due == [collectors[0]]
+    later = [scheduler.wheel.advance() for _ in range(3)]
+    assert later[2] == [collectors[1]]
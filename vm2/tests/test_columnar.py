@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+from columnar import ColumnarReader, ColumnarWriter
+
+START = 1704067200 * 10**9
+STEP = 30 * 10**9
+
+
+def rows(count, offset=0):
+    return [(START + i * STEP, {'flow_rate': 800.0 + i, 'ph_level': 7.0 + i / 100})
+            for i in range(offset, offset + count)]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip_across_blocks(tmp_path, compress):
+    path = str(tmp_path / 'readings.col')
+    written = rows(250)
+    with ColumnarWriter(path, ['flow_rate', 'ph_level'], {'measurement': 'water_metrics'},
+                        block_rows=100, compress=compress) as writer:
+        for timestamp, values in written:
+            writer.append(timestamp, values)
+
+    with ColumnarReader(path) as reader:
+        assert reader.metadata['measurement'] == 'water_metrics'
+        assert reader.rows == 250 and len(reader.index) == 3
+        assert list(reader.scan()) == written
+        assert reader.time_range == (written[0][0], written[-1][0])
+
+
+def test_scan_range_and_missing_values(tmp_path):
+    path = str(tmp_path / 'readings.col')
+    with ColumnarWriter(path, ['flow_rate', 'ph_level'], block_rows=10) as writer:
+        for timestamp, values in rows(50):
+            writer.append(timestamp, values)
+        writer.append(START + 50 * STEP, {'flow_rate': 1.0, 'ph_level': None})
+
+    with ColumnarReader(path) as reader:
+        selected = list(reader.scan(START + 12 * STEP, START + 15 * STEP))
+        assert [timestamp for timestamp, _ in selected] == [START + i * STEP for i in (12, 13, 14)]
+        assert list(reader.scan(START + 50 * STEP))[0][1] == {'flow_rate': 1.0}
+
+
+def test_reopening_appends_and_drops_a_partial_block(tmp_path):
+    path = str(tmp_path / 'readings.col')
+    with ColumnarWriter(path, ['flow_rate', 'ph_level'], block_rows=10) as writer:
+        for timestamp, values in rows(20):
+            writer.append(timestamp, values)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 37)
+
+    with ColumnarReader(path) as reader:
+        assert reader.truncated and reader.rows == 20
+
+    with ColumnarWriter(path, ['flow_rate', 'ph_level'], block_rows=10) as writer:
+        for timestamp, values in rows(5, offset=20):
+            writer.append(timestamp, values)
+    with ColumnarReader(path) as reader:
+        assert not reader.truncated
+        assert list(reader.scan()) == rows(25)
+
+    with pytest.raises(ValueError):
+        ColumnarWriter(path, ['flow_rate'])
+
+
+def test_nan_is_stored_as_missing(tmp_path):
+    path = str(tmp_path / 'readings.col')
+    with ColumnarWriter(path, ['flow_rate']) as writer:
+        writer.append(START, {'flow_rate': math.nan})
+    with ColumnarReader(path) as reader:
+        assert list(reader.scan()) == [(START, {})]
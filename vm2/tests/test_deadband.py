@@ -0,0 +1,42 @@
+import pytest
+
+from deadband import Deadband, parse_deadbands
+
+
+def test_parse_deadbands():
+    assert parse_deadbands('ph_level=0.05, turbidity=2%,*=1%') == {
+        'ph_level': (0.05, False), 'turbidity': (2.0, True), '*': (1.0, True)}
+    with pytest.raises(ValueError):
+        parse_deadbands('ph_level=')
+
+
+def test_readings_inside_the_band_are_suppressed_until_the_heartbeat():
+    deadband = Deadband(parse_deadbands('ph_level=0.05'), heartbeat=300)
+    assert deadband.filter({'ph_level': 7.00}, 0) == {'ph_level': 7.00}
+    assert deadband.filter({'ph_level': 7.04}, 30) == {}
+    assert deadband.filter({'ph_level': 7.06}, 60) == {'ph_level': 7.06}
+    # The band is around the last value sent, not the last value seen
+    assert deadband.filter({'ph_level': 7.02}, 90) == {}
+    assert deadband.filter({'ph_level': 7.02}, 360) == {'ph_level': 7.02}
+    assert (deadband.points_sent, deadband.points_suppressed) == (3, 2)
+
+
+def test_percent_band_and_default():
+    deadband = Deadband(parse_deadbands('*=1%'), heartbeat=300)
+    deadband.filter({'flow_rate': 800.0}, 0)
+    assert deadband.filter({'flow_rate': 807.0}, 30) == {}
+    assert deadband.filter({'flow_rate': 809.0}, 60) == {'flow_rate': 809.0}
+
+
+def test_sensors_without_a_band_are_sent_when_they_change():
+    deadband = Deadband(parse_deadbands('ph_level=0.05'), heartbeat=300)
+    deadband.filter({'chlorine': 1.1}, 0)
+    assert deadband.filter({'chlorine': 1.1}, 30) == {}
+    assert deadband.filter({'chlorine': 1.2}, 60) == {'chlorine': 1.2}
+
+
+def test_summary_extremes_count_as_movement():
+    deadband = Deadband(parse_deadbands('turbidity=0.5'), heartbeat=300)
+    deadband.filter_summaries({'turbidity': {'value': 0.6, 'min': 0.6, 'max': 0.6}}, 0)
+    spike = {'turbidity': {'value': 0.62, 'min': 0.55, 'max': 4.0}}
+    assert deadband.filter_summaries(spike, 30) == spike
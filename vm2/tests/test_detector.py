@@ -0,0 +1,55 @@
+import random
+
+from detector import AnomalyDetector
+
+
+def feed(detector, values, start=0):
+    """Observe values one second apart; returns the number of samples that alerted"""
+    return sum(bool(detector.observe('flow_rate', value, start + i)) for i, value in enumerate(values))
+
+
+def test_spike_alerts_once_and_is_not_learned():
+    detector = AnomalyDetector()
+    rng = random.Random(7)
+    feed(detector, [100 + rng.gauss(0, 1) for _ in range(200)])
+    mean = detector._states['flow_rate'].mean
+
+    assert feed(detector, [160], start=200) == 1
+    assert detector._states['flow_rate'].mean == mean
+    assert feed(detector, [100 + rng.gauss(0, 1) for _ in range(50)], start=201) == 0
+
+
+def test_step_change_is_relearned():
+    detector = AnomalyDetector(relearn=10)
+    rng = random.Random(1)
+    feed(detector, [100 + rng.gauss(0, 1) for _ in range(200)])
+
+    alerted = feed(detector, [130 + rng.gauss(0, 1) for _ in range(500)], start=200)
+
+    assert alerted <= detector.relearn
+    assert detector.relearns == 1
+    assert abs(detector._states['flow_rate'].mean - 130) < 2
+
+
+def test_limits_apply_from_the_first_sample():
+    detector = AnomalyDetector(limits={'flow_rate': (0, 50)})
+    alerts = detector.observe('flow_rate', 80, 0)
+    assert [alert['alert_type'] for alert in alerts] == ['limit']
+    assert alerts[0]['limit'] == 50
+
+
+def test_factory_reads_settings_once_and_returns_independent_detectors(monkeypatch):
+    monkeypatch.setenv('DETECTOR_RELEARN', '3')
+    new_detector = AnomalyDetector.factory_from_env({'ph_level': (6.5, 8.5)})
+    monkeypatch.setenv('DETECTOR_RELEARN', '99')
+
+    first, second = new_detector(), new_detector()
+    assert first is not second
+    assert first.relearn == second.relearn == 3
+    first.observe('ph_level', 7.0, 0)
+    assert second.samples == 0
+
+
+def test_factory_returns_none_when_disabled(monkeypatch):
+    monkeypatch.setenv('DETECTOR_ENABLED', 'false')
+    assert AnomalyDetector.factory_from_env()() is None
@@ -0,0 +1,19 @@
+from instrumentation import MetricsRegistry, format_value
+
+
+def test_values_keep_full_precision():
+    assert format_value(12345678) == '12345678'
+    assert format_value(True) == '1'
+    assert format_value(0.1) == '0.1'
+    assert format_value(1234567.891) == '1234567.891'
+    assert format_value(float('inf')) == '+Inf'
+    assert format_value(float('nan')) == 'NaN'
+
+
+def test_large_counters_and_sums_render_exactly():
+    registry = MetricsRegistry('agent')
+    registry.counter('points_written_total', 'Points written', lambda: 12345679)
+    registry.histogram('write_seconds', 'Write latency', bounds=(1,)).observe(1234567.5)
+    text = registry.render()
+    assert 'agent_points_written_total 12345679\n' in text
+    assert 'agent_write_seconds_sum 1234567.5\n' in text
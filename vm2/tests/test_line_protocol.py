@@ -0,0 +1,32 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from line_protocol import SeriesEncoder, to_nanoseconds
+
+
+def test_encoder_escapes_and_formats_like_point():
+    encoder = SeriesEncoder('water metrics', {'plant_id': 'B,1', 'plant_name': 'a=b', 'empty': '', 'none': None})
+    line = encoder.encode({'flow': 1.5, 'whole': 800.0, 'ok': True, 'n': 42, 's': 'say "hi" \\ x',
+                           'nan': math.nan, 'none': None}, 1000)
+    assert line == ('water\\ metrics,plant_id=B\\,1,plant_name=a\\=b '
+                    'flow=1.5,n=42i,ok=true,s="say \\"hi\\" \\\\ x",whole=800 1000')
+    assert encoder.encode_value(2.0, 5) == 'water\\ metrics,plant_id=B\\,1,plant_name=a\\=b value=2 5'
+
+
+def test_point_without_usable_fields_is_skipped():
+    assert SeriesEncoder('water_metrics', {'plant_id': 'A'}).encode({'nan': math.nan, 'none': None}, 1) == ''
+
+
+def test_naive_datetimes_are_utc():
+    assert to_nanoseconds(datetime(2024, 1, 1)) == 1704067200 * 10**9
+    assert to_nanoseconds(datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))) == 1704067200 * 10**9
+
+
+def test_encoder_matches_point_for_awkward_inputs():
+    # The same check as bench_line_protocol.py --check-only
+    pytest.importorskip('influxdb_client')
+    from bench_line_protocol import check_equivalence
+
+    assert check_equivalence() == 0
@@ -0,0 +1,78 @@
+import time
+import socket
+import threading
+
+import pytest
+
+from probes import LATENCY_BUCKETS_MS, ProbeTarget
+from instrumentation import Histogram
+
+
+def test_latency_fields_keep_their_names():
+    histogram = Histogram(LATENCY_BUCKETS_MS)
+    for latency_ms in (0.5, 3, 3, 40):
+        histogram.observe(latency_ms)
+    fields = histogram.fields('ms')
+    assert fields['le_1ms'] == 1
+    assert fields['le_5ms'] == 3
+    assert fields['le_5000ms'] == fields['le_inf'] == fields['count'] == 4
+    assert fields['sum_ms'] == pytest.approx(46.5)
+
+
+@pytest.fixture
+def listener():
+    server = socket.create_server(('127.0.0.1', 0))
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(connection)
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+    for connection in accepted:
+        connection.close()
+
+
+def test_tcp_probe_measures_connects(listener):
+    pytest.importorskip('requests')
+    from probes import ProbeEngine
+
+    engine = ProbeEngine([ProbeTarget('local', f'http://127.0.0.1:{listener}')], ping=False)
+    try:
+        results = engine.run()
+    finally:
+        engine.close()
+    assert results[('local', 'tcp')]['success']
+    assert engine.histograms[('local', 'tcp')].count == 1
+
+
+def test_overrunning_http_probe_is_not_started_twice(listener):
+    pytest.importorskip('requests')
+    from probes import ProbeEngine
+
+    release = threading.Event()
+    calls = []
+    engine = ProbeEngine([ProbeTarget('slow', f'http://127.0.0.1:{listener}')], deadline=0.2, ping=False)
+
+    def slow_get(url, **kwargs):
+        calls.append(url)
+        release.wait(5)
+        raise OSError('timed out')
+
+    engine.session.get = slow_get
+    try:
+        first = engine.run()
+        second = engine.run()
+    finally:
+        release.set()
+        time.sleep(0.05)
+        engine.close()
+    assert first[('slow', 'http')]['error'] == 'deadline exceeded'
+    assert second[('slow', 'http')]['error'] == 'previous probe still running'
+    assert len(calls) == 1
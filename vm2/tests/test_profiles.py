@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+
+from profiles import DiurnalProfiles
+
+PROFILES = {'flow_rate': {'weekday': [[0, 0.8], [12, 1.2]], 'weekend': [[0, 1.0]]},
+            'temperature': {'seasonal': [1.0] * 5 + [1.1] * 4 + [1.0] * 3}}
+
+
+def test_factor_reads_the_weekday_weekend_and_seasonal_tables():
+    profiles = DiurnalProfiles(PROFILES)
+    monday_noon, saturday_noon = datetime(2024, 1, 1, 12), datetime(2024, 1, 6, 12)
+    assert profiles.factor('flow_rate', monday_noon) == pytest.approx(1.2)
+    assert profiles.factor('flow_rate', saturday_noon) == pytest.approx(1.0)
+    assert profiles.factor('temperature', datetime(2024, 7, 15)) == pytest.approx(1.1)
+    assert profiles.factor('temperature', datetime(2024, 1, 15)) == pytest.approx(1.0)
+    assert profiles.factor('ph_level', monday_noon) == 1.0
+
+
+def test_simulator_looks_factors_up_again_when_time_moves():
+    pytest.importorskip('influxdb_client')
+    from sensor_simulator import WaterSensorSimulator
+
+    profiles = DiurnalProfiles(PROFILES)
+    simulator = WaterSensorSimulator('TEST', 'Test Plant', 'Nowhere', connect=False, profiles=profiles)
+    for timestamp in (datetime(2024, 1, 1, 0), datetime(2024, 1, 1, 12), datetime(2024, 1, 6, 12)):
+        simulator.simulation_time = timestamp
+        assert simulator.get_time_factor('flow_rate') == profiles.factor('flow_rate', timestamp)
+        assert simulator.get_time_factor('ph_level') == 1.0
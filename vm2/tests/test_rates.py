@@ -0,0 +1,24 @@
+from rates import RateTracker
+
+
+def test_rate_is_change_per_second():
+    tracker = RateTracker()
+    assert tracker.rate('rx', 1000, now=10.0) is None
+    assert tracker.rate('rx', 3000, now=12.0) == 1000.0
+
+
+def test_counter_reset_reports_nothing_and_rebases():
+    tracker = RateTracker()
+    tracker.rate('rx', 5000, now=0.0)
+    assert tracker.rate('rx', 100, now=1.0) is None
+    assert tracker.resets == 1
+    assert tracker.rate('rx', 600, now=2.0) == 500.0
+
+
+def test_rates_are_tracked_per_prefix():
+    tracker = RateTracker()
+    tracker.rates('eth0', {'bytes_sent': 0, 'bytes_recv': 0}, now=0.0)
+    tracker.rates('eth1', {'bytes_sent': 0}, now=0.0)
+    assert tracker.rates('eth0', {'bytes_sent': 10, 'bytes_recv': 20}, now=1.0) == \
+        {'bytes_sent_per_s': 10.0, 'bytes_recv_per_s': 20.0}
+    assert tracker.rates('eth1', {'bytes_sent': 5, 'new': 1}, now=1.0) == {'bytes_sent_per_s': 5.0}
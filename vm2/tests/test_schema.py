@@ -0,0 +1,20 @@
+import re
+
+import pytest
+
+pytest.importorskip('influxdb_client')
+
+from schema import SUMMARY_FIELD_PATTERN, compat_flux
+from summary import quantile_field
+
+
+def test_compat_helper_skips_summary_fields():
+    summary_fields = ['flow_rate_min', 'flow_rate_max', 'ph_level_mean', 'turbidity_p95',
+                      f'pressure_{quantile_field(0.999)}']
+    base_fields = ['flow_rate', 'ph_level', 'total_dissolved_solids', 'cpu_percent', 'disk_usage_percent']
+    assert all(re.search(SUMMARY_FIELD_PATTERN, field) for field in summary_fields)
+    assert not any(re.search(SUMMARY_FIELD_PATTERN, field) for field in base_fields)
+
+    flux = compat_flux('water_metrics')
+    assert 'r._field != "samples"' in flux
+    assert f'/{SUMMARY_FIELD_PATTERN}/' in flux
@@ -0,0 +1,13 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('influxdb_client')
+
+from sensor_simulator import parse_timestamp
+
+
+@pytest.mark.parametrize('value', ['2024-01-01T00:00:00Z', '2024-01-01T00:00:00z', '2024-01-01T00:00:00',
+                                   '2024-01-01', '2023-12-31T19:00:00-05:00'])
+def test_backfill_timestamps_are_utc(value):
+    assert parse_timestamp(value) == datetime(2024, 1, 1, tzinfo=timezone.utc)
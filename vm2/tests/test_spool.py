@@ -0,0 +1,74 @@
+import os
+
+from spool import DiskSpool
+
+
+def lines(start, count):
+    return [f'water_metrics,plant_id=A value={i} {i}' for i in range(start, start + count)]
+
+
+def drain(spool, chunk=1000):
+    replayed = []
+    while True:
+        chunk_lines, position = spool.read_chunk(chunk)
+        if not chunk_lines:
+            return replayed
+        replayed.extend(chunk_lines)
+        spool.commit(position)
+
+
+def test_replay_returns_lines_in_order_and_empties_the_spool(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes=512)
+    spool.append(lines(0, 30))
+    spool.append(lines(30, 30))
+    assert spool.pending
+    assert drain(spool, chunk=7) == lines(0, 60)
+    assert not spool.pending
+    spool.close()
+
+
+def test_replay_resumes_from_the_checkpoint_after_a_restart(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    spool.append(lines(0, 10))
+    chunk, position = spool.read_chunk(4)
+    spool.commit(position)
+    spool.close()
+
+    reopened = DiskSpool(str(tmp_path))
+    assert chunk == lines(0, 4)
+    assert drain(reopened) == lines(4, 6)
+    reopened.close()
+
+
+def test_uncommitted_chunk_is_read_again(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    spool.append(lines(0, 5))
+    first, _ = spool.read_chunk(3)
+    again, _ = spool.read_chunk(3)
+    assert first == again
+    spool.close()
+
+
+def test_size_cap_drops_the_oldest_segments(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes=1024, max_bytes=4096)
+    for start in range(0, 2000, 100):
+        spool.append(lines(start, 100))
+    assert spool.size_bytes <= 4096 + 1024 * 4
+    assert spool.bytes_dropped > 0
+    replayed = drain(spool)
+    # What is left is the newest data, still in order
+    assert replayed == lines(2000 - len(replayed), len(replayed))
+    spool.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    spool = DiskSpool(str(tmp_path))
+    spool.append(lines(0, 3))
+    spool.close()
+    segment = next(name for name in os.listdir(tmp_path) if not name.startswith('.') and 'checkpoint' not in name)
+    with open(tmp_path / segment, 'ab') as f:
+        f.write(b'water_metrics,plant_id=A value=9')
+
+    reopened = DiskSpool(str(tmp_path))
+    assert drain(reopened) == lines(0, 3)
+    reopened.close()
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from summary import P2Quantile, StreamingSummary, quantile_field
+
+
+@pytest.mark.parametrize('quantile', [0.01, 0.5, 0.95, 0.99, 0.999])
+def test_p2_tail_quantiles_track_the_exact_value(quantile):
+    rng = random.Random(7)
+    samples = [rng.gauss(100, 10) for _ in range(20000)]
+    estimator = P2Quantile(quantile)
+    for sample in samples:
+        estimator.add(sample)
+
+    ordered = sorted(samples)
+    exact = ordered[int(quantile * (len(ordered) - 1))]
+    assert estimator.value() == pytest.approx(exact, abs=2.0)
+
+
+@pytest.mark.parametrize('quantile', [0.01, 0.99, 0.999])
+def test_p2_seeded_markers_are_strictly_increasing(quantile):
+    estimator = P2Quantile(quantile)
+    for sample in range(estimator.exact_limit + 1):
+        estimator.add(float(sample))
+    positions = estimator._positions
+    assert all(a < b for a, b in zip(positions, positions[1:]))
+
+
+def test_p2_is_exact_below_the_limit():
+    estimator = P2Quantile(0.95)
+    for sample in range(101):
+        estimator.add(float(sample))
+    assert estimator.value() == pytest.approx(95.0)
+
+
+def test_summary_field_is_named_after_the_quantile():
+    assert quantile_field(0.95) == 'p95'
+    assert quantile_field(0.999) == 'p99_9'
+
+    summary = StreamingSummary(quantile=0.99)
+    for sample in range(10):
+        summary.add(float(sample))
+    fields = summary.fields()
+    assert 'p99' in fields and 'p95' not in fields
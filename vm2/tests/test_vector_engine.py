@@ -0,0 +1,68 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('influxdb_client')
+
+from sensor_simulator import ANOMALY_CHANCE, ANOMALY_RANGES, SENSOR_CONSTRAINTS, WaterSensorSimulator
+from vector_engine import VectorSensorEngine
+from columnar import ColumnarReader
+
+
+@pytest.fixture
+def simulator(monkeypatch):
+    monkeypatch.setenv('SPOOL_ENABLED', 'false')
+    monkeypatch.setenv('METRICS_PORT', '0')
+    return WaterSensorSimulator('TEST', 'Test Plant', 'Nowhere', connect=False)
+
+
+def test_block_shapes(simulator):
+    engine = VectorSensorEngine(simulator, seed=1)
+    timestamps = [datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i) for i in range(7)]
+    values, anomalies = engine.generate(3, *engine.slots(timestamps))
+    assert values.shape == anomalies.shape == (3, 7, len(simulator.baseline_values))
+    assert anomalies.dtype == bool
+    assert list(engine.readings(values, 2, 6)) == list(simulator.baseline_values)
+
+
+def test_clip_bounds_and_anomaly_mask(simulator):
+    engine = VectorSensorEngine(simulator, seed=2)
+    values, anomalies = engine.generate(200, np.arange(0, 1440, 3))
+    # Anomalies are only injected into sensors with an anomaly range, at about the scalar rate
+    for i, sensor in enumerate(engine.sensors):
+        if sensor not in ANOMALY_RANGES:
+            assert not anomalies[:, :, i].any()
+    anomalous_sensors = sum(sensor in ANOMALY_RANGES for sensor in engine.sensors) / len(engine.sensors)
+    assert anomalies.mean() == pytest.approx(ANOMALY_CHANCE * anomalous_sensors, rel=0.2)
+    # Clipping happens before anomalies, as in generate_readings
+    for i, sensor in enumerate(engine.sensors):
+        if sensor in SENSOR_CONSTRAINTS:
+            low, high = SENSOR_CONSTRAINTS[sensor]
+            normal = values[:, :, i][~anomalies[:, :, i]]
+            assert normal.min() >= low and normal.max() <= high
+
+
+@pytest.mark.parametrize('hour', [3, 8, 19])
+def test_statistics_match_the_scalar_model(simulator, hour):
+    random.seed(hour)
+    timestamp = datetime(2024, 1, 1, hour, tzinfo=timezone.utc)
+    simulator.simulation_time = timestamp
+    scalar = np.array([list(simulator.generate_readings().values()) for _ in range(4000)])
+    engine = VectorSensorEngine(simulator, seed=hour)
+    vector = engine.generate(4000, *engine.slots([timestamp]))[0][:, 0, :]
+    for q in (5, 50, 95):
+        np.testing.assert_allclose(np.percentile(vector, q, axis=0), np.percentile(scalar, q, axis=0), rtol=0.02)
+
+
+def test_backfill_generates_every_timestep(simulator, tmp_path):
+    path = str(tmp_path / 'backfill.col')
+    simulator.start_recording(path, 30)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert simulator.run_backfill(start, start + timedelta(days=2), 30)
+    with ColumnarReader(path) as reader:
+        rows = list(reader.scan())
+    assert len(rows) == 2 * 2880 + 1
+    assert [timestamp for timestamp, _ in rows[:2]] == [1704067200 * 10**9, 1704067230 * 10**9]
+    assert all(set(values) == set(simulator.baseline_values) for _, values in rows)
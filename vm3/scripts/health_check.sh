@@ -5,7 +5,7 @@ set -e
 
 PLANT_ID="B"
 PLANT_NAME="Plant B"
-INFLUXDB_URL="${INFLUXDB_URL:-http://vm1:8086}"
+INFLUXDB_URL="${INFLUXDB_URL:-http://vm1:8087}"
 INFLUXDB_TOKEN="${INFLUXDB_TOKEN:-water_monitoring_token_2024}"
 INFLUXDB_ORG="${INFLUXDB_ORG:-water_treatment}"
 INFLUXDB_BUCKET="${INFLUXDB_BUCKET:-water_metrics}"